@@ -1,6 +1,8 @@
 import random
 import math
 import time
+from spatial_grid import SpatialGrid
+
 class Medkit:
     HEAL_AMOUNT = 5  # Количество восполняемого здоровья
     PICKUP_DISTANCE = 5  # Увеличиваем с 2 до 5
@@ -30,22 +32,14 @@ class MedkitManager:
         self.medkits = {}
         self.map_size = map_size
         self.next_medkit_id = 0
-        self.walls = []
+        self.collision = None
         self.last_spawn_time = 0
 
-    def set_walls(self, map_data):
-        self.walls = [obj for obj in map_data if obj.get('texture') in ['brick', 'cobblestone']]
+    def set_collision(self, collision):
+        self.collision = collision
 
     def check_collision(self, x, z):
-        for wall in self.walls:
-            wall_x = wall['x']
-            wall_z = wall['z']
-            wall_scale_x = wall['scale_x']
-            wall_scale_z = wall['scale_z']
-            
-            if abs(x - wall_x) < wall_scale_x/2 and abs(z - wall_z) < wall_scale_z/2:
-                return True
-        return False
+        return self.collision.point_blocked(x, z)
 
     def spawn_medkit(self):
         current_time = time.time()
@@ -69,11 +63,13 @@ class MedkitManager:
                 self.last_spawn_time = current_time
                 return
 
-    def check_pickups(self, players):
+    def check_pickups(self, players, player_grid=None):
+        if player_grid is None:
+            player_grid = SpatialGrid.of(players)
         medkits_to_remove = []
         
         for medkit_id, medkit in self.medkits.items():
-            for player in players.values():
+            for _, player in sorted(player_grid.query(medkit.x, medkit.z, Medkit.PICKUP_DISTANCE)):
                 if player.is_alive and not player.is_ghost:
                     if medkit.can_pickup(player.x, player.y, player.z):
                         if player.health < player.max_health:
@@ -0,0 +1,103 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from server import GameServer, WORLD_MESSAGES
+from connection import StreamConnection
+from framing import FrameDecoder, RECEIVE_BUFFER_SIZE
+from game_log import get_logger
+
+log = get_logger('server')
+
+WORLD_WORKERS = 4  # Потоков для обработчиков с блокировками мира; под блокировкой они идут по одному
+
+class AsyncGameServer(GameServer):
+    """Сервер, в котором все подключения обслуживаются одним asyncio event loop.
+
+    Симуляция (зомби, аптечки, бонусы, доски) работает так же, как в потоковом
+    режиме, а вместо потока на каждого клиента используется корутина.
+    Обработчики, которые берут блокировки мира (вход и выход игрока, события
+    из WORLD_MESSAGES), в режиме с блокировками уходят в свой пул потоков:
+    пока тик держит блокировку, встал бы весь цикл со всеми клиентами.
+    Позиции, hello и карта блокировок мира не берут и обрабатываются в цикле.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.world_executor = None
+        if not self.single_writer:
+            self.world_executor = ThreadPoolExecutor(WORLD_WORKERS, thread_name_prefix="world")
+
+    async def call_world(self, function, *args):
+        """Вызов обработчика, который берет блокировки мира.
+
+        С одним писателем команды мира только ставятся в очередь, и ждать нечего.
+        """
+        if self.world_executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.world_executor, function, *args)
+
+    async def handle_message_async(self, player_id, player_data):
+        if player_data.get('type') in WORLD_MESSAGES:
+            return await self.call_world(self.handle_message, player_id, player_data)
+        return self.handle_message(player_id, player_data)
+
+    async def receive_data_async(self, reader, decoder):
+        """Все сообщения из очередного чтения (их может быть несколько) или None при отключении."""
+        try:
+            data = await reader.read(RECEIVE_BUFFER_SIZE)
+            if not data:
+                return None
+            decoder.feed(data)
+            messages = []
+            frame = decoder.next_frame()
+            while frame is not None:
+                messages.append(self.decode_frame(frame))
+                frame = decoder.next_frame()
+            return messages
+        except Exception as e:
+            log.warning("Ошибка при получении данных: %s", e)
+            return None
+
+    async def handle_client_async(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        player_id = self.allocate_player_id()
+        log.info("Подключился игрок %s с адреса %s", player_id, addr)
+        outbound = StreamConnection(writer, f"player-{player_id}", **self.connection_options)
+        decoder = FrameDecoder()
+
+        try:
+            await self.call_world(self.add_player, player_id, outbound)
+            self.send_data(outbound, self.get_initial_data(player_id))
+
+            # Очередь закрывается и при отключении медленного клиента
+            while not outbound.closed:
+                try:
+                    messages = await self.receive_data_async(reader, decoder)
+                    if messages is None:
+                        break
+
+                    for player_data in messages:
+                        # Сообщения одного клиента по-прежнему обрабатываются по порядку
+                        response = await self.handle_message_async(player_id, player_data)
+                        if response is not None:
+                            self.send_data(outbound, response, self.get_protocol(player_id))
+
+                except Exception as e:
+                    log.warning("Ошибка обработки клиента %s: %s", player_id, e)
+                    break
+
+        finally:
+            await self.call_world(self.remove_player, player_id)
+            outbound.close()
+            log.info("Игрок %s отключился", player_id)
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_client_async, sock=self.server_socket)
+        self.mark_ready()
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        self.start_simulation()
+        self.start_udp()
+        self.start_metrics()
+        asyncio.run(self.serve())
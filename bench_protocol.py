@@ -0,0 +1,34 @@
+import argparse
+import random
+import time
+from protocol import encode_payload, decode_payload, PROTOCOL_JSON, PROTOCOL_BINARY
+from sample_states import make_state
+
+def measure(state, protocol, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        payload = encode_payload(state, protocol)
+    encode_time = (time.perf_counter() - started) / repeats
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        decode_payload(payload)
+    decode_time = (time.perf_counter() - started) / repeats
+    return len(payload), encode_time, decode_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение JSON и бинарного кодирования снимка мира")
+    parser.add_argument('--zombies', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'зомби':>6} {'формат':>7} {'байт':>8} {'encode, мкс':>12} {'decode, мкс':>12}")
+    for count in args.zombies:
+        state = make_state(count)
+        for protocol in (PROTOCOL_JSON, PROTOCOL_BINARY):
+            size, encode_time, decode_time = measure(state, protocol, args.repeats)
+            print(f"{count:>6} {protocol:>7} {size:>8} {encode_time * 1e6:>12.1f} {decode_time * 1e6:>12.1f}")
+
+if __name__ == "__main__":
+    main()
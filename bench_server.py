@@ -0,0 +1,78 @@
+import argparse
+import random
+import socket
+import threading
+import time
+from protocol import encode_message
+from framing import FrameReader
+
+def send_data(sock, data):
+    sock.sendall(encode_message(data))
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+def run_client(host, port, duration, interval, results, connected, lock):
+    latencies = []
+    try:
+        sock = socket.create_connection((host, port), timeout=10)
+        reader = FrameReader(sock)
+        if reader.receive_message() is None:
+            return
+        with lock:
+            connected[0] += 1
+
+        x, z = random.uniform(-10, 10), random.uniform(-10, 10)
+        end_time = time.time() + duration
+        while time.time() < end_time:
+            x += random.uniform(-1, 1)
+            z += random.uniform(-1, 1)
+            started = time.perf_counter()
+            send_data(sock, {'x': x, 'y': 0, 'z': z})
+            if reader.receive_message() is None:
+                break
+            latencies.append(time.perf_counter() - started)
+            if interval:
+                time.sleep(interval)
+        sock.close()
+    except Exception as e:
+        print(f"Ошибка клиента: {e}")
+    finally:
+        with lock:
+            results.extend(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение потокового и asyncio режимов сервера")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=21491)
+    parser.add_argument('--clients', type=int, default=60)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--interval', type=float, default=0.05, help="Пауза между запросами клиента")
+    args = parser.parse_args()
+
+    results = []
+    connected = [0]
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_client, args=(args.host, args.port, args.duration,
+                                                  args.interval, results, connected, lock))
+        for _ in range(args.clients)
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"Подключено клиентов: {connected[0]} из {args.clients}")
+    print(f"Ответов получено: {len(results)}")
+    print(f"p50: {percentile(results, 50) * 1000:.2f} мс")
+    print(f"p99: {percentile(results, 99) * 1000:.2f} мс")
+    print(f"max: {max(results, default=0) * 1000:.2f} мс")
+
+if __name__ == "__main__":
+    main()
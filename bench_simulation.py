@@ -0,0 +1,249 @@
+import argparse
+import itertools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from map_generator import generate_map
+from player import Player
+from zombie import Zombie, create_zombie_manager, is_target, ZOMBIE_BACKENDS
+from apteka import Medkit, MedkitManager
+from speed import SpeedBoost, SpeedBoostManager
+from planks import Plank, PlacedPlank, PlankManager
+from spatial_grid import SpatialGrid
+from collision import CollisionWorld
+from navigation import NavigationGrid
+from server import MAP_SIZE
+
+TICK_DT = 1 / 30
+PICKUPS = 5  # Аптечек, бонусов и досок для подбора на карте
+
+class World:
+    """Мир симуляции без сервера: карта по seed, зомби, игроки и доски в случайных местах."""
+
+    def __init__(self, map_size, zombies, players, planks, seed, backend='objects', navigation=True):
+        rng = random.Random(seed)
+        map_data = generate_map(map_size, seed)
+        half = map_size * 2 - 5
+
+        self.zombie_manager = create_zombie_manager(map_size, backend)
+        self.medkit_manager = MedkitManager(map_size)
+        self.speed_boost_manager = SpeedBoostManager(map_size)
+        self.plank_manager = PlankManager(map_size)
+        self.collision = CollisionWorld(map_data)
+        for manager in (self.zombie_manager, self.medkit_manager,
+                        self.speed_boost_manager, self.plank_manager):
+            manager.set_collision(self.collision)
+        self.zombie_manager.set_plank_manager(self.plank_manager)
+        if navigation:
+            self.zombie_manager.set_navigation(NavigationGrid(self.collision, map_size * 2, Zombie.WALL_MARGIN))
+
+        def free_position():
+            while True:
+                x, z = rng.uniform(-half, half), rng.uniform(-half, half)
+                if not self.plank_manager.check_collision(x, z):
+                    return x, z
+
+        def free_point():
+            x, z = free_position()
+            return x, 0, z
+
+        self.players = {}
+        for pid in range(players):
+            x, z = free_position()
+            self.players[pid] = Player(x, 0, z)
+        # Игроки в бенчмарке не двигаются, поэтому сетку достаточно построить один раз
+        self.player_grid = SpatialGrid.of(self.players)
+        # Зомби ставятся напрямую: spawn_zombie сам по себе квадратичный
+        for zid in range(zombies):
+            x, z = free_position()
+            self.zombie_manager.insert_zombie(zid, Zombie(x, 0, z))
+        self.zombie_manager.next_zombie_id = zombies
+        for pid in range(planks):
+            x, z = free_position()
+            self.plank_manager.placed_planks[pid] = PlacedPlank(x, 0, z, rng.choice((0, 90)),
+                                                                rng.random() < 0.5)
+        for index in range(PICKUPS):
+            self.medkit_manager.medkits[index] = Medkit(*free_point())
+            self.speed_boost_manager.speed_boosts[index] = SpeedBoost(*free_point())
+            self.plank_manager.planks[index] = Plank(*free_point())
+
+def stage_check_collision(world):
+    for zombie in world.zombie_manager.zombies.values():
+        zombie.check_collision(zombie.x + 0.2, zombie.z + 0.2, world.collision)
+
+def stage_move(world):
+    manager = world.zombie_manager
+    manager.update_flow(world.players, TICK_DT)
+    for zombie_id, zombie in manager.zombies.items():
+        zombie.move_towards_nearest_player(world.players, world.collision, TICK_DT, world.player_grid,
+                                           manager.flow)
+        manager.grid.move(zombie_id, zombie)
+
+def stage_flow_field(world):
+    # Полное перестроение поля за один вызов - сколько стоит все построение
+    world.zombie_manager.flow.rebuild()
+
+def stage_flow_step(world):
+    # Доля построения, которую платит один тик, когда поле перестраивается без перерыва
+    flow = world.zombie_manager.flow
+    if flow.build is None:
+        flow.start([(player.x, player.z) for player in world.players.values() if is_target(player)])
+    flow.step()
+
+def stage_merge(world):
+    world.zombie_manager.check_merge_zombies()
+
+def stage_planks_update(world):
+    world.plank_manager.update_placed_planks(world.zombie_manager.zombies, TICK_DT,
+                                             world.zombie_manager.grid)
+
+def stage_medkit_pickups(world):
+    world.medkit_manager.check_pickups(world.players, world.player_grid)
+
+def stage_speed_pickups(world):
+    world.speed_boost_manager.check_pickups(world.players, world.player_grid)
+
+def stage_plank_pickups(world):
+    world.plank_manager.check_pickups(world.players, world.player_grid)
+
+def stage_tick(world):
+    # Все этапы в порядке GameServer.simulate (без спавна)
+    world.zombie_manager.update_zombies(world.players, TICK_DT, world.player_grid)
+    world.medkit_manager.check_pickups(world.players, world.player_grid)
+    world.speed_boost_manager.check_pickups(world.players, world.player_grid)
+    world.plank_manager.check_pickups(world.players, world.player_grid)
+    world.plank_manager.update_placed_planks(world.zombie_manager.zombies, TICK_DT,
+                                             world.zombie_manager.grid)
+
+# Этапы, которые вызывают методы отдельного Zombie: у движка numpy их нет
+OBJECT_STAGES = ('check_collision', 'move')
+NAVIGATION_STAGES = ('flow_field', 'flow_step')
+
+STAGES = {
+    'check_collision': stage_check_collision,
+    'move': stage_move,
+    'merge': stage_merge,
+    'flow_field': stage_flow_field,
+    'flow_step': stage_flow_step,
+    'planks_update': stage_planks_update,
+    'medkit_pickups': stage_medkit_pickups,
+    'speed_pickups': stage_speed_pickups,
+    'plank_pickups': stage_plank_pickups,
+    'tick': stage_tick,
+}
+
+def scenario_name(map_size, zombies, players, planks):
+    return f"map{map_size}-z{zombies}-p{players}-k{planks}"
+
+def measure(stage, scenario, ticks, repeats, seed, backend='objects', navigation=True):
+    """Время одного тика этапа: каждый повтор на свежем мире, чтобы слияния не копились.
+
+    На свежем мире первые тики сливают плотно расставленных зомби, поэтому
+    вместе со временем возвращается, сколько зомби осталось к концу замера.
+    """
+    samples = []
+    remaining = []
+    for repeat in range(repeats):
+        world = World(*scenario, seed=seed + repeat, backend=backend, navigation=navigation)
+        if navigation:
+            # Этапы начинаются с готовым полем, как у сервера после первых тиков
+            world.zombie_manager.update_flow(world.players, 0.0)
+            world.zombie_manager.flow.rebuild()
+        started = time.perf_counter()
+        for _ in range(ticks):
+            stage(world)
+        samples.append((time.perf_counter() - started) / ticks)
+        remaining.append(len(world.zombie_manager.zombies))
+    return {'median': statistics.median(samples), 'min': min(samples), 'zombies_left': min(remaining)}
+
+def run(args):
+    results = {}
+    scenarios = itertools.product(args.map_sizes, args.zombies, args.players, args.planks)
+    print(f"{'сценарий':<24} {'этап':<16} {'медиана, мкс':>13} {'min, мкс':>10} {'зомби в конце':>14}")
+    for scenario in scenarios:
+        name = scenario_name(*scenario)
+        label = name + '*' if scenario[0] == MAP_SIZE else name  # * - карта, с которой запускается сервер
+        results[name] = {}
+        for stage_name in args.stages:
+            if args.zombie_backend != 'objects' and stage_name in OBJECT_STAGES:
+                continue
+            if args.no_navigation and stage_name in NAVIGATION_STAGES:
+                continue
+            timing = measure(STAGES[stage_name], scenario, args.ticks, args.repeats, args.seed,
+                             args.zombie_backend, not args.no_navigation)
+            results[name][stage_name] = timing
+            print(f"{label:<24} {stage_name:<16} {timing['median'] * 1e6:>13.1f} {timing['min'] * 1e6:>10.1f} "
+                  f"{timing['zombies_left']:>14}")
+    if MAP_SIZE in args.map_sizes:
+        print(f"* map{MAP_SIZE} - размер карты сервера (server.MAP_SIZE)")
+    return results
+
+def compare(results, baseline, threshold):
+    """Печатает изменения относительно базовой линии и возвращает число регрессий."""
+    regressions = 0
+    print(f"\n{'сценарий':<24} {'этап':<16} {'было, мкс':>10} {'стало, мкс':>11} {'изменение':>10}")
+    for name, stages in results.items():
+        for stage_name, timing in stages.items():
+            old = baseline.get(name, {}).get(stage_name)
+            if old is None:
+                continue
+            ratio = timing['median'] / old['median'] if old['median'] else 1.0
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  РЕГРЕССИЯ'
+                regressions += 1
+            print(f"{name:<24} {stage_name:<16} {old['median'] * 1e6:>10.1f} "
+                  f"{timing['median'] * 1e6:>11.1f} {(ratio - 1) * 100:>+9.0f}%{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Микробенчмарки симуляции: время этапов тика для разных карт и числа сущностей")
+    parser.add_argument('--map-sizes', type=int, nargs='+', default=[20, 40, 80])
+    parser.add_argument('--zombies', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--players', type=int, nargs='+', default=[4])
+    parser.add_argument('--planks', type=int, nargs='+', default=[20], help="Установленных досок")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--ticks', type=int, default=30, help="Тиков в одном замере")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1, help="Seed карты и расстановки сущностей")
+    parser.add_argument('--zombie-backend', choices=ZOMBIE_BACKENDS, default='objects')
+    parser.add_argument('--no-navigation', action='store_true',
+                        help="Без поля направлений: зомби идут к игроку по прямой")
+    parser.add_argument('--save', help="Сохранить результаты в JSON (базовая линия)")
+    parser.add_argument('--compare', help="Сравнить с сохраненной базовой линией")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Замедление, начиная с которого этап считается регрессией (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'ticks': args.ticks,
+                    'repeats': args.repeats,
+                    'seed': args.seed,
+                    'zombie_backend': args.zombie_backend,
+                    'navigation': not args.no_navigation,
+                    'server_map_size': MAP_SIZE,
+                    'created': time.strftime('%Y-%m-%d %H:%M:%S')
+                },
+                'results': results
+            }, f, indent=2)
+        print(f"Результаты сохранены в {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        print(f"Регрессий: {regressions}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
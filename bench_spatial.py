@@ -0,0 +1,154 @@
+import argparse
+import random
+import statistics
+import time
+from bench_simulation import World
+from spatial_grid import SpatialGrid
+from zombie import Zombie, is_target
+from apteka import Medkit
+
+def scan_nearest_players(world):
+    # Как было до сетки: каждый зомби перебирает всех игроков
+    targets = []
+    for zombie in world.zombie_manager.zombies.values():
+        nearest_id = None
+        min_distance = float('inf')
+        for player_id, player in world.players.items():
+            if is_target(player):
+                dx = zombie.x - player.x
+                dz = zombie.z - player.z
+                distance = (dx * dx + dz * dz) ** 0.5
+                if distance < min_distance:
+                    min_distance = distance
+                    nearest_id = player_id
+        targets.append(nearest_id)
+    return targets
+
+def grid_nearest_players(world):
+    grid = world.player_grid
+    targets = []
+    for zombie in world.zombie_manager.zombies.values():
+        nearest = grid.nearest(zombie.x, zombie.z, is_target)
+        targets.append(nearest[0] if nearest else None)
+    return targets
+
+def pickup_items(world):
+    return (list(world.medkit_manager.medkits.values()) +
+            list(world.speed_boost_manager.speed_boosts.values()) +
+            list(world.plank_manager.planks.values()))
+
+def scan_pickups(world):
+    # Аптечки, бонусы и доски: предметы x игроки
+    found = []
+    for item in pickup_items(world):
+        found.append(sorted(player_id for player_id, player in world.players.items()
+                            if item.can_pickup(player.x, player.y, player.z)))
+    return found
+
+def grid_pickups(world):
+    found = []
+    for item in pickup_items(world):
+        found.append(sorted(player_id for player_id, player
+                            in world.player_grid.query(item.x, item.z, Medkit.PICKUP_DISTANCE)
+                            if item.can_pickup(player.x, player.y, player.z)))
+    return found
+
+def scan_plank_attackers(world):
+    # Установленные доски x зомби
+    found = []
+    for plank in world.plank_manager.placed_planks.values():
+        found.append(sorted(zombie_id for zombie_id, zombie in world.zombie_manager.zombies.items()
+                            if (zombie.x - plank.x) ** 2 + (zombie.z - plank.z) ** 2
+                            < Zombie.DAMAGE_DISTANCE ** 2))
+    return found
+
+def grid_plank_attackers(world):
+    found = []
+    grid = world.zombie_manager.grid
+    for plank in world.plank_manager.placed_planks.values():
+        found.append(sorted(zombie_id for zombie_id, zombie
+                            in grid.query(plank.x, plank.z, Zombie.DAMAGE_DISTANCE)
+                            if (zombie.x - plank.x) ** 2 + (zombie.z - plank.z) ** 2
+                            < Zombie.DAMAGE_DISTANCE ** 2))
+    return found
+
+def scan_merge_pairs(world):
+    # Пары живых зомби ближе MERGE_DISTANCE, как искал прежний check_merge_zombies: все со всеми
+    zombies = sorted(world.zombie_manager.zombies.items(), key=lambda item: item[0])
+    limit_sq = Zombie.MERGE_DISTANCE ** 2
+    found = []
+    for index, (id1, zombie1) in enumerate(zombies):
+        if not zombie1.is_alive:
+            continue
+        for id2, zombie2 in zombies[index + 1:]:
+            if zombie2.is_alive and (zombie1.x - zombie2.x) ** 2 + (zombie1.z - zombie2.z) ** 2 < limit_sq:
+                found.append((id1, id2))
+    return found
+
+def grid_merge_pairs(world):
+    # Один обход сетки, как в check_merge_zombies
+    return sorted((min(id1, id2), max(id1, id2)) for id1, zombie1, id2, zombie2
+                  in world.zombie_manager.grid.pairs(Zombie.MERGE_DISTANCE)
+                  if zombie1.is_alive and zombie2.is_alive)
+
+def rebuild_grid(world):
+    # Сетку можно и не поддерживать, а строить заново каждый тик - для сравнения
+    SpatialGrid.of(world.zombie_manager.zombies)
+
+def maintain_grid(world):
+    # Поддержка сетки: move() каждого зомби после шага, как в update_zombies
+    grid = world.zombie_manager.grid
+    for zombie_id, zombie in world.zombie_manager.zombies.items():
+        zombie.x += world.steps[zombie_id][0]
+        zombie.z += world.steps[zombie_id][1]
+        grid.move(zombie_id, zombie)
+
+QUERIES = [
+    ('nearest_player', scan_nearest_players, grid_nearest_players),
+    ('pickups', scan_pickups, grid_pickups),
+    ('plank_attackers', scan_plank_attackers, grid_plank_attackers),
+    ('merge_pairs', scan_merge_pairs, grid_merge_pairs),
+]
+
+def timed(function, world, ticks, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(ticks):
+            function(world)
+        samples.append((time.perf_counter() - started) / ticks)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Поиск соседей перебором и по сетке: время на тик для тысяч зомби и десятков игроков")
+    parser.add_argument('--map-size', type=int, default=40)
+    parser.add_argument('--zombies', type=int, default=1000)
+    parser.add_argument('--players', type=int, default=64)
+    parser.add_argument('--planks', type=int, default=20)
+    parser.add_argument('--ticks', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    world = World(args.map_size, args.zombies, args.players, args.planks, args.seed)
+    rng = random.Random(args.seed)
+    # Смещение за тик примерно как у зомби на 30 Гц (скорость 6)
+    world.steps = {zombie_id: (rng.uniform(-0.2, 0.2), rng.uniform(-0.2, 0.2))
+                   for zombie_id in world.zombie_manager.zombies}
+
+    print(f"Карта {args.map_size}, зомби {args.zombies}, игроков {args.players}, досок {args.planks}")
+    print(f"{'запрос':<18} {'перебор, мкс':>13} {'сетка, мкс':>11} {'ускорение':>10}")
+    for name, scan, grid in QUERIES:
+        if scan(world) != grid(world):
+            raise SystemExit(f"{name}: результаты перебора и сетки не совпали")
+        scan_time = timed(scan, world, args.ticks, args.repeats)
+        grid_time = timed(grid, world, args.ticks, args.repeats)
+        print(f"{name:<18} {scan_time * 1e6:>13.1f} {grid_time * 1e6:>11.1f} "
+              f"{scan_time / grid_time if grid_time else 0:>9.1f}x")
+    print(f"\nОбновление сетки за тик (move всех зомби): "
+          f"{timed(maintain_grid, world, args.ticks, args.repeats) * 1e6:.1f} мкс, "
+          f"построение заново: {timed(rebuild_grid, world, args.ticks, args.repeats) * 1e6:.1f} мкс")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import multiprocessing
+import threading
+import time
+from bot import Bot, PATHS
+from protocol import PROTOCOL_BINARY, PROTOCOL_JSON
+from bench_server import percentile
+
+def run_bots(args, first_bot, count):
+    """Запускает count ботов потоками в одном процессе и возвращает их статистику."""
+    results = [None] * count
+
+    def run(index):
+        bot = Bot(args.host, args.port, path=args.path, stream=args.delivery == 'push',
+                  protocol=args.protocol, interval=args.interval,
+                  action_interval=args.action_interval, seed=first_bot + index)
+        results[index] = bot.run(args.duration)
+
+    threads = []
+    for index in range(count):
+        # Подключения растягиваются на ramp секунд, чтобы не было одного залпа
+        time.sleep(args.ramp / max(args.bots, 1) * args.processes)
+        thread = threading.Thread(target=run, args=(index,))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return [result for result in results if result is not None]
+
+def split(total, parts):
+    # Сколько ботов достается каждому процессу
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+def report(args, results):
+    joined = [r for r in results if r['joined']]
+    join_times = [r['join_time'] for r in joined]
+    rates = [r['snapshots'] / r['duration'] for r in joined if r['duration']]
+    sizes = [size for r in joined for size in r['snapshot_bytes']]
+    snapshot_rtts = [rtt for r in joined for rtt in r['snapshot_rtts']]
+    event_rtts = [rtt for r in joined for rtt in r['event_rtts']]
+
+    print(f"Ботов подключено: {len(joined)} из {args.bots} "
+          f"(процессов {args.processes}, доставка {args.delivery}, формат {args.protocol})")
+    print(f"Подключение: p50 {percentile(join_times, 50) * 1000:.1f} мс, "
+          f"p99 {percentile(join_times, 99) * 1000:.1f} мс, "
+          f"max {max(join_times, default=0) * 1000:.1f} мс")
+    print(f"Снимков в секунду на бота: среднее {sum(rates) / max(len(rates), 1):.1f}, "
+          f"min {min(rates, default=0):.1f}")
+    print(f"Размер снимка: среднее {sum(sizes) / max(len(sizes), 1):.0f} байт, "
+          f"p50 {percentile(sizes, 50):.0f}, p99 {percentile(sizes, 99):.0f}, "
+          f"всего {sum(sizes) / 1024:.0f} КБ")
+    if snapshot_rtts:
+        print(f"Позиция -> снимок: p50 {percentile(snapshot_rtts, 50) * 1000:.2f} мс, "
+              f"p99 {percentile(snapshot_rtts, 99) * 1000:.2f} мс, "
+              f"max {max(snapshot_rtts) * 1000:.2f} мс")
+    print(f"Событие -> ответ ({len(event_rtts)}): p50 {percentile(event_rtts, 50) * 1000:.2f} мс, "
+          f"p99 {percentile(event_rtts, 99) * 1000:.2f} мс, "
+          f"max {max(event_rtts, default=0) * 1000:.2f} мс")
+    print(f"Ошибок: {sum(r['errors'] for r in results)}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест: N ботов на настоящем протоколе, распределенных по процессам")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=21491)
+    parser.add_argument('--bots', type=int, default=50)
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--duration', type=float, default=20, help="Сколько секунд играет каждый бот")
+    parser.add_argument('--ramp', type=float, default=2, help="За сколько секунд подключаются все боты")
+    parser.add_argument('--path', choices=PATHS, default='random')
+    parser.add_argument('--delivery', choices=['push', 'lockstep'], default='push',
+                        help="push - поток снимков от сервера, lockstep - снимок в ответ на позицию")
+    parser.add_argument('--protocol', choices=[PROTOCOL_BINARY, PROTOCOL_JSON], default=PROTOCOL_BINARY)
+    parser.add_argument('--interval', type=float, default=0.05, help="Пауза между позициями бота")
+    parser.add_argument('--action-interval', type=float, default=1.0,
+                        help="Пауза между выстрелами и действиями с досками")
+    args = parser.parse_args()
+    args.processes = max(1, min(args.processes, args.bots))
+
+    counts = split(args.bots, args.processes)
+    firsts = [sum(counts[:i]) for i in range(len(counts))]
+    with multiprocessing.Pool(args.processes) as pool:
+        batches = pool.starmap(run_bots, [(args, first, count) for first, count in zip(firsts, counts)])
+    report(args, [result for batch in batches for result in batch])
+
+if __name__ == "__main__":
+    main()
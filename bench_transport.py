@@ -0,0 +1,243 @@
+import argparse
+import queue
+import random
+import socket
+import threading
+import time
+from protocol import encode_message, PROTOCOL_BINARY
+from snapshot import ReceivedSnapshots
+from udp_channel import pack_datagram, unpack_datagram
+from framing import FrameReader
+from bench_server import percentile
+
+class DelayLine:
+    """Доставляет данные по порядку, каждое не раньше назначенного времени."""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.items = queue.Queue()
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def put(self, due, data):
+        self.items.put((due, data))
+
+    def run(self):
+        while True:
+            due, data = self.items.get()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.deliver(data)
+            except OSError:
+                return
+
+class TcpRelay:
+    """Прокси с потерями для TCP.
+
+    Потерянный сегмент TCP переотправляет через RTO, и все данные за ним ждут
+    (блокировка начала очереди). Поэтому здесь "потеря" задерживает кусок
+    потока на rto, а следующие куски не обгоняют его.
+    """
+
+    def __init__(self, server_addr, latency, loss, rto):
+        self.server_addr = server_addr
+        self.latency = latency
+        self.loss = loss
+        self.rto = rto
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        client, _ = self.listener.accept()
+        upstream = socket.create_connection(self.server_addr)
+        for source, target in ((client, upstream), (upstream, client)):
+            thread = threading.Thread(target=self.pump, args=(source, target))
+            thread.daemon = True
+            thread.start()
+
+    def pump(self, source, target):
+        line = DelayLine(target.sendall)
+        last_due = 0
+        while True:
+            try:
+                chunk = source.recv(65536)
+            except OSError:
+                return
+            if not chunk:
+                return
+            due = time.perf_counter() + self.latency
+            if random.random() < self.loss:
+                due += self.rto
+            last_due = max(due, last_due)
+            line.put(last_due, chunk)
+
+class UdpRelay:
+    """Прокси с потерями для UDP: потерянный пакет просто не доставляется."""
+
+    def __init__(self, server_addr, latency, loss):
+        self.latency = latency
+        self.loss = loss
+        self.client_addr = None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.upstream.connect(server_addr)
+
+        to_server = DelayLine(self.upstream.send)
+        to_client = DelayLine(lambda packet: self.sock.sendto(packet, self.client_addr))
+        for source, line in ((self.sock, to_server), (self.upstream, to_client)):
+            thread = threading.Thread(target=self.pump, args=(source, line))
+            thread.daemon = True
+            thread.start()
+
+    def pump(self, source, line):
+        while True:
+            packet, addr = source.recvfrom(65535)
+            if source is self.sock:
+                self.client_addr = addr
+            if random.random() >= self.loss:
+                line.put(time.perf_counter() + self.latency, packet)
+
+class Session:
+    """Клиент протокола поверх прокси: lockstep (запрос-ответ) или push (поток снимков)."""
+
+    def __init__(self, args, transport, delivery):
+        self.args = args
+        self.push = delivery == 'push'
+        relay = TcpRelay((args.host, args.port), args.latency, args.loss, args.rto)
+        self.sock = socket.create_connection(('127.0.0.1', relay.port))
+        # Таймаут посреди кадра не теряет данные: недочитанное остается в буфере
+        self.reader = FrameReader(self.sock)
+        init = self.reader.receive_message()
+        self.sock.sendall(encode_message({'type': 'hello', 'protocol': PROTOCOL_BINARY,
+                                          'version': init['protocols'][PROTOCOL_BINARY],
+                                          'stream': self.push}))
+        reply = self.reader.receive_message()
+        self.protocol = reply['protocol']
+        if self.push and not reply.get('stream'):
+            raise SystemExit("Сервер не поддерживает поток снимков")
+
+        self.udp = None
+        if transport == 'udp':
+            if 'udp' not in init:
+                raise SystemExit("Сервер запущен без --udp")
+            udp_relay = UdpRelay((args.host, init['udp']['port']), args.latency, args.loss)
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.connect(('127.0.0.1', udp_relay.port))
+            self.udp.settimeout(args.interval)
+            self.token = init['udp']['token']
+        else:
+            self.sock.settimeout(1 if self.push else 10)
+
+        self.received = ReceivedSnapshots()
+        self.state = None
+        self.arrivals = []  # (время получения, seq) для каждого более свежего снимка
+        self.out_seq = 0
+        self.in_seq = -1
+
+    def send_position(self):
+        message = {'x': 0, 'y': 0, 'z': 0, 'ack': self.state['seq'] if self.state else None}
+        if self.udp is None:
+            self.sock.sendall(encode_message(message, self.protocol))
+        else:
+            self.udp.send(pack_datagram(self.token, self.out_seq, message, self.protocol))
+            self.out_seq += 1
+
+    def receive_snapshot(self):
+        try:
+            if self.udp is None:
+                data = self.reader.receive_message()
+            else:
+                _, seq, data = unpack_datagram(self.udp.recv(65535))
+                if seq <= self.in_seq:
+                    return
+                self.in_seq = seq
+        except socket.timeout:
+            return
+        if data and 'seq' in data:
+            new_state = self.received.apply(data)
+            if new_state is not None and (self.state is None or new_state['seq'] > self.state['seq']):
+                self.arrivals.append((time.perf_counter(), new_state['seq']))
+            self.state = new_state
+
+    def input_loop(self, end_time):
+        while time.perf_counter() < end_time:
+            self.send_position()
+            time.sleep(self.args.interval)
+
+    def run(self):
+        end_time = time.perf_counter() + self.args.duration
+        if self.push:
+            # Ввод уходит со своей частотой, снимки принимаются по мере прихода
+            thread = threading.Thread(target=self.input_loop, args=(end_time,))
+            thread.daemon = True
+            thread.start()
+            while time.perf_counter() < end_time:
+                self.receive_snapshot()
+        else:
+            while time.perf_counter() < end_time:
+                self.send_position()
+                self.receive_snapshot()
+                time.sleep(self.args.interval)
+        self.sock.close()
+        return self.arrivals
+
+def staleness(arrivals, tick_rate, step=0.01):
+    """Возраст самого свежего полученного снимка, замеренный каждые step секунд.
+
+    Время создания снимка оценивается по его номеру и частоте тиков; самая
+    быстрая доставка принимается за нулевую задержку.
+    """
+    if len(arrivals) < 2:
+        return []
+    offset = min(arrived - seq / tick_rate for arrived, seq in arrivals)
+    ages = []
+    index = 0
+    now = arrivals[0][0]
+    while now < arrivals[-1][0]:
+        while index + 1 < len(arrivals) and arrivals[index + 1][0] <= now:
+            index += 1
+        ages.append(now - (offset + arrivals[index][1] / tick_rate))
+        now += step
+    return ages
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Частота и устаревание снимков при задержке и потерях: TCP против UDP, "
+                    "запрос-ответ против потока (сервер запускать с --udp)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=21491)
+    parser.add_argument('--transport', choices=['tcp', 'udp', 'both'], default='both')
+    parser.add_argument('--delivery', choices=['lockstep', 'push', 'both'], default='both',
+                        help="lockstep - снимок в ответ на позицию, push - сервер шлет снимки каждый тик")
+    parser.add_argument('--loss', type=float, default=0.05, help="Доля потерянных пакетов/сегментов")
+    parser.add_argument('--latency', type=float, default=0.03, help="Задержка в одну сторону, с")
+    parser.add_argument('--rto', type=float, default=0.2, help="Задержка переотправки TCP, с")
+    parser.add_argument('--interval', type=float, default=0.05, help="Пауза между позициями клиента")
+    parser.add_argument('--tick-rate', type=int, default=30, help="Частота тиков сервера")
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    transports = ['tcp', 'udp'] if args.transport == 'both' else [args.transport]
+    deliveries = ['lockstep', 'push'] if args.delivery == 'both' else [args.delivery]
+    for delivery in deliveries:
+        for transport in transports:
+            arrivals = Session(args, transport, delivery).run()
+            ages = staleness(arrivals, args.tick_rate)
+            print(f"[{delivery}/{transport}] RTT {args.latency * 2000:.0f} мс, потери {args.loss:.0%}: "
+                  f"снимков в секунду {len(arrivals) / args.duration:.1f}, "
+                  f"возраст p50 {percentile(ages, 50) * 1000:.0f} мс, "
+                  f"p99 {percentile(ages, 99) * 1000:.0f} мс, "
+                  f"max {max(ages, default=0) * 1000:.0f} мс")
+
+if __name__ == "__main__":
+    main()
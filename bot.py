@@ -0,0 +1,223 @@
+import math
+import random
+import socket
+import threading
+import time
+from collections import deque
+from protocol import encode_message, decode_payload, PROTOCOL_BINARY, PROTOCOL_JSON
+from framing import FrameReader
+from snapshot import ReceivedSnapshots
+from map_payload import local_map, download_map
+
+PATHS = ('random', 'circle')
+BOT_SPEED = 10  # Единиц в секунду, примерно как у игрока
+HIT_DAMAGE = 10
+
+class Bot:
+    """Клиент без Ursina, говорящий на настоящем протоколе игры.
+
+    Подключается, согласует формат и поток снимков, ходит по случайному
+    или круговому маршруту, стреляет по видимым зомби (hit), ставит и
+    убирает доски. Поток приема разбирает снимки и ответы на события и
+    собирает статистику: время подключения, число и размер снимков,
+    задержку ответов.
+    """
+
+    def __init__(self, host, port, path='random', stream=True, protocol=PROTOCOL_BINARY,
+                 interval=0.05, action_interval=1.0, seed=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.stream = stream
+        self.requested_protocol = protocol
+        self.interval = interval
+        self.action_interval = action_interval
+        self.rng = random.Random(seed)
+
+        self.sock = None
+        self.reader = None
+        self.send_lock = threading.Lock()
+        self.protocol = PROTOCOL_JSON
+        self.player_id = None
+        self.received = ReceivedSnapshots()
+        self.state = None
+        self.running = False
+        self.x = self.rng.uniform(-10, 10)
+        self.z = self.rng.uniform(-10, 10)
+        self.heading = self.rng.uniform(0, 2 * math.pi)
+
+        # Отправленные запросы, на которые сервер всегда отвечает (place/remove_plank)
+        self.pending_events = deque()
+        self.position_sent = None  # Время последней позиции без ответа (запрос-ответ)
+        self.snapshot_arrived = threading.Event()
+
+        self.join_time = None
+        self.snapshots = 0
+        self.snapshot_bytes = []
+        self.snapshot_rtts = []
+        self.event_rtts = []
+        self.events_sent = 0
+        self.errors = 0
+        self.started = None
+        self.finished = None
+
+    def send(self, data):
+        with self.send_lock:
+            self.sock.sendall(encode_message(data, self.protocol))
+
+    def connect(self):
+        started = time.perf_counter()
+        self.sock = socket.create_connection((self.host, self.port), timeout=10)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = FrameReader(self.sock)
+        initial = self.reader.receive_message()
+        if not initial or 'id' not in initial:
+            raise ConnectionError("Неверный формат начальных данных")
+        self.player_id = str(initial['id'])
+
+        map_data = local_map(initial)
+        map_requested = False
+        if 'protocols' in initial:
+            # Карта заказывается в hello: отдельный get_map после подписки встал бы за снимками
+            request = {'type': 'hello', 'stream': self.stream and initial.get('stream', False),
+                       'get_map': map_data is None}
+            version = initial['protocols'].get(self.requested_protocol)
+            if version is not None:
+                request.update(protocol=self.requested_protocol, version=version)
+            self.send(request)
+            reply = self.reader.receive_message()
+            if not reply:
+                raise ConnectionError("Сервер не ответил на hello")
+            self.protocol = reply['protocol']
+            self.stream = reply.get('stream', False)
+            map_requested = reply.get('map', False)
+        else:
+            self.stream = False
+        if map_data is None:
+            download_map(initial['map_info'], self.send, self.reader.receive_message,
+                         requested=map_requested)
+        self.join_time = time.perf_counter() - started
+        self.sock.settimeout(None)
+
+    def receive_loop(self):
+        while self.running:
+            try:
+                frame = self.reader.receive_frame()
+                if frame is None:
+                    break
+                size = len(frame)
+                with frame:
+                    data = decode_payload(frame)
+            except (OSError, ValueError):
+                break
+            now = time.perf_counter()
+            if 'seq' in data:
+                self.on_snapshot(data, size, now)
+            elif ('plank_placed' in data or 'plank_removed' in data) and self.pending_events:
+                # Ответы на доски приходят по TCP в порядке запросов; на hit ответ бывает не всегда
+                self.event_rtts.append(now - self.pending_events.popleft())
+        self.running = False
+        self.snapshot_arrived.set()
+
+    def on_snapshot(self, data, size, now):
+        self.snapshots += 1
+        self.snapshot_bytes.append(size)
+        if self.position_sent is not None:
+            self.snapshot_rtts.append(now - self.position_sent)
+            self.position_sent = None
+        state = self.received.apply(data)
+        if state is not None:
+            self.state = state
+        self.snapshot_arrived.set()
+
+    def move(self, dt):
+        if self.path == 'circle':
+            self.heading += dt * BOT_SPEED / 20
+            self.x = 20 * math.cos(self.heading)
+            self.z = 20 * math.sin(self.heading)
+            return
+        self.heading += self.rng.uniform(-0.5, 0.5)
+        self.x = max(-70, min(70, self.x + math.cos(self.heading) * BOT_SPEED * dt))
+        self.z = max(-70, min(70, self.z + math.sin(self.heading) * BOT_SPEED * dt))
+
+    def send_position(self):
+        ack = self.state['seq'] if self.state else None
+        if not self.stream:
+            self.snapshot_arrived.clear()
+            self.position_sent = time.perf_counter()
+        self.send({'x': self.x, 'y': 1, 'z': self.z, 'ack': ack})
+
+    def act(self):
+        """Одно случайное событие: выстрел по зомби, установка или снятие доски."""
+        state = self.state or {}
+        zombies = [zid for zid, z in state.get('zombies', {}).items() if z['is_alive']]
+        placed = list(state.get('planks', {}).get('placed', {}))
+        choice = self.rng.random()
+        if choice < 0.5 and zombies:
+            self.send({'type': 'hit', 'target_id': int(self.rng.choice(zombies)), 'damage': HIT_DAMAGE})
+        elif choice < 0.8 or not placed:
+            self.pending_events.append(time.perf_counter())
+            self.send({'type': 'place_plank', 'x': self.x + 2, 'y': 0, 'z': self.z,
+                       'rotation': self.rng.choice((0, 90)), 'is_wall': self.rng.random() < 0.5})
+        else:
+            self.pending_events.append(time.perf_counter())
+            self.send({'type': 'remove_plank', 'plank_id': int(self.rng.choice(placed))})
+        self.events_sent += 1
+
+    def run(self, duration):
+        """Подключается и играет duration секунд. Возвращает статистику."""
+        try:
+            self.connect()
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            print(f"Бот не подключился: {e}")
+            return self.stats()
+
+        self.running = True
+        receiver = threading.Thread(target=self.receive_loop, name="bot-receiver")
+        receiver.daemon = True
+        receiver.start()
+
+        self.started = time.perf_counter()
+        end_time = self.started + duration
+        next_action = self.started + self.rng.uniform(0, self.action_interval)
+        last = self.started
+        try:
+            while self.running and time.perf_counter() < end_time:
+                now = time.perf_counter()
+                self.move(now - last)
+                last = now
+                self.send_position()
+                if now >= next_action:
+                    self.act()
+                    next_action = now + self.action_interval
+                if not self.stream:
+                    # Запрос-ответ: следующая позиция только после снимка
+                    self.snapshot_arrived.wait(5)
+                time.sleep(self.interval)
+        except OSError as e:
+            self.errors += 1
+            print(f"Бот потерял соединение: {e}")
+        self.finished = time.perf_counter()
+        self.running = False
+        try:
+            # Будим поток приема, заблокированный в recv
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        return self.stats()
+
+    def stats(self):
+        duration = (self.finished - self.started) if self.started and self.finished else 0
+        return {
+            'joined': self.join_time is not None,
+            'join_time': self.join_time,
+            'duration': duration,
+            'snapshots': self.snapshots,
+            'snapshot_bytes': self.snapshot_bytes,
+            'snapshot_rtts': self.snapshot_rtts,
+            'event_rtts': self.event_rtts,
+            'events_sent': self.events_sent,
+            'errors': self.errors
+        }
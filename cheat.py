@@ -7,6 +7,9 @@ import math
 from collections import deque
 import threading
 import queue
+from protocol import encode_message
+from framing import FrameReader
+from map_payload import receive_map
 
 # Константы
 BULLET_SPEED = 30
@@ -48,6 +51,7 @@ NETWORK_UPDATE_INTERVAL = 0.0005  # 20 обновлений в секунду
 network_data = None  # Глобальная переменная для хранения последних полученных данных
 network_lock = threading.Lock()  # Для безопасного доступа к network_data
 client_socket = None
+frame_reader = None
 running = True
 interpolated_zombies = {}  # Словарь для хранения интерполированных зомби
 interpolated_players = {}  # Словарь для хранения интерполированных игроков
@@ -245,35 +249,13 @@ def create_plank():
 
 def send_data(data):
     try:
-        message = json.dumps(data).encode()
-        message_length = len(message)
-        header = str(message_length).encode().ljust(10)
-        client_socket.send(header + message)
+        client_socket.send(encode_message(data))
     except Exception as e:
         print(f"Ошибка при отправке данных: {e}")
 
 def receive_data():
     try:
-        # Получаем заголовок
-        header = b""
-        while len(header) < 10:
-            chunk = client_socket.recv(10 - len(header))
-            if not chunk:
-                return None
-            header += chunk
-        
-        # Получаем длину сообщения
-        message_length = int(header.decode().strip())
-        
-        # Получаем само сообщение
-        message = b""
-        while len(message) < message_length:
-            chunk = client_socket.recv(min(message_length - len(message), 4096))
-            if not chunk:
-                return None
-            message += chunk
-        
-        return json.loads(message.decode())
+        return frame_reader.receive_message()
     except Exception as e:
         print(f"Ошибка при получении данных: {e}")
         return None
@@ -326,20 +308,21 @@ def stop_network_thread():
         network_thread.join()
 
 def initialize_game():
-    global player_id, map_data, client_socket, player, health_text, planks_count_text, is_alive, player_health
+    global player_id, map_data, client_socket, frame_reader, player, health_text, planks_count_text, is_alive, player_health
 
     try:
         # Подключаемся к серверу
         client_socket = socket.socket()
         client_socket.connect(('127.0.0.1', 21491))
+        frame_reader = FrameReader(client_socket)
 
         # Получаем начальные данные
         data = receive_data()
-        if not data or 'id' not in data or 'map' not in data:
+        if not data or 'id' not in data or ('map' not in data and 'map_info' not in data):
             raise Exception("Неверный формат начальных данных")
 
         player_id = data['id']
-        map_data = data['map']
+        map_data = receive_map(data, send_data, receive_data)
 
         # Создаем карту
         for platform_data in map_data:
@@ -9,6 +9,11 @@ import threading
 import queue
 from direct.actor.Actor import Actor
 from ursina.prefabs.animation import Animation
+from protocol import encode_message, PROTOCOL_JSON, PROTOCOL_BINARY, BINARY_VERSION
+from framing import FrameReader
+from map_payload import local_map, download_map
+from snapshot import ReceivedSnapshots
+from udp_channel import pack_datagram, unpack_datagram
 IP = "127.0.0.1"
 cport = 21491
 # Константы
@@ -50,7 +55,17 @@ last_network_update = 0
 NETWORK_UPDATE_INTERVAL = 0.0005  # 20 обновлений в секунду
 network_data = None  # Глобальная переменная для хранения последних полученных данных
 network_lock = threading.Lock()  # Для безопасного доступа к network_data
+received_snapshots = ReceivedSnapshots()  # Базовые снимки для дельт сервера
 client_socket = None
+frame_reader = None  # Буфер приема TCP: кадры могут приходить частями и по несколько за раз
+protocol = PROTOCOL_JSON  # Формат сообщений, согласованный с сервером
+udp_socket = None  # Позиции и снимки по UDP, если сервер его предлагает
+udp_token = None
+udp_out_seq = 0
+udp_in_seq = -1
+UDP_SNAPSHOT_TIMEOUT = 0.1  # Сколько ждать ответный снимок, прежде чем слать следующую позицию
+streaming = False  # Сервер сам присылает снимки каждый тик
+INPUT_SEND_INTERVAL = 0.05  # Пауза между отправками позиции
 running = True
 interpolated_zombies = {}  # Словарь для хранения интерполированных зомби
 interpolated_players = {}  # Словарь для хранения интерполированных игроков
@@ -260,68 +275,116 @@ def create_plank():
 
 def send_data(data):
     try:
-        message = json.dumps(data).encode()
-        message_length = len(message)
-        header = str(message_length).encode().ljust(10)
-        client_socket.send(header + message)
+        client_socket.send(encode_message(data, protocol))
     except Exception as e:
         print(f"Ошибка при отправке данных: {e}")
 
 def receive_data():
     try:
-        # Получаем заголовок
-        header = b""
-        while len(header) < 10:
-            chunk = client_socket.recv(10 - len(header))
-            if not chunk:
-                return None
-            header += chunk
-        
-        # Получаем длину сообщения
-        message_length = int(header.decode().strip())
-        
-        # Получаем само сообщение
-        message = b""
-        while len(message) < message_length:
-            chunk = client_socket.recv(min(message_length - len(message), 4096))
-            if not chunk:
-                return None
-            message += chunk
-        
-        return json.loads(message.decode())
+        return frame_reader.receive_message()
     except Exception as e:
         print(f"Ошибка при получении данных: {e}")
         return None
 
+def start_udp(udp_info):
+    global udp_socket, udp_token
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.connect((IP, udp_info['port']))
+    udp_socket.settimeout(UDP_SNAPSHOT_TIMEOUT)
+    udp_token = udp_info['token']
+
+    # По TCP теперь приходят только ответы на события - читаем их отдельно
+    reliable_thread = threading.Thread(target=reliable_loop)
+    reliable_thread.daemon = True
+    reliable_thread.start()
+
+def send_state(data):
+    global udp_out_seq
+    if udp_socket is None:
+        send_data(data)
+        return
+    udp_socket.send(pack_datagram(udp_token, udp_out_seq, data, protocol))
+    udp_out_seq += 1
+
+def receive_state():
+    """Следующий снимок; по UDP при потере пакета возвращает пустой словарь."""
+    global udp_in_seq
+    if udp_socket is None:
+        return receive_data()
+    try:
+        token, seq, data = unpack_datagram(udp_socket.recv(65535))
+    except socket.timeout:
+        return {}
+    # Опоздавший пакет старее уже примененного - отбрасываем
+    if token != udp_token or seq <= udp_in_seq:
+        return {}
+    udp_in_seq = seq
+    return data
+
+def reliable_loop():
+    global running
+    while running:
+        if receive_data() is None:
+            print("Потеряно соединение с сервером")
+            running = False
+
+def apply_snapshot(data):
+    global network_data
+    # Снимки приходят дельтами от подтвержденного состояния,
+    # ответы на события (попадания, доски) состояние не меняют
+    if 'seq' in data:
+        with network_lock:
+            network_data = received_snapshots.apply(data)
+
+def send_input():
+    # Отправляем позицию и направление взгляда
+    with network_lock:
+        send_state({
+            'x': player.x,
+            'y': player.y,
+            'z': player.z,
+            'shooting': held_keys['left mouse'] and py_time.time() - last_shot_time < 0.1,
+            'shoot_dir_x': camera.forward.x,
+            'shoot_dir_y': camera.forward.y,
+            'shoot_dir_z': camera.forward.z,
+            'ack': network_data.get('seq') if network_data else None
+        })
+
 def network_loop():
-    global network_data, running
+    """Отправка ввода с собственной частотой.
+
+    Со старым сервером (без потока снимков) здесь же ждем ответный снимок.
+    """
+    global running
     while running:
         try:
-            # Отправляем позицию и направление взгляда
-            with network_lock:
-                send_data({
-                    'x': player.x,
-                    'y': player.y,
-                    'z': player.z,
-                    'shooting': held_keys['left mouse'] and py_time.time() - last_shot_time < 0.1,
-                    'shoot_dir_x': camera.forward.x,
-                    'shoot_dir_y': camera.forward.y,
-                    'shoot_dir_z': camera.forward.z
-                })
+            send_input()
 
-            # Получаем данные
-            data = receive_data()
-            if data:
-                with network_lock:
-                    global network_data
-                    network_data = data
-            else:
+            if not streaming:
+                data = receive_state()
+                if data is None:
+                    print("Потеряно соединение с сервером")
+                    running = False
+                    break
+                apply_snapshot(data)
+
+            py_time.sleep(INPUT_SEND_INTERVAL)
+        except Exception as e:
+            print(f"Ошибка сети: {e}")
+            running = False
+            break
+
+def snapshot_loop():
+    # Сервер присылает снимки с частотой тиков; применяем каждый, показываем самый свежий
+    global running
+    while running:
+        try:
+            data = receive_state()
+            if data is None:
                 print("Потеряно соединение с сервером")
                 running = False
                 break
-
-            # Небольшая задержка
-            py_time.sleep(0.05)
+            apply_snapshot(data)
         except Exception as e:
             print(f"Ошибка сети: {e}")
             running = False
@@ -340,21 +403,45 @@ def stop_network_thread():
     if network_thread:
         network_thread.join()
 
+def negotiate(initial_data, get_map=False):
+    """Согласует формат и подписку; get_map - заказать карту в hello. Возвращает, придет ли карта."""
+    global protocol, streaming
+    # Старый сервер не присылает список форматов - остаемся на JSON и запросах
+    if 'protocols' not in initial_data:
+        return False
+    request = {'type': 'hello', 'stream': initial_data.get('stream', False), 'get_map': get_map}
+    if initial_data['protocols'].get(PROTOCOL_BINARY) == BINARY_VERSION:
+        request.update(protocol=PROTOCOL_BINARY, version=BINARY_VERSION)
+    send_data(request)
+    reply = receive_data()
+    if reply and reply.get('type') == 'hello':
+        protocol = reply['protocol']
+        streaming = reply.get('stream', False)
+        return reply.get('map', False)
+    return False
+
 def initialize_game():
-    global player_id, map_data, client_socket, player, health_text, planks_count_text, is_alive, player_health
+    global player_id, map_data, client_socket, frame_reader, player, health_text, planks_count_text, is_alive, player_health
 
     try:
         # Подключаемся к серверу
         client_socket = socket.socket()
         client_socket.connect((IP, cport))
+        frame_reader = FrameReader(client_socket)
 
         # Получаем начальные данные
         data = receive_data()
-        if not data or 'id' not in data or 'map' not in data:
+        if not data or 'id' not in data or ('map' not in data and 'map_info' not in data):
             raise Exception("Неверный формат начальных данных")
 
         player_id = data['id']
-        map_data = data['map']
+        map_data = local_map(data)
+        map_requested = negotiate(data, get_map=map_data is None)
+        if map_data is None:
+            # До запуска потоков сети: карту читаем сами
+            map_data = download_map(data['map_info'], send_data, receive_data, requested=map_requested)
+        if 'udp' in data:
+            start_udp(data['udp'])
 
         # Создаем карту
         for platform_data in map_data:
@@ -399,6 +486,11 @@ def initialize_game():
         network_thread.daemon = True
         network_thread.start()
 
+        if streaming:
+            snapshot_thread = threading.Thread(target=snapshot_loop)
+            snapshot_thread.daemon = True
+            snapshot_thread.start()
+
         return True
 
     except Exception as e:
@@ -0,0 +1,115 @@
+import math
+from array import array
+
+WALL_TEXTURES = ('brick', 'cobblestone')
+COLLISION_CELL = 8  # Сторона ячейки широкой фазы
+MAX_MARGIN = 2.0  # Наибольший запас вокруг стены, с которым можно спрашивать
+
+class CollisionWorld:
+    """Неизменяемые стены карты для проверок столкновений.
+
+    Строится один раз по результату generate_map и общий для всех менеджеров.
+    Стена хранится как повернутый прямоугольник в плоскости XZ: центр,
+    cos и sin поворота и половины размеров лежат в плотных массивах, и
+    тригонометрия не считается при каждой проверке. Широкая фаза - сетка:
+    в ячейке перечислены стены, чья ограничивающая рамка (вместе с запасом
+    MAX_MARGIN вокруг повернутой стены) ее задевает, поэтому запрос проверяет только ближайшие стены.
+    """
+
+    def __init__(self, map_data, cell_size=COLLISION_CELL, max_margin=MAX_MARGIN):
+        walls = [obj for obj in map_data if obj.get('texture') in WALL_TEXTURES]
+        self.cell_size = cell_size
+        self.max_margin = max_margin
+        self.x = array('d')
+        self.z = array('d')
+        self.cos = array('d')
+        self.sin = array('d')
+        self.half_x = array('d')
+        self.half_z = array('d')
+        cells = {}
+        for index, wall in enumerate(walls):
+            angle = math.radians(wall['rotation_y'])
+            cos, sin = math.cos(angle), math.sin(angle)
+            half_x, half_z = wall['scale_x'] / 2, wall['scale_z'] / 2
+            self.x.append(wall['x'])
+            self.z.append(wall['z'])
+            self.cos.append(cos)
+            self.sin.append(sin)
+            self.half_x.append(half_x)
+            self.half_z.append(half_z)
+
+            # Рамка по осям мира для прямоугольника, расширенного на max_margin до поворота:
+            # у повернутой стены запас выступает за рамку без запаса до sqrt(2) раз дальше
+            extent_x = abs(cos) * (half_x + max_margin) + abs(sin) * (half_z + max_margin)
+            extent_z = abs(sin) * (half_x + max_margin) + abs(cos) * (half_z + max_margin)
+            for cell in self._cells_between(wall['x'] - extent_x, wall['z'] - extent_z,
+                                            wall['x'] + extent_x, wall['z'] + extent_z):
+                cells.setdefault(cell, []).append(index)
+        self.cells = {cell: tuple(indices) for cell, indices in cells.items()}
+
+    def __len__(self):
+        return len(self.x)
+
+    def _cells_between(self, min_x, min_z, max_x, max_z):
+        cell_size = self.cell_size
+        for cx in range(math.floor(min_x / cell_size), math.floor(max_x / cell_size) + 1):
+            for cz in range(math.floor(min_z / cell_size), math.floor(max_z / cell_size) + 1):
+                yield cx, cz
+
+    def _check_margin(self, margin):
+        if margin > self.max_margin:
+            raise ValueError(f"Запас {margin} больше заложенного в сетку ({self.max_margin})")
+
+    def point_blocked(self, x, z, margin=0.0):
+        """Точка внутри какой-либо стены, расширенной на margin с каждой стороны."""
+        self._check_margin(margin)
+        indices = self.cells.get((math.floor(x / self.cell_size), math.floor(z / self.cell_size)))
+        if indices is None:
+            return False
+        wall_x, wall_z, cos, sin = self.x, self.z, self.cos, self.sin
+        half_x, half_z = self.half_x, self.half_z
+        for i in indices:
+            dx = x - wall_x[i]
+            dz = z - wall_z[i]
+            if (abs(dx * cos[i] + dz * sin[i]) < half_x[i] + margin and
+                    abs(dz * cos[i] - dx * sin[i]) < half_z[i] + margin):
+                return True
+        return False
+
+    def segment_blocked(self, x0, z0, x1, z1, margin=0.0):
+        """Отрезок от (x0, z0) до (x1, z1) задевает какую-либо стену, расширенную на margin."""
+        self._check_margin(margin)
+        candidates = set()
+        for cell in self._cells_between(min(x0, x1), min(z0, z1), max(x0, x1), max(z0, z1)):
+            indices = self.cells.get(cell)
+            if indices is not None:
+                candidates.update(indices)
+        for i in candidates:
+            cos, sin = self.cos[i], self.sin[i]
+            # Концы отрезка в координатах стены
+            dx0, dz0 = x0 - self.x[i], z0 - self.z[i]
+            dx1, dz1 = x1 - self.x[i], z1 - self.z[i]
+            start = (dx0 * cos + dz0 * sin, dz0 * cos - dx0 * sin)
+            end = (dx1 * cos + dz1 * sin, dz1 * cos - dx1 * sin)
+            if _segment_hits_box(start, end, self.half_x[i] + margin, self.half_z[i] + margin):
+                return True
+        return False
+
+def _segment_hits_box(start, end, half_x, half_z):
+    """Пересечение отрезка с прямоугольником |x| < half_x, |z| < half_z (метод отсекающих полос)."""
+    t_min, t_max = 0.0, 1.0
+    for origin, delta, half in ((start[0], end[0] - start[0], half_x),
+                                (start[1], end[1] - start[1], half_z)):
+        if delta == 0:
+            if abs(origin) >= half:
+                return False
+            continue
+        t0 = (-half - origin) / delta
+        t1 = (half - origin) / delta
+        if t0 > t1:
+            t0, t1 = t1, t0
+        t_min = max(t_min, t0)
+        t_max = min(t_max, t1)
+        if t_min >= t_max:
+            return False
+    return True
@@ -0,0 +1,21 @@
+import threading
+import pytest
+from async_server import AsyncGameServer
+from server import GameServer
+
+SERVER_MODES = {'threaded': GameServer, 'asyncio': AsyncGameServer}
+
+@pytest.fixture(scope='module', params=[{}], ids=['threaded'])
+def server(request):
+    """Сервер на свободном порту с картой по постоянному seed.
+
+    Параметр - режим (mode: threaded или asyncio) и опции GameServer; модуль
+    задает их через parametrize('server', ..., indirect=True). Потоки сервера -
+    демоны и завершатся вместе с тестами.
+    """
+    options = dict(request.param)
+    server_class = SERVER_MODES[options.pop('mode', 'threaded')]
+    server = server_class(port=0, announce=False, map_seed=7, **options)
+    threading.Thread(target=server.run, daemon=True).start()
+    assert server.metrics.ready.wait(10)
+    return server
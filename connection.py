@@ -0,0 +1,197 @@
+import socket
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from protocol import encode_message, EncodedMessage, PROTOCOL_JSON
+from metrics import message_type
+from game_log import get_logger
+
+OUTBOUND_QUEUE_SIZE = 32  # Максимум кадров в очереди на отправку одному клиенту
+POLICY_DROP = 'drop'  # Переполнение: выбрасываем старые снимки, события сохраняем
+POLICY_DISCONNECT = 'disconnect'  # Переполнение: то же, но после порога отключаем клиента
+SLOW_CLIENT_POLICIES = (POLICY_DROP, POLICY_DISCONNECT)
+DISCONNECT_AFTER = 64  # Переполнений подряд (без опустошения очереди) до отключения
+
+log = get_logger('connection')
+
+def is_snapshot(data):
+    """Снимок мира можно выбросить: следующий все равно считается от подтвержденного."""
+    return isinstance(data, EncodedMessage) or 'seq' in data
+
+class Connection(ABC):
+    """Ограниченная очередь исходящих кадров клиента.
+
+    send() только кладет кадр в очередь и никогда не пишет в сокет, поэтому
+    его можно вызывать откуда угодно, в том числе под блокировками мира.
+    Очередь разбирает отдельный писатель (поток или задача asyncio), которого
+    подкласс будит через wakeup().
+    """
+
+    def __init__(self, name, max_queue=OUTBOUND_QUEUE_SIZE, policy=POLICY_DROP,
+                 disconnect_after=DISCONNECT_AFTER, metrics=None):
+        self.name = name
+        self.metrics = metrics
+        self.max_queue = max_queue
+        self.policy = policy
+        self.disconnect_after = disconnect_after
+        self.frames = deque()  # (кадр, можно ли выбросить, тип для метрик)
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.overflows = 0  # Переполнения с момента, когда очередь была пустой
+        self.max_depth = 0
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.dropped_snapshots = 0
+        self.overflow_disconnect = False
+
+    def send(self, data, protocol=PROTOCOL_JSON, droppable=None, kind=None):
+        if droppable is None:
+            droppable = is_snapshot(data)
+        frame = encode_message(data, protocol)
+        if self.metrics and kind is None:
+            kind = message_type(data)
+        disconnect = False
+        with self.lock:
+            if self.closed:
+                return False
+            accepted = True
+            if len(self.frames) >= self.max_queue:
+                self.overflows += 1
+                if not self.drop_oldest_snapshot():
+                    if droppable:
+                        # В очереди одни события - выбрасываем новый снимок
+                        self.dropped_snapshots += 1
+                        accepted = False
+                    elif len(self.frames) >= self.max_queue * 2:
+                        # События терять нельзя, но и копить их бесконечно тоже
+                        disconnect = True
+                if self.policy == POLICY_DISCONNECT and self.overflows >= self.disconnect_after:
+                    disconnect = True
+            if accepted and not disconnect:
+                self.frames.append((frame, droppable, kind))
+                self.max_depth = max(self.max_depth, len(self.frames))
+        if disconnect:
+            log.warning("[%s] Очередь отправки переполнена, клиент отключается", self.name)
+            self.overflow_disconnect = True
+            self.close()
+            return False
+        self.wakeup()
+        return accepted
+
+    def drop_oldest_snapshot(self):
+        # Вызывается под self.lock
+        for index, (_, queued_droppable, _) in enumerate(self.frames):
+            if queued_droppable:
+                del self.frames[index]
+                self.dropped_snapshots += 1
+                return True
+        return False
+
+    def take(self):
+        with self.lock:
+            frames = [(frame, kind) for frame, _, kind in self.frames]
+            self.frames.clear()
+            self.overflows = 0
+        return frames
+
+    def record_sent(self, frames):
+        self.sent_frames += len(frames)
+        self.sent_bytes += sum(len(frame) for frame, _ in frames)
+        if self.metrics:
+            for frame, kind in frames:
+                self.metrics.record_out(kind, len(frame))
+
+    def depth(self):
+        return len(self.frames)
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'sent_frames': self.sent_frames,
+            'sent_bytes': self.sent_bytes,
+            'dropped_snapshots': self.dropped_snapshots,
+            'overflow_disconnect': self.overflow_disconnect
+        }
+
+    @abstractmethod
+    def wakeup(self):
+        """Будит писателя очереди; вызывается из любого потока."""
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.frames.clear()
+        self.wakeup()
+
+class SocketConnection(Connection):
+    """Очередь для потокового сервера: пишет отдельный поток на клиента."""
+
+    def __init__(self, sock, name, **options):
+        super().__init__(name, **options)
+        self.sock = sock
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"{name}-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wakeup(self):
+        self.ready.set()
+
+    def run(self):
+        while True:
+            self.ready.wait()
+            self.ready.clear()
+            if self.closed:
+                break
+            frames = self.take()
+            if not frames:
+                continue
+            try:
+                self.sock.sendall(b''.join(frame for frame, _ in frames))
+                self.record_sent(frames)
+            except OSError as e:
+                log.warning("[%s] Ошибка при отправке данных: %s", self.name, e)
+                self.close()
+                break
+        try:
+            # Будим поток чтения, если закрываемся по своей инициативе
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class StreamConnection(Connection):
+    """Очередь для asyncio-сервера: пишет задача в event loop."""
+
+    def __init__(self, writer, name, **options):
+        # asyncio нужен только этому режиму: его импорт заметно удлиняет старт сервера
+        import asyncio
+        super().__init__(name, **options)
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.task = self.loop.create_task(self.run())
+
+    def wakeup(self):
+        # send() может вызываться из потока симуляции
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            if self.closed:
+                break
+            frames = self.take()
+            if not frames:
+                continue
+            try:
+                self.writer.write(b''.join(frame for frame, _ in frames))
+                await self.writer.drain()
+                self.record_sent(frames)
+            except (OSError, ConnectionError) as e:
+                log.warning("[%s] Ошибка при отправке данных: %s", self.name, e)
+                self.close()
+                break
+        self.writer.close()
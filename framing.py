@@ -0,0 +1,108 @@
+from protocol import decode_payload, HEADER_SIZE, ProtocolError
+
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Больше не бывает даже у начальных данных с картой
+RECEIVE_BUFFER_SIZE = 64 * 1024
+
+class FrameError(ProtocolError):
+    pass
+
+class FrameDecoder:
+    """Разбирает поток байт на кадры: ASCII-заголовок длины и тело.
+
+    Данные читаются в заранее выделенный bytearray (recv_into), кадры
+    отдаются как memoryview без копирования. Одно чтение может принести
+    несколько кадров или только часть одного - недочитанный хвост
+    остается в буфере до следующего чтения. Кадр действителен до следующего
+    вызова recv_from/feed, поэтому его нужно разобрать сразу.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE, buffer_size=RECEIVE_BUFFER_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(buffer_size)
+        self.start = 0  # Начало неразобранных данных
+        self.end = 0  # Конец прочитанных данных
+        self.needed = HEADER_SIZE  # Сколько байт нужно для следующего кадра целиком
+
+    def reserve(self):
+        """Освобождает место под следующее чтение и возвращает view на свободную часть."""
+        pending = self.end - self.start
+        if self.start and (pending == 0 or len(self.buffer) - self.end < len(self.buffer) // 4):
+            # Сдвигаем хвост в начало буфера
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, pending
+        if self.needed > len(self.buffer) - self.start or self.end == len(self.buffer):
+            # Кадр больше буфера или буфер заполнен неразобранными кадрами -
+            # выделяем новый, старые кадры остаются действительными
+            buffer = bytearray(max(self.needed, len(self.buffer) * 2))
+            buffer[:pending] = self.buffer[self.start:self.end]
+            self.buffer, self.start, self.end = buffer, 0, pending
+        return memoryview(self.buffer)[self.end:]
+
+    def recv_from(self, sock):
+        """Одно чтение из сокета. Возвращает число байт (0 - соединение закрыто)."""
+        with self.reserve() as view:
+            received = sock.recv_into(view)
+        self.end += received
+        return received
+
+    def feed(self, data):
+        # Для asyncio: данные уже прочитаны из потока
+        while data:
+            with self.reserve() as view:
+                count = min(len(view), len(data))
+                view[:count] = data[:count]
+            self.end += count
+            data = data[count:]
+
+    def next_frame(self):
+        """Следующий целый кадр (memoryview тела) или None, если данных пока мало."""
+        pending = self.end - self.start
+        if pending < HEADER_SIZE:
+            self.needed = HEADER_SIZE
+            return None
+        header = bytes(self.buffer[self.start:self.start + HEADER_SIZE])
+        try:
+            length = int(header)
+        except ValueError:
+            raise FrameError(f"Некорректный заголовок кадра: {header!r}")
+        if length < 0 or length > self.max_frame_size:
+            raise FrameError(f"Недопустимый размер кадра: {length}")
+        if pending < HEADER_SIZE + length:
+            self.needed = HEADER_SIZE + length
+            return None
+        body_start = self.start + HEADER_SIZE
+        self.start = body_start + length
+        self.needed = HEADER_SIZE
+        return memoryview(self.buffer)[body_start:self.start]
+
+    def messages(self):
+        # Все целые кадры, уже лежащие в буфере
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            with frame:
+                yield decode_payload(frame)
+
+class FrameReader:
+    """Блокирующее чтение сообщений из сокета через FrameDecoder."""
+
+    def __init__(self, sock, max_frame_size=MAX_FRAME_SIZE):
+        self.sock = sock
+        self.decoder = FrameDecoder(max_frame_size)
+
+    def receive_frame(self):
+        while True:
+            frame = self.decoder.next_frame()
+            if frame is not None:
+                return frame
+            if self.decoder.recv_from(self.sock) == 0:
+                return None
+
+    def receive_message(self):
+        """Следующее сообщение или None, если соединение закрыто."""
+        frame = self.receive_frame()
+        if frame is None:
+            return None
+        with frame:
+            return decode_payload(frame)
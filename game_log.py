@@ -0,0 +1,144 @@
+import argparse
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+ROOT_LOGGER = 'shooter'
+LOG_FORMAT = '%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+QUEUE_SIZE = 10000  # Записей в очереди до вывода; сверх этого записи выбрасываются
+SITE_RATE = 20  # Записей в секунду с одного места вызова по умолчанию
+TRACE_KINDS = ('zombie', 'player')
+
+# Не ограничивать частоту записи (extra=UNLIMITED): ошибки старта, трассировки
+UNLIMITED = {'rate': None}
+
+_traced = set()  # (вид, id) сущностей с включенной трассировкой
+_listener = None
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+class SiteLimiter(logging.Filter):
+    """Выборка и ограничение частоты записей по месту вызова (файл и строка).
+
+    Место вызова может задать свои параметры через extra: every=N оставляет
+    каждую N-ю запись, rate=N - не больше N записей в секунду (None - без
+    ограничения). Число пропущенных записей дописывается к следующей
+    прошедшей записи с того же места.
+    """
+
+    def __init__(self, rate=SITE_RATE):
+        super().__init__()
+        self.rate = rate
+        self.sites = {}  # (файл, строка) -> [начало окна, записей в окне, пропущено, всего]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        every = getattr(record, 'every', 1)
+        rate = getattr(record, 'rate', self.rate)
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = [time.monotonic(), 0, 0, 0]
+            site[3] += 1
+            if every > 1 and site[3] % every:
+                site[2] += 1
+                return False
+            if rate is not None:
+                now = time.monotonic()
+                if now - site[0] >= 1.0:
+                    site[0] = now
+                    site[1] = 0
+                if site[1] >= rate:
+                    site[2] += 1
+                    return False
+                site[1] += 1
+            suppressed, site[2] = site[2], 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} (пропущено похожих: {suppressed})"
+            record.args = None
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который никогда не ждет: при полной очереди запись выбрасывается."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def setup_logging(level='INFO', trace=()):
+    """Настраивает вывод логов сервера через очередь и отдельный поток.
+
+    Потоки симуляции и сети только кладут запись в очередь, а в терминал ее
+    пишет поток QueueListener, поэтому медленный вывод их не задерживает.
+    trace - сущности (вид, id), для которых пишутся отладочные трассировки
+    независимо от уровня.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SiteLimiter())
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    root.propagate = False
+
+    _traced.clear()
+    for kind, entity_id in trace:
+        set_trace(kind, entity_id)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    return handler
+
+def set_trace(kind, entity_id, enabled=True):
+    """Включает или выключает трассировку одной сущности, в том числе на ходу."""
+    if enabled:
+        _traced.add((kind, entity_id))
+        # Трассировки пишутся на уровне DEBUG, даже если общий уровень выше
+        trace_logger.setLevel(logging.DEBUG)
+    else:
+        _traced.discard((kind, entity_id))
+
+def traced(kind, entity_id):
+    return bool(_traced) and (kind, entity_id) in _traced
+
+def traced_ids(kind):
+    """id сущностей одного вида с включенной трассировкой (для пакетной обработки)."""
+    return [entity_id for traced_kind, entity_id in _traced if traced_kind == kind]
+
+def trace(kind, entity_id, msg, *args):
+    """Отладочная запись о конкретной сущности; без включенной трассировки почти ничего не стоит."""
+    if _traced and (kind, entity_id) in _traced:
+        trace_logger.debug(f"{kind} {entity_id}: {msg}", *args, extra=UNLIMITED)
+
+def parse_trace(value):
+    """Аргумент --trace вида zombie:5 или player:0."""
+    kind, _, entity_id = value.partition(':')
+    if kind not in TRACE_KINDS or not entity_id.isdigit():
+        raise argparse.ArgumentTypeError(f"ожидается {' или '.join(TRACE_KINDS)}:<id>, получено {value!r}")
+    return kind, int(entity_id)
+
+def add_logging_arguments(parser):
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='INFO')
+    parser.add_argument('--trace', type=parse_trace, action='append', default=[],
+                        metavar='ВИД:ID',
+                        help="Отладочная трассировка одной сущности, например zombie:5 или player:0")
+
+trace_logger = get_logger('trace')
@@ -0,0 +1,66 @@
+import threading
+
+class InputSlots:
+    """Последний ввод каждого игрока до следующего тика ("новейший побеждает").
+
+    Потоки клиентов только перезаписывают поля в ячейке игрока под короткой
+    блокировкой, а симуляция раз в тик забирает все ячейки и применяет их.
+    Сколько бы позиций ни пришло между тиками, применяется одна - самая
+    свежая; остальные считаются слитыми.
+    """
+
+    def __init__(self):
+        self.slots = {}  # player_id -> поля последнего ввода
+        self.lock = threading.Lock()
+        self.received = 0  # Сообщений с вводом с прошлого тика
+
+        self.last_received = 0
+        self.last_applied = 0
+        self.last_merged = 0
+        self.max_merged = 0
+        self.total_received = 0
+        self.total_merged = 0
+        self.ticks = 0
+
+    def store(self, player_id, fields):
+        # Поля дописываются поверх: ack из позиции не теряется из-за player_state без него
+        with self.lock:
+            slot = self.slots.get(player_id)
+            if slot is None:
+                self.slots[player_id] = dict(fields)
+            else:
+                slot.update(fields)
+            self.received += 1
+
+    def discard(self, player_id):
+        with self.lock:
+            self.slots.pop(player_id, None)
+
+    def take(self):
+        """Забирает ввод всех игроков за прошедший тик."""
+        with self.lock:
+            slots = self.slots
+            received = self.received
+            self.slots = {}
+            self.received = 0
+
+        merged = received - len(slots)
+        self.last_received = received
+        self.last_applied = len(slots)
+        self.last_merged = merged
+        self.max_merged = max(self.max_merged, merged)
+        self.total_received += received
+        self.total_merged += merged
+        self.ticks += 1
+        return slots
+
+    def stats(self):
+        return {
+            'received': self.last_received,
+            'applied': self.last_applied,
+            'merged': self.last_merged,
+            'max_merged': self.max_merged,
+            'total_received': self.total_received,
+            'total_merged': self.total_merged,
+            'avg_merged': self.total_merged / self.ticks if self.ticks else 0.0
+        }
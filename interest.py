@@ -0,0 +1,166 @@
+import math
+import threading
+from collections import OrderedDict, deque
+from protocol import SECTIONS, EncodedMessage, get_section, set_section
+from snapshot import SNAPSHOT_HISTORY, make_delta, full_snapshot
+
+INTEREST_RADIUS = 60  # Радиус, в котором сущность попадает в снимок игрока (0 - без фильтрации)
+INTEREST_HYSTERESIS = 2  # Насколько игрок может выйти из своей ячейки, прежде чем сменить ее
+INTEREST_CELL = 8  # Сторона ячейки: клиенты в одной ячейке получают один и тот же снимок
+
+class InterestGrid:
+    """Отфильтрованные снимки и их кадры, общие для клиентов в одной ячейке.
+
+    Видимость считается не от самого игрока, а от центра его ячейки, с
+    радиусом, увеличенным на половину диагонали ячейки и гистерезис: все,
+    что в радиусе от игрока, в снимок попадает. Зато снимок ячейки за тик
+    фильтруется один раз, а кадр дельты кодируется один раз для каждого
+    сочетания (ячейка и снимок, подтвержденные клиентом, текущая ячейка,
+    формат) - как общий кадр SnapshotHistory без фильтрации.
+    """
+
+    def __init__(self, radius=INTEREST_RADIUS, hysteresis=INTEREST_HYSTERESIS,
+                 cell_size=INTEREST_CELL, history_size=SNAPSHOT_HISTORY):
+        self.cell_size = cell_size
+        self.hysteresis = hysteresis
+        reach = radius + math.sqrt(2) * (cell_size / 2 + hysteresis)
+        self.reach_sq = reach * reach
+        self.history_size = history_size
+        self.views = OrderedDict()  # seq -> {ячейка: (отфильтрованный снимок, (оставлено, отсечено))}
+        self.lock = threading.Lock()
+
+        # Кадры последнего снимка: (базовый seq, базовая ячейка, ячейка, формат) -> EncodedMessage
+        self.encoded = {}
+        self.encoded_seq = None
+        self.views_filtered = 0
+        self.frames_encoded = 0
+        self.frames_shared = 0
+
+    def cell_of(self, x, z):
+        # Позиция - от клиента: бесконечность или NaN не должны остановить рассылку всем
+        if not (math.isfinite(x) and math.isfinite(z)):
+            return 0, 0
+        return math.floor(x / self.cell_size), math.floor(z / self.cell_size)
+
+    def contains(self, cell, x, z):
+        # Ячейка, расширенная на гистерезис
+        low_x = cell[0] * self.cell_size - self.hysteresis
+        low_z = cell[1] * self.cell_size - self.hysteresis
+        high = self.cell_size + 2 * self.hysteresis
+        return 0 <= x - low_x < high and 0 <= z - low_z < high
+
+    def filter(self, state, cell):
+        center_x = (cell[0] + 0.5) * self.cell_size
+        center_z = (cell[1] + 0.5) * self.cell_size
+        filtered = {}
+        kept = culled = 0
+        for path in SECTIONS:
+            section = {}
+            for eid, record in get_section(state, path).items():
+                dx = record['x'] - center_x
+                dz = record['z'] - center_z
+                if dx * dx + dz * dz <= self.reach_sq:
+                    section[eid] = record
+                else:
+                    culled += 1
+            kept += len(section)
+            set_section(filtered, path, section)
+        self.views_filtered += 1
+        return filtered, (kept, culled)
+
+    def view(self, seq, state, cell):
+        # Вызывается под self.lock
+        cells = self.views.get(seq)
+        if cells is None:
+            cells = self.views[seq] = {}
+            while len(self.views) > self.history_size:
+                self.views.popitem(last=False)
+        view = cells.get(cell)
+        if view is None:
+            view = cells[cell] = self.filter(state, cell)
+        return view
+
+    def frame(self, seq, state, cell, baseline_seq, baseline_cell, protocol):
+        """Кадр для клиента в ячейке cell: (EncodedMessage, (оставлено, отсечено))."""
+        with self.lock:
+            if seq != self.encoded_seq:
+                self.encoded = {}
+                self.encoded_seq = seq
+            current, counts = self.view(seq, state, cell)
+            base = self.views.get(baseline_seq, {}).get(baseline_cell)
+            if base is None:
+                baseline_seq = baseline_cell = None
+            key = (baseline_seq, baseline_cell, cell, protocol)
+            message = self.encoded.get(key)
+            if message is not None:
+                self.frames_shared += 1
+                return message, counts
+            if base is None:
+                message = EncodedMessage(full_snapshot(seq, current), protocol)
+            else:
+                message = EncodedMessage(make_delta(seq, baseline_seq, base[0], current), protocol)
+            self.encoded[key] = message
+            self.frames_encoded += 1
+            return message, counts
+
+    def stats(self):
+        return {
+            'views_filtered': self.views_filtered,
+            'frames_encoded': self.frames_encoded,
+            'frames_shared': self.frames_shared
+        }
+
+class InterestView:
+    """Снимки мира в том виде, в каком их получает один клиент.
+
+    Клиент получает снимок своей ячейки InterestGrid. Ячейка меняется, только
+    когда игрок вышел за нее дальше гистерезиса, чтобы сущности на границе
+    видимости не мигали, пока он топчется на краю ячейки. Для каждого
+    отправленного снимка запоминается ячейка: дельта считается от того, что
+    клиент действительно получил.
+    """
+
+    def __init__(self, grid, history_size=SNAPSHOT_HISTORY):
+        self.grid = grid
+        self.cell = None
+        self.sent = {}  # seq -> ячейка, чей снимок ушел клиенту
+        self.sent_order = deque()
+        self.history_size = history_size
+
+        self.last_seq = None
+        self.culled = 0  # Отсечено сущностей в последнем снимке
+        self.kept = 0
+        self.total_culled = 0
+        self.snapshots_filtered = 0
+
+    def cell_for(self, x, z):
+        if self.cell is None or not self.grid.contains(self.cell, x, z):
+            self.cell = self.grid.cell_of(x, z)
+        return self.cell
+
+    def remember(self, seq, cell):
+        self.sent[seq] = cell
+        self.sent_order.append(seq)
+        while len(self.sent_order) > self.history_size:
+            del self.sent[self.sent_order.popleft()]
+        self.last_seq = seq
+
+    def delta_since(self, baseline_seq, seq, state, x, z, protocol):
+        # Ячейка клиента выбирается один раз за тик
+        if seq != self.last_seq:
+            self.remember(seq, self.cell_for(x, z))
+        message, counts = self.grid.frame(seq, state, self.sent[seq], baseline_seq,
+                                          self.sent.get(baseline_seq), protocol)
+        self.kept, self.culled = counts
+        self.total_culled += self.culled
+        self.snapshots_filtered += 1
+        return message
+
+    def stats(self):
+        return {
+            'cell': self.cell,
+            'culled': self.culled,
+            'kept': self.kept,
+            'total_culled': self.total_culled,
+            'snapshots': self.snapshots_filtered
+        }
@@ -0,0 +1,190 @@
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import socket
+import threading
+import time
+from multiprocessing.reduction import send_handle, recv_handle
+from server import GameServer, print_server_info, add_server_arguments, server_options
+from game_log import get_logger, setup_logging, add_logging_arguments, UNLIMITED
+
+log = get_logger('lobby')
+
+ROOM_SIZE = 8  # Игроков в одной комнате
+ROOM_MIN_UPTIME = 5.0  # Комната, упавшая быстрее, перезапускается только после паузы
+ROOM_RESTART_DELAY = 1.0
+
+def run_room(room_id, handles, players, options, log_options):
+    """Процесс комнаты: свой мир, своя карта и свой цикл тиков.
+
+    Лобби передает сюда уже принятые сокеты игроков (дескриптор через pipe),
+    дальше клиент общается с комнатой напрямую, без пересылки байтов через лобби.
+    """
+    # Поток вывода логов лобби в процесс комнаты не переходит, у комнаты свой
+    setup_logging(**log_options)
+    # Своего сокета у комнаты нет: подключения принимает лобби
+    server = GameServer(port=None, announce=False, **options)
+    server.start_simulation()
+    server.start_udp()
+    server.start_metrics()
+    log.info("Комната %s запущена (seed карты %s)", room_id, server.map_seed, extra=UNLIMITED)
+    server.mark_ready()
+
+    def serve(conn, addr):
+        try:
+            server.handle_client(conn, addr)
+        finally:
+            with players.get_lock():
+                players.value -= 1
+
+    while True:
+        try:
+            fd = recv_handle(handles)
+        except EOFError:
+            # Лобби завершилось
+            break
+        conn = socket.socket(fileno=fd)
+        try:
+            addr = conn.getpeername()
+        except OSError:
+            addr = None
+        thread = threading.Thread(target=serve, args=(conn, addr))
+        thread.daemon = True
+        thread.start()
+
+class Room:
+    def __init__(self, room_id, options, log_options):
+        self.room_id = room_id
+        self.handles, child_handles = multiprocessing.Pipe()
+        self.players = multiprocessing.Value('i', 0)
+        self.process = multiprocessing.Process(
+            target=run_room, args=(room_id, child_handles, self.players, options, log_options),
+            name=f"room-{room_id}")
+        self.process.daemon = True
+        self.process.start()
+        self.started = time.monotonic()
+        child_handles.close()
+
+    def count(self):
+        return self.players.value
+
+    def close(self):
+        # Процесс уже завершился: join забирает его код выхода, чтобы не оставлять зомби-процесс
+        self.process.join()
+        self.handles.close()
+
+class Lobby:
+    """Принимает подключения на одном порту и раздает игроков по комнатам.
+
+    Каждая комната - отдельный процесс со своим GameServer, поэтому комнаты
+    не делят один GIL и сброс игры в одной не задевает остальные. Игрок
+    попадает в самую заполненную комнату, где еще есть место, чтобы игроки
+    собирались вместе; если мест нет нигде - в наименее загруженную.
+    Завершившаяся комната (упала или убита) заменяется новой; ее игроки
+    уже отключены и могут подключиться заново.
+    """
+
+    def __init__(self, port, rooms, room_size=ROOM_SIZE, room_options=None, log_options=None):
+        self.port = port
+        self.room_size = room_size
+        self.room_options = room_options or {}
+        self.log_options = log_options or {}
+        self.lock = threading.Lock()  # Список комнат: поток приема и поток наблюдения
+        self.rooms = [self.start_room(room_id) for room_id in range(rooms)]
+        self.server_socket = socket.socket()
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(('0.0.0.0', port))
+        self.server_socket.listen(128)
+
+    def start_room(self, room_id):
+        options = dict(self.room_options)
+        if options.get('metrics_port') is not None:
+            # У каждой комнаты свой эндпоинт метрик: порт лобби плюс номер комнаты
+            options['metrics_port'] += room_id
+        return Room(room_id, options, self.log_options)
+
+    def choose_room(self):
+        rooms = [room for room in self.rooms if room.process.is_alive()] or self.rooms
+        open_rooms = [room for room in rooms if room.count() < self.room_size]
+        if open_rooms:
+            return max(open_rooms, key=Room.count)
+        return min(rooms, key=Room.count)
+
+    def assign(self, conn, addr):
+        try:
+            with self.lock:
+                room = self.choose_room()
+                # Место занимается до передачи: игрок может уйти из комнаты (и счетчик
+                # уменьшиться) раньше, чем лобби вернется из send_handle
+                with room.players.get_lock():
+                    room.players.value += 1
+                try:
+                    # Дескриптор дублируется в процесс комнаты, копию лобби можно закрывать
+                    send_handle(room.handles, conn.fileno(), room.process.pid)
+                except Exception:
+                    # Игрок в комнату не попал - место свободно
+                    with room.players.get_lock():
+                        room.players.value -= 1
+                    raise
+        finally:
+            conn.close()
+        log.info("Игрок с адреса %s направлен в комнату %s (%d/%d)", addr, room.room_id,
+                 room.count(), self.room_size)
+
+    def watch_rooms(self):
+        """Ждет завершения процессов комнат, забирает их и запускает замену."""
+        while True:
+            with self.lock:
+                sentinels = {room.process.sentinel: room for room in self.rooms}
+            for sentinel in multiprocessing.connection.wait(list(sentinels)):
+                self.restart_room(sentinels[sentinel])
+
+    def restart_room(self, room):
+        uptime = time.monotonic() - room.started
+        room.close()
+        log.error("Комната %s завершилась с кодом %s через %.1f с, запускается заново",
+                  room.room_id, room.process.exitcode, uptime, extra=UNLIMITED)
+        if uptime < ROOM_MIN_UPTIME:
+            # Комната падает сразу при запуске - не перезапускаем ее без остановки
+            time.sleep(ROOM_RESTART_DELAY)
+        replacement = self.start_room(room.room_id)
+        with self.lock:
+            self.rooms[self.rooms.index(room)] = replacement
+
+    def run(self):
+        log.info("Лобби: %d комнат по %d игроков, ожидание подключений...", len(self.rooms),
+                 self.room_size, extra=UNLIMITED)
+        watcher = threading.Thread(target=self.watch_rooms, name="rooms")
+        watcher.daemon = True
+        watcher.start()
+        while True:
+            try:
+                conn, addr = self.server_socket.accept()
+                self.assign(conn, addr)
+            except Exception as e:
+                log.error("Ошибка при подключении клиента: %s", e)
+
+def main():
+    parser = argparse.ArgumentParser(description="Лобби 3DShooterOnline: комнаты в отдельных процессах")
+    parser.add_argument('--port', type=int, default=21491)
+    parser.add_argument('--rooms', type=int, default=multiprocessing.cpu_count(),
+                        help="Число комнат (процессов), по умолчанию по одной на ядро")
+    parser.add_argument('--room-size', type=int, default=ROOM_SIZE)
+    # Параметры мира те же, что у server.py, и передаются каждой комнате
+    add_server_arguments(parser)
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Порт /metrics первой комнаты; у комнаты N - этот порт плюс N")
+    parser.add_argument('--no-external-ip', action='store_true',
+                        help="Не запрашивать внешний IP (для хостов без выхода в интернет)")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+
+    log_options = dict(level=args.log_level, trace=args.trace)
+    setup_logging(**log_options)
+    print_server_info(args.port, not args.no_external_ip)
+    lobby = Lobby(args.port, args.rooms, args.room_size,
+                  dict(server_options(args), metrics_port=args.metrics_port), log_options)
+    lobby.run()
+
+if __name__ == "__main__":
+    main()
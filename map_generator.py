@@ -1,8 +1,22 @@
 import random
 import math
+import secrets
 
-def generate_map(size):
-    """Генерирует большую карту с разными текстурами."""
+MAP_GENERATOR_VERSION = 1  # Увеличивать при любом изменении результата generate_map
+
+def new_map_seed():
+    return secrets.randbits(32)
+
+def generate_map(size, seed, version=MAP_GENERATOR_VERSION):
+    """Генерирует большую карту с разными текстурами.
+
+    Карта полностью определяется (size, seed, version): генератор использует
+    собственный random.Random, а не общий модуль random, поэтому клиент
+    строит ту же карту сам, а любую карту с сервера можно воспроизвести.
+    """
+    if version != MAP_GENERATOR_VERSION:
+        raise ValueError(f"Неизвестная версия генератора карты: {version}")
+    rng = random.Random(seed)
     map_objects = []
     
     # Увеличиваем размер карты еще больше
@@ -22,17 +36,17 @@ def generate_map(size):
     map_objects.append(floor)
     
     # Генерация стен
-    num_walls = random.randint(30, 50)  # Увеличиваем количество стен
+    num_walls = rng.randint(30, 50)  # Увеличиваем количество стен
     
     for _ in range(num_walls):
-        x = random.uniform(-actual_size/2 + 8, actual_size/2 - 8)
-        z = random.uniform(-actual_size/2 + 8, actual_size/2 - 8)
+        x = rng.uniform(-actual_size/2 + 8, actual_size/2 - 8)
+        z = rng.uniform(-actual_size/2 + 8, actual_size/2 - 8)
         
-        width = random.uniform(4, 12)  # Увеличиваем размеры стен
-        height = random.uniform(6, 12)
-        depth = random.uniform(2, 6)
+        width = rng.uniform(4, 12)  # Увеличиваем размеры стен
+        height = rng.uniform(6, 12)
+        depth = rng.uniform(2, 6)
         
-        rotation = random.choice([0, 45, 90, 135, 180, 225, 270, 315])
+        rotation = rng.choice([0, 45, 90, 135, 180, 225, 270, 315])
         
         wall = {
             'x': x,
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import zlib
+from protocol import EncodedMessage, ProtocolError, PROTOCOL_BINARY
+from map_generator import generate_map
+
+MAP_HASH_SIZE = 16  # Символов sha256 в ключе карты
+MAP_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'map_cache')
+
+def map_hash(raw):
+    return hashlib.sha256(raw).hexdigest()[:MAP_HASH_SIZE]
+
+def encode_map(map_data):
+    # Каноничный JSON: по нему считается хэш и на сервере, и на клиенте
+    return json.dumps(map_data, separators=(',', ':')).encode()
+
+class MapPayload:
+    """Карта, закодированная и сжатая один раз при запуске сервера.
+
+    Начальные данные содержат только хэш, размеры и параметры генератора.
+    Клиент строит карту сам по (seed, size, version) и сверяет хэш, а если
+    не может - берет ее из кэша или запрашивает get_map; тогда карта уходит
+    одним готовым кадром, общим для всех клиентов.
+    """
+
+    def __init__(self, map_data, generator=None):
+        raw = encode_map(map_data)
+        compressed = zlib.compress(raw, 9)
+        self.hash = map_hash(raw)
+        self.raw_size = len(raw)
+        self.size = len(compressed)
+        self.message = EncodedMessage({'type': 'map', 'hash': self.hash, 'data': compressed},
+                                      PROTOCOL_BINARY)
+        self.generator = generator  # {'seed', 'size', 'version'} или None
+        self.downloads = 0
+
+    def info(self):
+        info = {'hash': self.hash, 'size': self.size, 'raw_size': self.raw_size}
+        if self.generator is not None:
+            info['generator'] = self.generator
+        return info
+
+def unpack_map(message):
+    """Распаковывает ответ на get_map и проверяет хэш. Возвращает JSON карты в байтах."""
+    if not message or message.get('type') != 'map':
+        raise ProtocolError("Сервер не прислал карту")
+    raw = zlib.decompress(message['data'])
+    if map_hash(raw) != message['hash']:
+        raise ProtocolError("Хэш карты не совпадает с данными")
+    return raw
+
+class MapCache:
+    """Карты, уже загруженные клиентом, по их хэшу."""
+
+    def __init__(self, directory=MAP_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+        # Поврежденный файл просто загружаем заново
+        if map_hash(raw) != key:
+            return None
+        return json.loads(raw)
+
+    def store(self, key, raw):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = self.path(key) + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(raw)
+            os.replace(temp_path, self.path(key))
+        except OSError as e:
+            print(f"Не удалось сохранить карту в кэш: {e}")
+
+def rebuild_map(info):
+    """Строит карту по параметрам генератора, если результат совпал с хэшем сервера."""
+    generator = info.get('generator')
+    if generator is None:
+        return None
+    try:
+        map_data = generate_map(generator['size'], generator['seed'], generator['version'])
+    except ValueError as e:
+        # Другая версия генератора - карту придется загрузить
+        print(f"Карта не построена локально: {e}")
+        return None
+    if map_hash(encode_map(map_data)) != info['hash']:
+        print("Карта, построенная локально, не совпала с картой сервера")
+        return None
+    return map_data
+
+def local_map(initial_data, cache=None):
+    """Карта без загрузки: из начальных данных старого сервера, построенная по seed или из кэша.
+
+    None - карту нужно загрузить с сервера (download_map).
+    """
+    if 'map' in initial_data:
+        # Старый сервер присылает карту прямо в начальных данных
+        return initial_data['map']
+    info = initial_data['map_info']
+    map_data = rebuild_map(info)
+    if map_data is not None:
+        return map_data
+    return (cache or MapCache()).load(info['hash'])
+
+def download_map(info, send, receive, cache=None, requested=False):
+    """Загружает карту с сервера и сохраняет в кэш.
+
+    requested - карта уже заказана в hello ({'get_map': True}): тогда сервер
+    кладет ее в очередь сразу за ответом на hello и до первого снимка, а
+    отдельный get_map после включения подписки встал бы за снимками тика.
+    """
+    key = info['hash']
+    if not requested:
+        send({'type': 'get_map', 'hash': key})
+    raw = unpack_map(receive())
+    (cache or MapCache()).store(key, raw)
+    return json.loads(raw)
+
+def receive_map(initial_data, send, receive, cache=None):
+    """Карта для начальных данных: построенная по seed, из кэша по хэшу или загрузкой с сервера.
+
+    send и receive - функции клиента для отправки и получения сообщений.
+    Только для соединений без подписки на снимки: подписанный клиент
+    заказывает карту в hello (см. download_map).
+    """
+    cache = cache or MapCache()
+    map_data = local_map(initial_data, cache)
+    if map_data is None:
+        map_data = download_map(initial_data['map_info'], send, receive, cache)
+    return map_data
@@ -0,0 +1,247 @@
+import bisect
+import threading
+import time
+from protocol import EncodedMessage
+
+TIME_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+def message_type(data):
+    """Тип сообщения для меток метрик."""
+    if isinstance(data, EncodedMessage) or 'seq' in data:
+        return 'snapshot'
+    if 'type' in data:
+        return str(data['type'])
+    if 'x' in data and 'z' in data:
+        return 'position'
+    return 'reply'
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class _ThreadValues:
+    """Накопленные значения одного потока; блокировку берут только он сам и выдача."""
+    __slots__ = ('thread', 'lock', 'pending')
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.lock = threading.Lock()
+        self.pending = {}
+
+class _Metric:
+    """Общая часть счетчиков и гистограмм: накопление по потокам.
+
+    Каждый поток пишет в свою копию под своей блокировкой, которую никто,
+    кроме выдачи, не берет, поэтому запись почти ничего не стоит и метрики
+    можно не выключать под нагрузкой. render() сливает копии всех потоков,
+    в том числе уже завершившихся (например, потоков отключенных клиентов),
+    в общие значения, так что на выдаче значения точные.
+    """
+    kind = None
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label  # Имя метки, например 'type' или 'lock'
+        self.values = {}  # значение метки -> накопленное значение
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.threads = []  # _ThreadValues всех писавших потоков
+
+    def _thread_values(self):
+        try:
+            return self.local.values
+        except AttributeError:
+            values = self.local.values = _ThreadValues()
+            with self.lock:
+                self.threads.append(values)
+            return values
+
+    def _flush(self):
+        # Вызывается под self.lock; завершившиеся потоки больше не пишут и после слияния забываются
+        for values in self.threads:
+            with values.lock:
+                pending, values.pending = values.pending, {}
+            for label_value, value in pending.items():
+                self._merge(label_value, value)
+        self.threads = [values for values in self.threads if values.thread.is_alive()]
+
+    def _labels(self, label_value, *extra):
+        labels = [(self.label, label_value)] if self.label else []
+        return _format_labels(labels + list(extra))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            self._flush()
+            items = sorted(self.values.items(), key=lambda item: str(item[0]))
+            lines.extend(self._render_value(label_value, value) for label_value, value in items)
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, label_value=None):
+        values = self._thread_values()
+        with values.lock:
+            pending = values.pending
+            pending[label_value] = pending.get(label_value, 0) + amount
+
+    def _merge(self, label_value, value):
+        self.values[label_value] = self.values.get(label_value, 0) + value
+
+    def _render_value(self, label_value, value):
+        return f"{self.name}{self._labels(label_value)} {value}"
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=TIME_BUCKETS, label=None):
+        super().__init__(name, help_text, label)
+        self.buckets = buckets
+
+    def observe(self, value, label_value=None):
+        values = self._thread_values()
+        with values.lock:
+            counts = values.pending.get(label_value)
+            if counts is None:
+                # Счетчики по корзинам (последняя - больше всех границ), затем сумма
+                counts = values.pending[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def _merge(self, label_value, value):
+        current = self.values.get(label_value)
+        if current is None:
+            self.values[label_value] = value
+        else:
+            self.values[label_value] = [a + b for a, b in zip(current, value)]
+
+    def _render_value(self, label_value, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, value):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self._labels(label_value, ('le', bound))} {cumulative}")
+        cumulative += value[len(self.buckets)]
+        lines.append(f"{self.name}_bucket{self._labels(label_value, ('le', '+Inf'))} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(label_value)} {value[-1]}")
+        lines.append(f"{self.name}_count{self._labels(label_value)} {cumulative}")
+        return '\n'.join(lines)
+
+class Gauge:
+    """Текущее значение; записывается одним потоком (тиком), поэтому без накопления."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}
+
+    def set(self, value, label_value=None):
+        self.values[label_value] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for label_value, value in list(self.values.items()):
+            labels = _format_labels([(self.label, label_value)] if self.label else [])
+            lines.append(f"{self.name}{labels} {value}")
+        return '\n'.join(lines)
+
+class TimedLock:
+    """threading.Lock, который замеряет ожидание и удержание для метрик."""
+
+    def __init__(self, name, metrics):
+        self.name = name
+        self.lock = threading.Lock()
+        self.wait = metrics.lock_wait
+        self.hold = metrics.lock_hold
+        self.acquired_at = 0.0  # Пишет только владелец блокировки
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self.lock.acquire()
+        self.acquired_at = time.perf_counter()
+        self.wait.observe(self.acquired_at - started, self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        held = time.perf_counter() - self.acquired_at
+        self.lock.release()
+        self.hold.observe(held, self.name)
+
+class Metrics:
+    """Все метрики сервера и их выдача в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self.tick_duration = Histogram('shooter_tick_duration_seconds', "Длительность тика сервера")
+        self.lock_wait = Histogram('shooter_lock_wait_seconds', "Ожидание блокировки мира", label='lock')
+        self.lock_hold = Histogram('shooter_lock_hold_seconds', "Удержание блокировки мира", label='lock')
+        self.messages_in = Counter('shooter_messages_in_total', "Принятые сообщения", label='type')
+        self.bytes_in = Counter('shooter_bytes_in_total', "Принятые байты", label='type')
+        self.messages_out = Counter('shooter_messages_out_total', "Отправленные сообщения", label='type')
+        self.bytes_out = Counter('shooter_bytes_out_total', "Отправленные байты", label='type')
+        self.snapshot_bytes = Histogram('shooter_snapshot_bytes', "Размер отправленного снимка",
+                                        buckets=SIZE_BUCKETS)
+        self.players = Gauge('shooter_players_connected', "Подключенные игроки")
+        self.zombies = Gauge('shooter_zombies', "Зомби на карте", label='state')
+        self.zombies_merged = Counter('shooter_zombies_merged_total', "Зомби, поглощенные при слияниях")
+        self.startup_seconds = Gauge('shooter_startup_seconds', "Время от создания сервера до готовности")
+        self.all = (self.tick_duration, self.lock_wait, self.lock_hold, self.messages_in,
+                    self.bytes_in, self.messages_out, self.bytes_out, self.snapshot_bytes,
+                    self.players, self.zombies, self.zombies_merged, self.startup_seconds)
+        self.ready = threading.Event()  # Сервер принимает подключения и тики идут
+        self.http_server = None
+
+    def record_in(self, data, size):
+        kind = message_type(data)
+        self.messages_in.inc(1, kind)
+        self.bytes_in.inc(size, kind)
+
+    def record_out(self, kind, size):
+        self.messages_out.inc(1, kind)
+        self.bytes_out.inc(size, kind)
+        if kind == 'snapshot':
+            self.snapshot_bytes.observe(size)
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.all) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """HTTP-эндпоинты /metrics и /ready в отдельном потоке (только локальный интерфейс).
+
+        /ready отвечает 200, когда сервер готов, и 503 до этого - для проверок супервизора.
+        """
+        # http.server (и email за ним) импортируется только при включенных метриках
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/ready':
+                    self.send_response(200 if metrics.ready.is_set() else 503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.http_server.serve_forever, name="metrics")
+        thread.daemon = True
+        thread.start()
+        return self.http_server.server_address[1]
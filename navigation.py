@@ -0,0 +1,278 @@
+import math
+
+NAV_CELL = 2.0  # Сторона клетки навигации; тоньше стены с запасом зомби (не меньше 4)
+ORTHOGONAL_COST = 2  # Шаги в целых числах: диагональ 3 к прямому 2 вместо sqrt(2) к 1
+DIAGONAL_COST = 3
+DIRECT_COST = DIAGONAL_COST  # Ближе этого к игроку (соседняя клетка) зомби идет прямо на цель
+UNREACHABLE = 1 << 30
+REBUILD_INTERVAL = 0.2  # Не чаще, секунд, перестраивать поле из-за движения игроков
+BUILD_STEP = 1024  # Клеток построения поля за один тик
+
+# Восемь соседей клетки (по x, по z); в поле хранится номер направления в этом списке
+OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+DIRECTIONS = tuple((dx / math.hypot(dx, dz), dz / math.hypot(dx, dz)) for dx, dz in OFFSETS)
+NO_DIRECTION = -1
+OPPOSITE = tuple(OFFSETS.index((-dx, -dz)) for dx, dz in OFFSETS)
+
+class NavigationGrid:
+    """Неизменяемая проходимость карты для зомби, растеризованная из стен.
+
+    Клетка занята, если ее центр внутри стены, расширенной на margin (запас
+    центра зомби) и еще на полклетки: тогда отрезок между центрами соседних
+    свободных клеток не задевает стену и у повернутых стен. Сетка окружена
+    рамкой занятых клеток, поэтому у любой клетки внутри есть все восемь
+    соседей без проверок границ. Строится один раз по CollisionWorld и общая
+    для всех менеджеров зомби, как и сама карта.
+    """
+
+    def __init__(self, collision, half_size, margin, cell_size=NAV_CELL):
+        self.cell_size = cell_size
+        self.origin = -half_size
+        self.margin = margin
+        self.columns = math.ceil(2 * half_size / cell_size)
+        self.width = self.columns + 2  # С рамкой
+        self.blocked = bytearray(b'\x01') * (self.width * self.width)
+        self.blocked_cells = []  # Занятые клетки внутри рамки
+        raster_margin = min(margin + cell_size / 2, collision.max_margin)
+        for row in range(self.columns):
+            z = self.origin + (row + 0.5) * cell_size
+            for column in range(self.columns):
+                x = self.origin + (column + 0.5) * cell_size
+                cell = (row + 1) * self.width + column + 1
+                if collision.point_blocked(x, z, raster_margin):
+                    self.blocked_cells.append(cell)
+                else:
+                    self.blocked[cell] = 0
+
+        # Шаги к соседям: (смещение индекса, направление от соседа обратно), у диагоналей
+        # еще две клетки угла - диагональ проходима, только если свободны обе
+        self.straight_steps = []
+        self.diagonal_steps = []
+        for dx, dz in OFFSETS:
+            offset = dz * self.width + dx
+            back = OFFSETS.index((-dx, -dz))
+            if dx and dz:
+                self.diagonal_steps.append((offset, back, dz * self.width, dx))
+            else:
+                self.straight_steps.append((offset, back))
+
+    def index(self, x, z):
+        """Индекс клетки с точкой (x, z) или None за пределами карты (и для бесконечности или NaN)."""
+        column = (x - self.origin) / self.cell_size
+        row = (z - self.origin) / self.cell_size
+        # Границы проверяются до floor: NaN не проходит ни одно сравнение, и floor его не увидит
+        if 0 <= column < self.columns and 0 <= row < self.columns:
+            return (math.floor(row) + 1) * self.width + math.floor(column) + 1
+        return None
+
+    def center(self, cell):
+        row, column = divmod(cell, self.width)
+        return (self.origin + (column - 0.5) * self.cell_size,
+                self.origin + (row - 0.5) * self.cell_size)
+
+    def cells_in_box(self, x, z, cos, sin, half_x, half_z):
+        """Клетки, чьи центры внутри повернутого прямоугольника (доски), расширенного, как стены, на полклетки."""
+        if not all(math.isfinite(value) for value in (x, z, cos, sin, half_x, half_z)):
+            return []
+        half_x += self.cell_size / 2
+        half_z += self.cell_size / 2
+        extent_x = abs(cos) * half_x + abs(sin) * half_z
+        extent_z = abs(sin) * half_x + abs(cos) * half_z
+        cell_size = self.cell_size
+        first_column = max(0, math.floor((x - extent_x - self.origin) / cell_size))
+        last_column = min(self.columns - 1, math.floor((x + extent_x - self.origin) / cell_size))
+        first_row = max(0, math.floor((z - extent_z - self.origin) / cell_size))
+        last_row = min(self.columns - 1, math.floor((z + extent_z - self.origin) / cell_size))
+        cells = []
+        for row in range(first_row, last_row + 1):
+            dz = self.origin + (row + 0.5) * cell_size - z
+            for column in range(first_column, last_column + 1):
+                dx = self.origin + (column + 0.5) * cell_size - x
+                if abs(dx * cos + dz * sin) < half_x and abs(dz * cos - dx * sin) < half_z:
+                    cells.append((row + 1) * self.width + column + 1)
+        return cells
+
+class FlowField:
+    """Поле направлений к ближайшему по пути живому игроку, одно на всех зомби.
+
+    Расстояния считаются поиском в ширину с корзинами по стоимости от клеток
+    всех игроков сразу, а направление клетки запоминается при ее обновлении:
+    это шаг к соседу, через которого пришел кратчайший путь. Стоимость
+    перестроения зависит от размера сетки, а не от числа зомби; зомби читает
+    свое направление одним обращением к списку.
+
+    Новое поле строится по частям: каждый update() продвигает построение на
+    build_step клеток, а зомби до его окончания идут по прежнему полю. Так
+    тик платит за поле ограниченное время, сколько бы клеток ни было в
+    сетке. Бюджет задан в клетках, а не во времени, чтобы оба движка зомби
+    видели одно и то же поле в одни и те же тики. Построение начинается,
+    когда изменились установленные доски (сразу, прерывая текущее) или игрок
+    перешел в другую клетку (не чаще rebuild_interval и после окончания
+    текущего). Рядом с игроком зомби идут прямо на него.
+    """
+
+    def __init__(self, grid, rebuild_interval=REBUILD_INTERVAL, build_step=BUILD_STEP):
+        self.grid = grid
+        self.rebuild_interval = rebuild_interval
+        self.build_step = build_step
+        self.since_rebuild = 0.0
+        self.blocked = grid.blocked
+        self.boxes = ()
+        self.blocked_cells = grid.blocked_cells
+        self.sources = None  # Клетки игроков, от которых строилось последнее поле
+        self.distance = None
+        self.direction = None
+        self.version = 0  # Растет при каждом готовом поле
+        self.build = None  # Незаконченное построение (генератор) или None
+
+    def update(self, points, boxes=(), dt=0.0):
+        """points - позиции живых игроков, boxes - доски как (x, z, cos, sin, half_x, half_z).
+
+        Возвращает True, если в этом вызове готово новое поле.
+        """
+        self.since_rebuild += dt
+        boxes = tuple(boxes)
+        if boxes != self.boxes:
+            self.boxes = boxes
+            self.blocked = self.grid.blocked
+            self.blocked_cells = self.grid.blocked_cells
+            if boxes:
+                self.blocked = bytearray(self.grid.blocked)
+                self.blocked_cells = list(self.grid.blocked_cells)
+                for box in boxes:
+                    for cell in self.grid.cells_in_box(*box):
+                        if not self.blocked[cell]:
+                            self.blocked[cell] = 1
+                            self.blocked_cells.append(cell)
+            self.start(points)
+        elif self.build is None:
+            sources = self.source_cells(points)
+            if sources != self.sources and (self.distance is None or
+                                            self.since_rebuild >= self.rebuild_interval):
+                self.start(points)
+        return self.build is not None and self.step()
+
+    def source_cells(self, points):
+        return sorted({cell for cell in (self.grid.index(x, z) for x, z in points) if cell is not None})
+
+    def start(self, points):
+        """Начинает новое построение от клеток points, бросая незаконченное."""
+        self.sources = self.source_cells(points)
+        self.since_rebuild = 0.0
+        self.build = self._build(self.blocked, self.blocked_cells, self.sources)
+
+    def step(self):
+        """Продвигает построение на build_step клеток; True, если поле готово."""
+        try:
+            next(self.build)
+            return False
+        except StopIteration as done:
+            self.distance, self.direction = done.value
+            self.build = None
+            self.version += 1
+            return True
+
+    def rebuild(self):
+        """Строит поле от текущих клеток игроков целиком, за один вызов."""
+        self.build = self._build(self.blocked, self.blocked_cells, self.sources or [])
+        while not self.step():
+            pass
+
+    def _build(self, blocked, blocked_cells, sources):
+        # Генератор: после каждых build_step клеток отдает управление, в конце возвращает поле
+        distance = [UNREACHABLE] * len(blocked)
+        direction = [NO_DIRECTION] * len(blocked)
+        for cell in sources:
+            distance[cell] = 0
+        # Стоимости целые и маленькие, поэтому вместо кучи - список корзин по стоимости
+        buckets = [list(sources)]
+        straight_steps = self.grid.straight_steps
+        diagonal_steps = self.grid.diagonal_steps
+        budget = self.build_step
+        cost = 0
+        while cost < len(buckets):
+            bucket = buckets[cost]
+            buckets[cost] = None
+            for cell in bucket:
+                if distance[cell] != cost:
+                    continue  # Клетку уже достали из корзины с меньшей стоимостью
+                new_cost = cost + ORTHOGONAL_COST
+                for offset, back in straight_steps:
+                    neighbour = cell + offset
+                    if not blocked[neighbour] and new_cost < distance[neighbour]:
+                        distance[neighbour] = new_cost
+                        direction[neighbour] = back
+                        while len(buckets) <= new_cost:
+                            buckets.append([])
+                        buckets[new_cost].append(neighbour)
+                new_cost = cost + DIAGONAL_COST
+                for offset, back, corner_z, corner_x in diagonal_steps:
+                    neighbour = cell + offset
+                    if (new_cost < distance[neighbour] and not blocked[neighbour] and
+                            not blocked[cell + corner_z] and not blocked[cell + corner_x]):
+                        distance[neighbour] = new_cost
+                        direction[neighbour] = back
+                        while len(buckets) <= new_cost:
+                            buckets.append([])
+                        buckets[new_cost].append(neighbour)
+                budget -= 1
+                if not budget:
+                    yield
+                    budget = self.build_step
+            cost += 1
+
+        # Занятые клетки (центр зомби бывает в них у самой стены) ведут к соседней с
+        # наименьшей стоимостью; волна идет вглубь, пока есть до чего дойти
+        pending = [cell for cell in blocked_cells if distance[cell] == UNREACHABLE]
+        while pending:
+            found = {}
+            rest = []
+            for cell in pending:
+                best = UNREACHABLE
+                for offset, back in straight_steps:
+                    if distance[cell + offset] + ORTHOGONAL_COST < best:
+                        best = distance[cell + offset] + ORTHOGONAL_COST
+                        found[cell] = (best, OPPOSITE[back])
+                for offset, back, _, _ in diagonal_steps:
+                    if distance[cell + offset] + DIAGONAL_COST < best:
+                        best = distance[cell + offset] + DIAGONAL_COST
+                        found[cell] = (best, OPPOSITE[back])
+                if best >= UNREACHABLE:
+                    rest.append(cell)
+                budget -= 1
+                if not budget:
+                    yield
+                    budget = self.build_step
+            if not found:
+                break
+            for cell, (cost, back) in found.items():
+                distance[cell] = cost
+                direction[cell] = back
+            pending = rest
+        return distance, direction
+
+    def direction_at(self, x, z):
+        """Единичный вектор движения из точки или None, если идти нужно прямо на цель.
+
+        Зомби идет к центру следующей клетки пути, а не просто в сторону
+        соседа: так он держится линии центров и не цепляет углы стен.
+        None - рядом с игроком, вне карты или если до игроков по клеткам не
+        дойти (например, они заперты досками).
+        """
+        if self.distance is None:
+            return None
+        cell = self.grid.index(x, z)
+        if cell is None:
+            return None
+        cost = self.distance[cell]
+        if cost <= DIRECT_COST or cost >= UNREACHABLE:
+            return None
+        direction = self.direction[cell]
+        dx, dz = OFFSETS[direction]
+        center_x, center_z = self.grid.center(cell + dz * self.grid.width + dx)
+        to_x = center_x - x
+        to_z = center_z - z
+        length = math.hypot(to_x, to_z)
+        if length == 0:
+            return DIRECTIONS[direction]
+        return to_x / length, to_z / length
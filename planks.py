@@ -1,6 +1,8 @@
 import random
 import math
 import time
+from spatial_grid import SpatialGrid
+from zombie import Zombie
 
 class Plank:
     PICKUP_DISTANCE = 5
@@ -31,6 +33,10 @@ class PlacedPlank:
         self.rotation = rotation
         self.is_wall = is_wall
         self.health = 1000
+        # Поворот доски не меняется: проверкам столкновений не нужно считать его заново
+        angle = math.radians(rotation)
+        self.cos = math.cos(angle)
+        self.sin = math.sin(angle)
 
     def take_damage(self, damage):
         self.health -= damage
@@ -56,23 +62,15 @@ class PlankManager:
         self.map_size = map_size
         self.next_plank_id = 0
         self.next_placed_id = 0
-        self.walls = []
+        self.collision = None
         self.last_spawn_time = 0
         self.planks_to_remove = set()  # Добавляем множество для хранения ID стен для удаления
 
-    def set_walls(self, map_data):
-        self.walls = [obj for obj in map_data if obj.get('texture') in ['brick', 'cobblestone']]
+    def set_collision(self, collision):
+        self.collision = collision
 
     def check_collision(self, x, z):
-        for wall in self.walls:
-            wall_x = wall['x']
-            wall_z = wall['z']
-            wall_scale_x = wall['scale_x']
-            wall_scale_z = wall['scale_z']
-            
-            if abs(x - wall_x) < wall_scale_x/2 and abs(z - wall_z) < wall_scale_z/2:
-                return True
-        return False
+        return self.collision.point_blocked(x, z)
 
     def spawn_plank(self):
         current_time = time.time()
@@ -94,11 +92,13 @@ class PlankManager:
                 self.last_spawn_time = current_time
                 return
 
-    def check_pickups(self, players):
+    def check_pickups(self, players, player_grid=None):
+        if player_grid is None:
+            player_grid = SpatialGrid.of(players)
         planks_to_remove = []
         
         for plank_id, plank in self.planks.items():
-            for player in players.values():
+            for _, player in sorted(player_grid.query(plank.x, plank.z, Plank.PICKUP_DISTANCE)):
                 if player.is_alive and not player.is_ghost:
                     if plank.can_pickup(player.x, player.y, player.z):
                         player.planks_count += 1  # Увеличиваем количество досок у игрока
@@ -116,7 +116,7 @@ class PlankManager:
             return True
         return False
 
-    def update_placed_planks(self, zombies):
+    def update_placed_planks(self, zombies, dt=0.016, zombie_grid=None):
         # Удаляем сломанные стены
         for plank_id in self.planks_to_remove:
             if plank_id in self.placed_planks:
@@ -124,9 +124,13 @@ class PlankManager:
         self.planks_to_remove.clear()
 
         planks_to_remove = []
+        if not self.placed_planks:
+            return
+        if zombie_grid is None:
+            zombie_grid = SpatialGrid.of(zombies)
         
         for plank_id, plank in self.placed_planks.items():
-            for zombie in zombies.values():
+            for _, zombie in sorted(zombie_grid.query(plank.x, plank.z, Zombie.DAMAGE_DISTANCE)):
                 if zombie.is_alive:
                     # Проверяем, находится ли зомби рядом с доской
                     dx = zombie.x - plank.x
@@ -135,11 +139,13 @@ class PlankManager:
                     
                     if distance < zombie.DAMAGE_DISTANCE:
                         # Зомби атакует доску
-                        if plank.take_damage(zombie.DAMAGE * zombie.damage_multiplier * 0.016):
+                        if plank.take_damage(zombie.DAMAGE * zombie.damage_multiplier * dt):
                             planks_to_remove.append(plank_id)
 
         for plank_id in planks_to_remove:
-            del self.placed_planks[plank_id]
+            # Одну доску могут сломать сразу несколько зомби
+            if plank_id in self.placed_planks:
+                del self.placed_planks[plank_id]
 
     def to_dict(self):
         return {
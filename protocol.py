@@ -0,0 +1,265 @@
+import json
+import struct
+
+HEADER_SIZE = 10  # Длина ASCII-заголовка с размером сообщения
+
+PROTOCOL_JSON = 'json'
+PROTOCOL_BINARY = 'binary'
+BINARY_VERSION = 3
+SUPPORTED_PROTOCOLS = {PROTOCOL_BINARY: BINARY_VERSION}
+
+# Бинарное сообщение: маркер, версия, тег типа, затем упакованные записи.
+# JSON всегда начинается с '{', а байт 0xFE не встречается в UTF-8,
+# поэтому формат определяется по первому байту без отдельного флага.
+BINARY_MARKER = 0xFE
+MESSAGE_HEADER = struct.Struct('<BBB')
+
+MSG_STATE = 1
+MSG_POSITION = 2
+MSG_HIT = 3
+MSG_PLACE_PLANK = 4
+MSG_REMOVE_PLANK = 5
+MSG_DELTA = 6
+MSG_MAP = 7
+
+COUNT = struct.Struct('<H')
+ENTITY_ID = struct.Struct('<I')
+NO_SEQ = 0xFFFFFFFF  # Нет номера снимка (полный снимок или клиент еще ничего не получил)
+DELTA_HEADER = struct.Struct('<II')           # seq, baseline
+PLAYER_RECORD = struct.Struct('<Iffff?fHfB')  # id, x, y, z, health, is_alive, shoot_cooldown, planks_count,
+                                              # rotation, animation
+ZOMBIE_RECORD = struct.Struct('<Ifff?f')      # id, x, y, z, is_alive, scale
+ITEM_RECORD = struct.Struct('<Ifff')          # id, x, y, z (аптечки, бонусы, доски для подбора)
+PLACED_RECORD = struct.Struct('<Iffff?f')     # id, x, y, z, rotation, is_wall, health
+POSITION_RECORD = struct.Struct('<fff?fffI')  # x, y, z, shooting, shoot_dir_x/y/z, ack
+HIT_RECORD = struct.Struct('<If')             # target_id, damage
+PLACE_RECORD = struct.Struct('<ffff?')        # x, y, z, rotation, is_wall
+REMOVE_RECORD = struct.Struct('<I')           # plank_id
+MAP_RECORD = struct.Struct('<16s')            # хэш карты, за ним сжатые данные до конца сообщения
+
+ANIMATIONS = ('idle', 'run', 'jump')  # Состояния анимации игрока
+# Строковые поля записей: в бинарном формате передается номер значения в списке
+CODED_FIELDS = {'animation': ANIMATIONS}
+FIELD_CODES = {field: {value: code for code, value in enumerate(values)}
+               for field, values in CODED_FIELDS.items()}
+
+class ProtocolError(ValueError):
+    pass
+
+# Пути к словарям сущностей внутри снимка мира
+SECTIONS = (
+    ('players',),
+    ('zombies',),
+    ('medkits',),
+    ('speed_boosts',),
+    ('planks', 'pickups'),
+    ('planks', 'placed'),
+)
+
+def get_section(state, path):
+    for key in path:
+        state = state[key]
+    return state
+
+def set_section(state, path, value):
+    for key in path[:-1]:
+        state = state.setdefault(key, {})
+    state[path[-1]] = value
+
+class EncodedMessage:
+    """Уже закодированное сообщение (кадр с заголовком длины).
+
+    Один и тот же кадр отправляется всем клиентам без повторного
+    кодирования: encode_message и encode_payload отдают его как есть.
+    """
+    __slots__ = ('frame', 'protocol')
+
+    def __init__(self, data, protocol=PROTOCOL_JSON):
+        self.frame = encode_message(data, protocol)
+        self.protocol = protocol
+
+    @property
+    def payload(self):
+        return memoryview(self.frame)[HEADER_SIZE:]
+
+def negotiate_protocol(request):
+    """Выбирает формат по сообщению клиента {'type': 'hello', 'protocol', 'version'}.
+
+    Неизвестный формат или версия - остаемся на JSON.
+    """
+    protocol = request.get('protocol', PROTOCOL_JSON)
+    if SUPPORTED_PROTOCOLS.get(protocol) == request.get('version'):
+        return protocol
+    return PROTOCOL_JSON
+
+def _pack_section(records, record, fields):
+    parts = [COUNT.pack(len(records))]
+    coded = [f for f in fields if f in CODED_FIELDS]
+    for entity_id, data in records.items():
+        if coded:
+            data = dict(data, **{f: FIELD_CODES[f].get(data[f], 0) for f in coded})
+        parts.append(record.pack(int(entity_id), *(data[f] for f in fields)))
+    return parts
+
+def _unpack_section(payload, offset, record, fields):
+    (count,) = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    coded = [f for f in fields if f in CODED_FIELDS]
+    section = {}
+    for values in record.iter_unpack(payload[offset:offset + count * record.size]):
+        data = dict(zip(fields, values[1:]))
+        for f in coded:
+            names = CODED_FIELDS[f]
+            data[f] = names[data[f]] if data[f] < len(names) else names[0]
+        section[str(values[0])] = data
+    return section, offset + count * record.size
+
+def _pack_ids(ids):
+    return [COUNT.pack(len(ids))] + [ENTITY_ID.pack(int(eid)) for eid in ids]
+
+def _unpack_ids(payload, offset):
+    (count,) = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    ids = [str(values[0]) for values in ENTITY_ID.iter_unpack(payload[offset:offset + count * ENTITY_ID.size])]
+    return ids, offset + count * ENTITY_ID.size
+
+def _pack_seq(seq):
+    return NO_SEQ if seq is None else seq
+
+def _unpack_seq(value):
+    return None if value == NO_SEQ else value
+
+PLAYER_FIELDS = ('x', 'y', 'z', 'health', 'is_alive', 'shoot_cooldown', 'planks_count', 'rotation', 'animation')
+ZOMBIE_FIELDS = ('x', 'y', 'z', 'is_alive', 'scale')
+ITEM_FIELDS = ('x', 'y', 'z')
+PLACED_FIELDS = ('x', 'y', 'z', 'rotation', 'is_wall', 'health')
+POSITION_FIELDS = ('x', 'y', 'z', 'shooting', 'shoot_dir_x', 'shoot_dir_y', 'shoot_dir_z')
+
+# Секции снимка мира в порядке записи: (путь к словарю, формат записи, поля)
+STATE_SECTIONS = tuple(zip(SECTIONS, (
+    (PLAYER_RECORD, PLAYER_FIELDS),
+    (ZOMBIE_RECORD, ZOMBIE_FIELDS),
+    (ITEM_RECORD, ITEM_FIELDS),
+    (ITEM_RECORD, ITEM_FIELDS),
+    (ITEM_RECORD, ITEM_FIELDS),
+    (PLACED_RECORD, PLACED_FIELDS),
+)))
+
+def _binary_kind(data):
+    """Тег бинарного сообщения для словаря или None, если формат не поддерживается."""
+    message_type = data.get('type')
+    if message_type is None:
+        if 'seq' in data and 'removed' in data:
+            return MSG_DELTA
+        if 'zombies' in data and 'players' in data:
+            return MSG_STATE
+        if 'x' in data and 'z' in data:
+            return MSG_POSITION
+        return None
+    return {
+        'hit': MSG_HIT,
+        'place_plank': MSG_PLACE_PLANK,
+        'remove_plank': MSG_REMOVE_PLANK,
+        'map': MSG_MAP
+    }.get(message_type)
+
+def encode_binary(data):
+    kind = _binary_kind(data)
+    if kind is None:
+        return None
+    parts = [MESSAGE_HEADER.pack(BINARY_MARKER, BINARY_VERSION, kind)]
+    if kind in (MSG_STATE, MSG_DELTA):
+        if kind == MSG_DELTA:
+            parts.append(DELTA_HEADER.pack(data['seq'], _pack_seq(data['baseline'])))
+        for path, (record, fields) in STATE_SECTIONS:
+            parts.extend(_pack_section(get_section(data, path), record, fields))
+        if kind == MSG_DELTA:
+            for path, _ in STATE_SECTIONS:
+                parts.extend(_pack_ids(get_section(data['removed'], path)))
+    elif kind == MSG_POSITION:
+        parts.append(POSITION_RECORD.pack(
+            data['x'], data['y'], data['z'], bool(data.get('shooting', False)),
+            data.get('shoot_dir_x', 0), data.get('shoot_dir_y', 0), data.get('shoot_dir_z', 0),
+            _pack_seq(data.get('ack'))
+        ))
+    elif kind == MSG_HIT:
+        parts.append(HIT_RECORD.pack(int(data['target_id']), data['damage']))
+    elif kind == MSG_PLACE_PLANK:
+        parts.append(PLACE_RECORD.pack(
+            data['x'], data['y'], data['z'], data['rotation'], bool(data['is_wall'])
+        ))
+    elif kind == MSG_REMOVE_PLANK:
+        parts.append(REMOVE_RECORD.pack(int(data['plank_id'])))
+    elif kind == MSG_MAP:
+        parts.append(MAP_RECORD.pack(data['hash'].encode()))
+        parts.append(data['data'])
+    return b''.join(parts)
+
+def decode_binary(payload):
+    marker, version, kind = MESSAGE_HEADER.unpack_from(payload, 0)
+    if marker != BINARY_MARKER or version != BINARY_VERSION:
+        raise ProtocolError(f"Неподдерживаемая версия бинарного протокола: {version}")
+    offset = MESSAGE_HEADER.size
+    if kind in (MSG_STATE, MSG_DELTA):
+        data = {}
+        if kind == MSG_DELTA:
+            seq, baseline = DELTA_HEADER.unpack_from(payload, offset)
+            offset += DELTA_HEADER.size
+            data['seq'] = seq
+            data['baseline'] = _unpack_seq(baseline)
+        for path, (record, fields) in STATE_SECTIONS:
+            section, offset = _unpack_section(payload, offset, record, fields)
+            set_section(data, path, section)
+        if kind == MSG_DELTA:
+            data['removed'] = {}
+            for path, _ in STATE_SECTIONS:
+                ids, offset = _unpack_ids(payload, offset)
+                set_section(data['removed'], path, ids)
+        return data
+    if kind == MSG_POSITION:
+        values = POSITION_RECORD.unpack_from(payload, offset)
+        data = dict(zip(POSITION_FIELDS, values))
+        data['ack'] = _unpack_seq(values[-1])
+        return data
+    if kind == MSG_HIT:
+        target_id, damage = HIT_RECORD.unpack_from(payload, offset)
+        return {'type': 'hit', 'target_id': target_id, 'damage': damage}
+    if kind == MSG_PLACE_PLANK:
+        x, y, z, rotation, is_wall = PLACE_RECORD.unpack_from(payload, offset)
+        return {'type': 'place_plank', 'x': x, 'y': y, 'z': z,
+                'rotation': rotation, 'is_wall': is_wall}
+    if kind == MSG_REMOVE_PLANK:
+        (plank_id,) = REMOVE_RECORD.unpack_from(payload, offset)
+        return {'type': 'remove_plank', 'plank_id': plank_id}
+    if kind == MSG_MAP:
+        (map_hash,) = MAP_RECORD.unpack_from(payload, offset)
+        return {'type': 'map', 'hash': map_hash.decode(),
+                'data': bytes(payload[offset + MAP_RECORD.size:])}
+    raise ProtocolError(f"Неизвестный тип бинарного сообщения: {kind}")
+
+def encode_payload(data, protocol=PROTOCOL_JSON):
+    """Кодирует словарь в тело сообщения.
+
+    В бинарном режиме сообщения без бинарного формата (ответы на попадания,
+    начальные данные и т.п.) по-прежнему уходят как JSON.
+    """
+    if isinstance(data, EncodedMessage):
+        return data.payload
+    if protocol == PROTOCOL_BINARY:
+        payload = encode_binary(data)
+        if payload is not None:
+            return payload
+    return json.dumps(data).encode()
+
+def decode_payload(payload):
+    # payload - bytes или memoryview кадра из буфера приема
+    if payload[:1] == bytes((BINARY_MARKER,)):
+        return decode_binary(payload)
+    return json.loads(str(payload, 'utf-8'))
+
+def encode_message(data, protocol=PROTOCOL_JSON):
+    if isinstance(data, EncodedMessage):
+        return data.frame
+    message = encode_payload(data, protocol)
+    header = str(len(message)).encode().ljust(HEADER_SIZE)
+    return header + message
@@ -0,0 +1,40 @@
+import random
+from protocol import ANIMATIONS
+
+def make_state(zombies, players=4, medkits=5, boosts=5, planks=10, placed=10):
+    """Случайный снимок мира в формате build_game_state (для тестов и bench_protocol)."""
+    def position():
+        return {'x': random.uniform(-80, 80), 'y': 0.0, 'z': random.uniform(-80, 80)}
+
+    return {
+        'players': {
+            str(pid): dict(position(), health=random.uniform(0, 100), is_alive=True,
+                           shoot_cooldown=1.0, planks_count=random.randint(0, 5),
+                           rotation=random.uniform(0, 360), animation=random.choice(ANIMATIONS))
+            for pid in range(players)
+        },
+        'zombies': {
+            str(zid): dict(position(), is_alive=True, scale=random.uniform(2, 4))
+            for zid in range(zombies)
+        },
+        'medkits': {str(i): position() for i in range(medkits)},
+        'speed_boosts': {str(i): position() for i in range(boosts)},
+        'planks': {
+            'pickups': {str(i): position() for i in range(planks)},
+            'placed': {
+                str(i): dict(position(), rotation=random.choice([0, 90]),
+                             is_wall=random.random() < 0.5, health=1000.0)
+                for i in range(placed)
+            }
+        }
+    }
+
+def moving_states(ticks, zombies=300, seed=0):
+    """Снимки (seq, state) подряд: те же зомби с каждым тиком сдвигаются по x."""
+    random.seed(seed)
+    base = make_state(zombies)
+    for seq in range(ticks):
+        state = make_state(0)
+        state['zombies'] = {eid: dict(record, x=record['x'] + 0.5 * seq) for eid, record
+                            in base['zombies'].items()}
+        yield seq, state
@@ -1,22 +1,45 @@
+import math
 import socket
-import json
 import threading
+from collections import deque
+from contextlib import nullcontext
 import random
 import time
-import urllib.request  # Используем urllib вместо requests, так как он встроен в Python
-from map_generator import generate_map
+from map_generator import generate_map, new_map_seed, MAP_GENERATOR_VERSION
 from player import Player
-from zombie import ZombieManager
+from zombie import Zombie, create_zombie_manager, ZOMBIE_BACKENDS
 from apteka import MedkitManager
 from speed import SpeedBoostManager
 from planks import PlankManager
+from tick import TickLoop
+from snapshot import SnapshotHistory
+from interest import InterestGrid, InterestView, INTEREST_RADIUS, INTEREST_HYSTERESIS
+from udp_channel import UdpChannel
+from spatial_grid import SpatialGrid
+from collision import CollisionWorld
+from navigation import NavigationGrid
+from input_slots import InputSlots
+from map_payload import MapPayload
+from metrics import Metrics, TimedLock
+from game_log import get_logger, setup_logging, add_logging_arguments, trace, UNLIMITED
+from framing import FrameReader
+from connection import (SocketConnection, OUTBOUND_QUEUE_SIZE, POLICY_DROP,
+                        SLOW_CLIENT_POLICIES, DISCONNECT_AFTER)
+from protocol import (EncodedMessage, decode_payload, negotiate_protocol,
+                      HEADER_SIZE, PROTOCOL_JSON, SUPPORTED_PROTOCOLS, ANIMATIONS)
 
-def get_external_ip():
+log = get_logger('server')
+
+EXTERNAL_IP_TIMEOUT = 2.0  # Секунд на запрос внешнего IP; в закрытой сети он не ответит вовсе
+
+def get_external_ip(timeout=EXTERNAL_IP_TIMEOUT):
+    # urllib (вместе с http.client и ssl) импортируется здесь: он нужен только для этого запроса
+    import urllib.request  # Используем urllib вместо requests, так как он встроен в Python
     try:
-        external_ip = urllib.request.urlopen('https://api.ipify.org').read().decode('utf8')
+        external_ip = urllib.request.urlopen('https://api.ipify.org', timeout=timeout).read().decode('utf8')
         return external_ip
-    except:
-        return "Не удалось получить внешний IP"
+    except Exception:
+        return None
 
 def get_local_ip():
     try:
@@ -29,360 +52,646 @@ def get_local_ip():
     except:
         return "127.0.0.1"
 
+def print_server_info(port, external_ip=True):
+    """Выводит адреса для подключения.
+
+    Внешний IP запрашивается в фоновом потоке и выводится, когда придет ответ,
+    поэтому старт сервера его не ждет; external_ip=False отключает запрос.
+    """
+    local_ip = get_local_ip()
+
+    print("\n=== Информация о сервере ===")
+    print(f"Порт: {port}")
+    print(f"Локальный IP: {local_ip}")
+    print("\nДля подключения по локальной сети используйте:")
+    print(f"IP: {local_ip}, Порт: {port}")
+    if external_ip:
+        print("\nВнешний IP определяется, адрес для подключения из интернета появится в логе")
+    print("============================\n")
+
+    if external_ip:
+        thread = threading.Thread(target=log_external_ip, args=(port,), name="external-ip")
+        thread.daemon = True
+        thread.start()
+
+def log_external_ip(port):
+    external_ip = get_external_ip()
+    if external_ip is None:
+        log.warning("Не удалось получить внешний IP (ожидание до %.0f с)", EXTERNAL_IP_TIMEOUT)
+        return
+    log.info("Для подключения из интернета используйте IP: %s, Порт: %s "
+             "(убедитесь, что порт проброшен на роутере)", external_ip, port, extra=UNLIMITED)
+
 SPAWN_POSITION = (0, 5, 0)
 MAP_SIZE = 40
+MAP_HALF = MAP_SIZE * 2  # Карта занимает [-MAP_HALF, MAP_HALF] по x и z
+TICK_RATE = 30  # Частота тиков симуляции (Гц)
+WORLD_MESSAGES = ('hit', 'place_plank', 'remove_plank')  # Меняют мир через world_command
+
+def parse_position(data, limit=MAP_HALF):
+    """Позиция из сообщения клиента: (x, y, z) или None, если это не конечные числа.
+
+    Координаты затем попадают в ячейки сеток и поля направлений, где
+    бесконечность или NaN роняют тик целиком, поэтому они отсекаются здесь,
+    а x и z прижимаются к краю карты.
+    """
+    try:
+        x, y, z = float(data['x']), float(data['y']), float(data['z'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(z)):
+        return None
+    return min(max(x, -limit), limit), y, min(max(z, -limit), limit)
+
+def parse_rotation(value):
+    # Поворот уходит в снимки всем игрокам: только конечное число
+    try:
+        rotation = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return rotation if math.isfinite(rotation) else 0.0
+
+def parse_ack(value):
+    # Номер подтвержденного снимка - ключ истории снимков: только целое или None
+    return value if value is None or type(value) is int else None
 
 class GameServer:
-    def __init__(self, port=21491):
-        # Получаем и выводим информацию о подключении перед инициализацией сервера
+    def __init__(self, port=21491, tick_rate=TICK_RATE, interest_radius=INTEREST_RADIUS,
+                 interest_hysteresis=INTEREST_HYSTERESIS, udp=False,
+                 outbound_queue=OUTBOUND_QUEUE_SIZE, slow_client_policy=POLICY_DROP,
+                 disconnect_after=DISCONNECT_AFTER, map_seed=None, metrics_port=None,
+                 single_writer=False, announce=True, external_ip=True, zombie_backend='objects'):
+        self.started_at = time.perf_counter()
+        # Сокет привязывается первым: порт занят сразу, а подключения, пришедшие
+        # до конца подготовки, ждут в очереди listen и не получают отказ.
+        # port=None - своего сокета нет, принятые подключения передает лобби
         self.port = port
-        local_ip = get_local_ip()
-        external_ip = get_external_ip()
-        
-        print("\n=== Информация о сервере ===")
-        print(f"Порт: {self.port}")
-        print(f"Локальный IP: {local_ip}")
-        print(f"Внешний IP: {external_ip}")
-        print("\nДля подключения по локальной сети используйте:")
-        print(f"IP: {local_ip}, Порт: {self.port}")
-        print("\nДля подключения из интернета используйте:")
-        print(f"IP: {external_ip}, Порт: {self.port}")
-        print("(Убедитесь, что порт проброшен на роутере)")
-        print("============================\n")
+        self.server_socket = None
+        if port is not None:
+            self.server_socket = socket.socket()
+            # Перезапуск не ждет, пока соединения прошлого процесса выйдут из TIME_WAIT
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind(('0.0.0.0', self.port))
+            self.server_socket.listen(128)
+            self.port = self.server_socket.getsockname()[1]
+
+        # Комнаты лобби (announce=False) не выводят адреса: адрес для игроков у лобби
+        if announce:
+            print_server_info(self.port, external_ip)
 
         # Инициализация остальных компонентов
-        self.players = {}
-        self.zombie_manager = ZombieManager(MAP_SIZE)
-        self.players_lock = threading.Lock()
-        self.zombies_lock = threading.Lock()
-        
-        self.map_data = generate_map(MAP_SIZE)
-        self.map_json = json.dumps(self.map_data)
-        self.zombie_manager.set_walls(self.map_data)
+        self.players = {}  # Игроки в мире симуляции
+        self.player_grid = SpatialGrid()  # Те же игроки по ячейкам, для поиска ближайших
+        self.sessions = {}  # Подключенные игроки: сетевые потоки находят здесь соединение и формат
+        self.zombie_backend = zombie_backend
+        self.zombie_manager = create_zombie_manager(MAP_SIZE, zombie_backend)
+        # Метрики собираются всегда, эндпоинт поднимается только с metrics_port
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        # Режим одного писателя: мир меняет только поток симуляции, а сетевые потоки
+        # передают ему команды и читают опубликованные снимки, поэтому блокировки мира не нужны
+        self.single_writer = single_writer
+        self.commands = deque()  # (player_id, функция, аргументы) до следующего тика
+        if single_writer:
+            self.players_lock = self.zombies_lock = nullcontext()
+        else:
+            self.players_lock = TimedLock('players', self.metrics)
+            self.zombies_lock = TimedLock('zombies', self.metrics)
         
-        self.server_socket = socket.socket()
-        self.server_socket.bind(('0.0.0.0', self.port))
-        self.server_socket.listen(10)
+        # По seed карту можно воспроизвести: --map-seed с тем же числом
+        self.map_seed = new_map_seed() if map_seed is None else map_seed
+        self.map_data = generate_map(MAP_SIZE, self.map_seed)
+        # Карта кодируется и сжимается один раз, а не при каждом подключении. Сжатие
+        # (zlib отпускает GIL) идет в отдельном потоке, пока здесь готовятся стены и менеджеры
+        payload = {}
+        encoder = threading.Thread(target=self.encode_map, args=(payload,), name="map-encoder")
+        encoder.start()
+        # Стены карты не меняются: одна структура столкновений на все менеджеры
+        self.collision = CollisionWorld(self.map_data)
+        self.zombie_manager.set_collision(self.collision)
+        # Проходимость карты для поля направлений зомби, тоже одна на все менеджеры
+        self.navigation = NavigationGrid(self.collision, MAP_SIZE * 2, Zombie.WALL_MARGIN)
+        self.zombie_manager.set_navigation(self.navigation)
+
+        # UDP на том же номере порта для позиций и снимков
+        self.udp_channel = None
+        if udp:
+            self.udp_channel = UdpChannel(self, self.port or 0)
         
         self.next_player_id = 0
         self.medkit_manager = MedkitManager(MAP_SIZE)
-        self.medkit_manager.set_walls(self.map_data)
+        self.medkit_manager.set_collision(self.collision)
         self.speed_boost_manager = SpeedBoostManager(MAP_SIZE)
-        self.speed_boost_manager.set_walls(self.map_data)
+        self.speed_boost_manager.set_collision(self.collision)
         self.plank_manager = PlankManager(MAP_SIZE)
-        self.plank_manager.set_walls(self.map_data)
+        self.plank_manager.set_collision(self.collision)
         self.zombie_manager.set_plank_manager(self.plank_manager)
 
+        encoder.join()
+        self.map_payload = payload['map']
+        log.info("Карта %s (seed %s): %d байт JSON, %d байт в сжатом виде", self.map_payload.hash,
+                 self.map_seed, self.map_payload.raw_size, self.map_payload.size)
+
+        self.tick_rate = tick_rate
+        self.tick_loop = None
+        # Настройки исходящих очередей клиентов
+        self.connection_options = dict(max_queue=outbound_queue, policy=slow_client_policy,
+                                       disconnect_after=disconnect_after, metrics=self.metrics)
+        self.interest_radius = interest_radius
+        self.interest_hysteresis = interest_hysteresis
+        # Отфильтрованные снимки и их кадры общие для игроков в одной ячейке
+        self.interest_grid = None
+        if interest_radius > 0:
+            self.interest_grid = InterestGrid(interest_radius, interest_hysteresis)
+        self.inputs = InputSlots()  # Последние позиции игроков до следующего тика
+        self.snapshots = SnapshotHistory()
+        self.snapshots.record(self.build_game_state())  # Чтобы было что ответить до первого тика
+        self.next_zombie_spawn_time = 0
+        self.game_is_reset = False
+
+    def encode_map(self, payload):
+        payload['map'] = MapPayload(self.map_data, {
+            'seed': self.map_seed, 'size': MAP_SIZE, 'version': MAP_GENERATOR_VERSION})
+
+    def mark_ready(self):
+        """Сигнал готовности: строка в логе, /ready на эндпоинте метрик и метрика времени старта."""
+        startup = time.perf_counter() - self.started_at
+        self.metrics.startup_seconds.set(round(startup, 6))
+        self.metrics.ready.set()
+        if self.server_socket is None:
+            log.info("Сервер готов к подключениям от лобби, старт занял %.1f мс",
+                     startup * 1000, extra=UNLIMITED)
+        else:
+            log.info("Сервер готов к подключениям на порту %s, старт занял %.1f мс",
+                     self.port, startup * 1000, extra=UNLIMITED)
+
     def reset_game(self):
         with self.zombies_lock:
-            self.zombie_manager = ZombieManager(MAP_SIZE)
-            self.zombie_manager.set_walls(self.map_data)
+            self.zombie_manager = create_zombie_manager(MAP_SIZE, self.zombie_backend)
+            self.zombie_manager.set_collision(self.collision)
+            self.zombie_manager.set_navigation(self.navigation)
             self.zombie_manager.set_plank_manager(self.plank_manager)
-            print("Игра сброшена: все зомби удалены")
+            log.info("Игра сброшена: все зомби удалены")
 
     def check_active_players(self):
         with self.players_lock:
             # Проверяем, есть ли живые игроки
             alive_players = sum(1 for p in self.players.values() if p.is_alive)
             total_players = len(self.players)
-            
-            if total_players == 0:
-                # Если игроков нет, сбрасываем игру
+
+        if total_players == 0:
+            # Если игроков нет, сбрасываем игру (один раз, пока сервер пуст)
+            if not self.game_is_reset:
                 self.reset_game()
-                time.sleep(5)  # Задержка 5 секунд
-                return False
-            elif total_players == 1 and alive_players == 0:
-                # Если есть только один игрок и он мертв
-                return False
-            return True
-
-    def spawn_zombies(self):
-        while True:
-            try:
-                # Проверяем состояние игроков
-                if self.check_active_players():
-                    with self.zombies_lock:
-                        x = random.uniform(-MAP_SIZE*2 + 5, MAP_SIZE*2 - 5)
-                        z = random.uniform(-MAP_SIZE*2 + 5, MAP_SIZE*2 - 5)
-                        zombie_id = self.zombie_manager.spawn_zombie(x, 0, z)
-                        if zombie_id is not None:
-                            print(f"Зомби {zombie_id} создан на позиции ({x}, 0, {z})")
-                time.sleep(random.uniform(5, 10))  # Перенесли sleep сюда
-            except Exception as e:
-                print(f"Ошибка при создании зомби: {e}")
+                self.game_is_reset = True
+            return False
+        self.game_is_reset = False
+
+        if total_players == 1 and alive_players == 0:
+            # Если есть только один игрок и он мертв
+            return False
+        return True
+
+    def spawn_zombies(self, now):
+        if now < self.next_zombie_spawn_time:
+            return
+        x = random.uniform(-MAP_SIZE*2 + 5, MAP_SIZE*2 - 5)
+        z = random.uniform(-MAP_SIZE*2 + 5, MAP_SIZE*2 - 5)
+        zombie_id = self.zombie_manager.spawn_zombie(x, 0, z)
+        if zombie_id is not None:
+            log.debug("Зомби %s создан на позиции (%.1f, 0, %.1f)", zombie_id, x, z)
+            trace('zombie', zombie_id, "создан на позиции (%.1f, 0, %.1f)", x, z)
+        self.next_zombie_spawn_time = now + random.uniform(5, 10)
+
+    def tick(self, dt):
+        """Один тик сервера: команды и ввод игроков, шаг симуляции и запись снимка мира в историю.
+
+        Снимок мира собирается заново каждый тик и после записи не изменяется,
+        поэтому сетевые потоки читают его без блокировок мира.
+        """
+        self.run_commands()
+        self.apply_inputs()
+        merged = []
+        if self.check_active_players():
+            merged = self.simulate(dt)
 
-    def update_zombies(self):
         with self.zombies_lock, self.players_lock:
-            for zombie_id, zombie in self.zombie_manager.zombies.items():
-                if not zombie.is_alive:
-                    continue
+            self.snapshots.record(self.build_game_state())
+            alive = self.zombie_manager.count_alive()
+            self.metrics.zombies.set(alive, 'alive')
+            self.metrics.zombies.set(len(self.zombie_manager.zombies) - alive, 'dead')
+            self.metrics.players.set(len(self.players))
 
-                # Если у зомби нет цели или цель мертва, выбираем новую
-                if (zombie.target_player_id is None or 
-                    zombie.target_player_id not in self.players or 
-                    not self.players[zombie.target_player_id].is_alive):
-                    
-                    # Находим ближайшего живого игрока
-                    min_dist = float('inf')
-                    closest_player_id = None
-                    
-                    for pid, player in self.players.items():
-                        if player.is_alive:
-                            dist = ((zombie.x - player.x) ** 2 + 
-                                   (zombie.y - player.y) ** 2 + 
-                                   (zombie.z - player.z) ** 2) ** 0.5
-                            if dist < min_dist:
-                                min_dist = dist
-                                closest_player_id = pid
-                    
-                    zombie.target_player_id = closest_player_id
-                    print(f"Зомби {zombie_id} выбрал цель игрока {closest_player_id}")
-
-                # Двигаем зомби к цели
-                if zombie.target_player_id is not None:
-                    zombie.move_towards_nearest_player(self.players, self.walls)
-                    print(f"Зомби {zombie_id} перемещается к цели {zombie.target_player_id}")
-                    
-            # Отправляем обновленные позиции зомби клиентам
-            self.broadcast_zombie_updates()
-
-    def broadcast_zombie_updates(self):
-        game_state = {
-            'zombies': self.zombie_manager.to_dict(),
-            # Другие данные игры...
-        }
-        for player_id, player in self.players.items():
+        self.push_snapshots(merged)
+
+    def world_command(self, player_id, command, *args):
+        """Выполняет изменение мира от имени сетевого потока.
+
+        В режиме одного писателя команда ставится в очередь, а ответ на нее
+        уходит из потока симуляции. Иначе она выполняется сразу под обеими
+        блокировками мира, всегда в одном порядке: зомби, потом игроки.
+        """
+        if self.single_writer:
+            self.commands.append((player_id, command, args))
+            return None
+        with self.zombies_lock, self.players_lock:
+            return command(player_id, *args)
+
+    def run_commands(self):
+        # Только команды, пришедшие до начала тика; новые подождут следующего
+        for _ in range(len(self.commands)):
+            player_id, command, args = self.commands.popleft()
             try:
-                self.send_data(player.conn, game_state)
+                response = command(player_id, *args)
             except Exception as e:
-                print(f"Ошибка при отправке данных игроку {player_id}: {e}")
+                log.exception("Ошибка команды игрока %s: %s", player_id, e)
+                continue
+            session = self.sessions.get(player_id)
+            if response is not None and session is not None:
+                session.conn.send(response, session.protocol)
 
-    def send_map_data(self, conn):
-        try:
-            # Отправляем размер данных карты
-            conn.send(str(len(self.map_json)).encode())
-            
-            # Разбиваем карту на чанки и отправляем
-            for i in range(0, len(self.map_json), 1024):
-                chunk = self.map_json[i:i+1024]
-                conn.send(chunk.encode())
-            
-            # Отправляем маркер конца
-            conn.send(b"END")
-        except Exception as e:
-            print(f"Ошибка при отправке карты: {e}")
+    def apply_inputs(self):
+        """Применяет последний ввод каждого игрока, накопленный с прошлого тика."""
+        inputs = self.inputs.take()
+        if not inputs:
+            return
+        with self.players_lock:
+            for player_id, fields in inputs.items():
+                player = self.players.get(player_id)
+                if player is None:
+                    continue
+                if player.is_alive and 'x' in fields:
+                    player.set_position(fields['x'], fields['y'], fields['z'])
+                    self.player_grid.move(player_id, player)
+                    trace('player', player_id, "позиция (%.1f, %.1f, %.1f)", player.x, player.y, player.z)
+                if 'ack' in fields:
+                    player.acked_snapshot = fields['ack']
+                if 'rotation' in fields:
+                    player.rotation = fields['rotation']
+                if 'animation' in fields:
+                    player.update_animation_state(fields['animation'])
+
+    def snapshot_for(self, acked_snapshot, protocol, interest_view, x, z):
+        """Разница между последним снимком и подтвержденным клиентом.
+
+        Кадр общий для всех клиентов с тем же базовым снимком, а с фильтрацией
+        по радиусу - еще и в той же ячейке InterestGrid.
+        """
+        if interest_view is None:
+            return self.snapshots.encoded_since(acked_snapshot, protocol)
+        seq, state = self.snapshots.latest()
+        return interest_view.delta_since(acked_snapshot, seq, state, x, z, protocol)
+
+    def push_snapshots(self, merged=()):
+        # Рассылка подписанным клиентам с частотой тиков, независимо от их запросов.
+        # Кадры только кладутся в очереди, поэтому медленный клиент тик не задерживает
+        with self.players_lock:
+            targets = [
+                (p.conn, p.protocol, p.acked_snapshot, p.interest_view, p.x, p.z, p.udp_token)
+                for p in self.players.values() if p.streaming
+            ]
+        despawn = self.despawn_message(merged)
+        for conn, protocol, acked_snapshot, interest_view, x, z, udp_token in targets:
+            if despawn is not None:
+                # Поглощенных зомби уберут и removed в дельтах; событие говорит, кто кого
+                # поглотил. Его можно выбросить из очереди, как снимок: состояние от него не зависит
+                conn.send(despawn, protocol, droppable=True, kind='despawn')
+            message = self.snapshot_for(acked_snapshot, protocol, interest_view, x, z)
+            if udp_token is not None and self.udp_channel.push(udp_token, message, protocol):
+                continue
+            conn.send(message, protocol)
+
+    def despawn_message(self, merged):
+        """Событие о зомби, поглощенных за тик, - один кадр на всех клиентов, или None."""
+        if not merged:
+            return None
+        seq, _ = self.snapshots.latest()
+        return EncodedMessage({
+            'type': 'despawn',
+            'snapshot': seq,
+            'merged': [[str(absorbed), str(absorber)] for absorbed, absorber in merged]
+        })
+
+    def simulate(self, dt):
+        """Один шаг симуляции; возвращает слияния зомби за шаг как пары (поглощенный, поглотивший).
+
+        Порядок внутри шага фиксирован: спавн зомби, слияния и движение зомби,
+        аптечки, бонусы скорострельности, подбор досок, урон по доскам.
+        """
+        now = time.time()
+        with self.zombies_lock, self.players_lock:
+            self.spawn_zombies(now)
+            merged = self.zombie_manager.update_zombies(self.players, dt, self.player_grid)
+            if merged:
+                self.metrics.zombies_merged.inc(len(merged))
+                log.debug("Слияния зомби (поглощенный, поглотивший): %s", merged)
+
+            self.medkit_manager.spawn_medkit()
+            self.medkit_manager.check_pickups(self.players, self.player_grid)
+
+            self.speed_boost_manager.spawn_boost()
+            self.speed_boost_manager.check_pickups(self.players, self.player_grid)
+
+            self.plank_manager.spawn_plank()
+            self.plank_manager.check_pickups(self.players, self.player_grid)
+            self.plank_manager.update_placed_planks(self.zombie_manager.zombies, dt,
+                                                    self.zombie_manager.grid)
+        return merged
+
+    def send_data(self, conn, data, protocol=PROTOCOL_JSON):
+        # conn - очередь Connection: запись в сокет делает ее писатель, а не вызывающий поток
+        return conn.send(data, protocol)
 
-    def send_data(self, conn, data):
+    def decode_frame(self, frame):
+        # Разбирает кадр из буфера приема и учитывает его в метриках
+        with frame:
+            data = decode_payload(frame)
+            self.metrics.record_in(data, len(frame) + HEADER_SIZE)
+        return data
+
+    def receive_data(self, reader):
+        # reader - FrameReader сокета клиента: буфер и недочитанный кадр живут в нем
         try:
-            message = json.dumps(data).encode()
-            message_length = len(message)
-            header = str(message_length).encode().ljust(10)
-            conn.send(header + message)
+            frame = reader.receive_frame()
+            if frame is None:
+                return None
+            return self.decode_frame(frame)
         except Exception as e:
-            print(f"Ошибка при отправке данных: {e}")
-            raise e
+            log.warning("Ошибка при получении данных: %s", e)
+            return None
+
+    def allocate_player_id(self):
+        player_id = self.next_player_id
+        self.next_player_id += 1
+        return player_id
+
+    def add_player(self, player_id, conn):
+        # Создаем игрока
+        player = Player(*SPAWN_POSITION)
+        player.conn = conn  # Добавляем связь с соединением
+        player.protocol = PROTOCOL_JSON  # До согласования формата
+        player.acked_snapshot = None  # Последний снимок, подтвержденный клиентом
+        player.interest_view = None
+        player.udp_token = None
+        player.streaming = False  # Снимки по расписанию сервера, а не в ответ на позицию
+        if self.udp_channel:
+            player.udp_token = self.udp_channel.register(player_id)
+        if self.interest_grid is not None:
+            player.interest_view = InterestView(self.interest_grid)
+        self.sessions[player_id] = player
+        self.world_command(player_id, self.insert_player, player)
+
+    def insert_player(self, player_id, player):
+        self.players[player_id] = player
+        self.player_grid.insert(player_id, player)
 
-    def receive_data(self, conn):
+    def delete_player(self, player_id):
+        self.players.pop(player_id, None)
+        self.player_grid.remove(player_id)
+
+    def connection_stats(self):
+        # Глубина исходящих очередей, отправленные и выброшенные кадры по игрокам
+        return {pid: p.conn.stats() for pid, p in list(self.sessions.items())}
+
+    def interest_stats(self):
+        # Сколько сущностей отсечено для каждого клиента в его последнем снимке
+        return {pid: p.interest_view.stats() for pid, p in list(self.sessions.items())
+                if p.interest_view is not None}
+
+    def input_stats(self):
+        # Сколько позиций пришло, применено и слито в последнем тике
+        return self.inputs.stats()
+
+    def get_protocol(self, player_id):
+        player = self.sessions.get(player_id)
+        return player.protocol if player else PROTOCOL_JSON
+
+    def remove_player(self, player_id):
+        player = self.sessions.pop(player_id, None)
+        if player is None:
+            return
+        if self.udp_channel and player.udp_token is not None:
+            self.udp_channel.unregister(player.udp_token)
+        self.world_command(player_id, self.delete_player)
+        self.inputs.discard(player_id)
+
+    def get_initial_data(self, player_id):
+        # Отправляем ID и хэш карты: сама карта передается отдельно и только без кэша
+        data = {
+            'id': player_id,
+            'map_info': self.map_payload.info(),  # Саму карту клиент запросит, если ее нет в кэше
+            'protocols': SUPPORTED_PROTOCOLS,
+            'stream': True
+        }
+        if self.udp_channel:
+            data['udp'] = {'port': self.udp_channel.port, 'token': self.sessions[player_id].udp_token}
+        return data
+
+    def build_game_state(self):
+        # Вызывается под блокировками мира (в режиме одного писателя - из потока симуляции)
+        # Отправляем только необходимые данные
+        return {
+            'players': {
+                str(pid): {
+                    'x': p.x,
+                    'y': p.y,
+                    'z': p.z,
+                    'health': p.health,
+                    'is_alive': p.is_alive,
+                    'shoot_cooldown': p.shoot_cooldown,
+                    'planks_count': p.planks_count,
+                    'rotation': p.rotation,
+                    'animation': p.animation_state
+                } for pid, p in self.players.items()
+            },
+            'zombies': self.zombie_manager.snapshot(),
+            'medkits': self.medkit_manager.to_dict(),
+            'speed_boosts': self.speed_boost_manager.to_dict(),
+            'planks': self.plank_manager.to_dict()
+        }
+
+    def apply_hit(self, player_id, zombie_id, damage):
+        zombie = self.zombie_manager.get_zombie(zombie_id)
+        if zombie is None:
+            return None
+        was_alive = zombie.is_alive
+        zombie.take_damage(damage)
+        player = self.players.get(player_id)
+        if was_alive and not zombie.is_alive and player is not None:
+            player.add_kill()
+        log.debug("Зомби %s получил %s урона. HP: %s", zombie_id, damage, zombie.health)
+        trace('zombie', zombie_id, "получил %s урона от игрока %s, HP: %s", damage, player_id, zombie.health)
+        trace('player', player_id, "попал по зомби %s на %s урона", zombie_id, damage)
+        return {
+            "hit_confirmed": True,
+            "zombie_id": zombie_id,
+            "health": zombie.health
+        }
+
+    def apply_place_plank(self, player_id, data):
+        player = self.players.get(player_id)
+        position = parse_position(data)
         try:
-            header = conn.recv(10).decode().strip()
-            if not header:
+            rotation = float(data['rotation'])
+        except (KeyError, TypeError, ValueError):
+            rotation = math.nan
+        if position is None or not math.isfinite(rotation):
+            log.warning("Игрок %s ставит доску в некорректную позицию: %r", player_id, data)
+            return {"plank_placed": False}
+        if player is not None and self.plank_manager.place_plank(
+            *position,
+            rotation,
+            data['is_wall'],
+            player
+        ):
+            return {"plank_placed": True}
+        return {"plank_placed": False}
+
+    def apply_remove_plank(self, player_id, plank_id):
+        player = self.players.get(player_id)
+        if plank_id in self.plank_manager.placed_planks and player is not None:
+            # Возвращаем доску игроку
+            player.planks_count += 1
+            # Удаляем доску
+            del self.plank_manager.placed_planks[plank_id]
+            return {"plank_removed": True}
+        return {"plank_removed": False}
+
+    def send_map(self, session):
+        # Готовый общий кадр; как событие его нельзя выбросить из очереди
+        self.map_payload.downloads += 1
+        session.conn.send(self.map_payload.message, droppable=False, kind='map')
+
+    def handle_message(self, player_id, player_data):
+        """Обрабатывает одно сообщение клиента и возвращает ответ (или None).
+
+        Общий обработчик для потокового и asyncio режимов сервера.
+        """
+        if 'type' in player_data:
+            if player_data['type'] == 'hello':
+                # Клиент предлагает формат; ответ на hello всегда уходит как JSON.
+                # Формат и подписка - состояние соединения, а не мира
+                protocol = negotiate_protocol(player_data)
+                streaming = bool(player_data.get('stream', False))
+                send_map = bool(player_data.get('get_map', False))
+                session = self.sessions[player_id]
+                session.protocol = protocol
+                # Ответ и заказанная карта встают в очередь до включения подписки,
+                # иначе снимок тика может их обогнать
+                session.conn.send({'type': 'hello', 'protocol': protocol, 'stream': streaming,
+                                   'map': send_map}, protocol)
+                if send_map:
+                    self.send_map(session)
+                session.streaming = streaming
                 return None
-            
-            message_length = int(header)
-            
-            message = b""
-            while len(message) < message_length:
-                chunk = conn.recv(min(message_length - len(message), 1024))
-                if not chunk:
+            elif player_data['type'] == 'hit':
+                return self.world_command(player_id, self.apply_hit,
+                                          int(player_data['target_id']), player_data['damage'])
+            elif player_data['type'] == 'place_plank':
+                return self.world_command(player_id, self.apply_place_plank, player_data)
+            elif player_data['type'] == 'get_map':
+                # Без подписки; подписанный клиент заказывает карту в hello
+                self.send_map(self.sessions[player_id])
+            elif player_data['type'] == 'player_state':
+                # Клиент шлет его каждый кадр - как и позиция, он только запоминается до тика
+                position = parse_position(player_data.get('position'))
+                if position is None:
+                    log.warning("Игрок %s прислал некорректную позицию: %r", player_id,
+                                player_data.get('position'))
                     return None
-                message += chunk
-            
-            return json.loads(message.decode())
-        except Exception as e:
-            print(f"Ошибка при получении данных: {e}")
+                x, y, z = position
+                animation = player_data.get('animation')
+                self.inputs.store(player_id, {
+                    'x': x,
+                    'y': y,
+                    'z': z,
+                    'rotation': parse_rotation(player_data.get('rotation', 0)),
+                    'animation': animation if animation in ANIMATIONS else ANIMATIONS[0]
+                })
+            elif player_data['type'] == 'remove_plank':
+                try:
+                    plank_id = int(player_data['plank_id'])  # Ключи placed_planks - числа
+                except (KeyError, TypeError, ValueError) as e:
+                    log.warning("Ошибка при удалении доски: %s", e)
+                    return {"plank_removed": False, "error": str(e)}
+                return self.world_command(player_id, self.apply_remove_plank, plank_id)
+            return None
+
+        # Позиция только запоминается без блокировки мира, применит ее следующий тик
+        fields = {}
+        position = parse_position(player_data)
+        if position is None:
+            log.warning("Игрок %s прислал некорректную позицию: %r", player_id,
+                        {field: player_data.get(field) for field in ('x', 'y', 'z')})
+        else:
+            fields['x'], fields['y'], fields['z'] = position
+        if 'ack' in player_data:
+            fields['ack'] = parse_ack(player_data['ack'])
+        if fields:
+            self.inputs.store(player_id, fields)
+
+        player = self.sessions.get(player_id)
+        if player is None or player.streaming:
+            # Снимок придет со следующим тиком
             return None
+        acked_snapshot = fields.get('ack', player.acked_snapshot)
+        return self.snapshot_for(acked_snapshot, player.protocol, player.interest_view,
+                                 player.x, player.z)
 
     def handle_client(self, conn, addr):
-        player_id = self.next_player_id
-        self.next_player_id += 1
-        
-        print(f'Подключился игрок {player_id} с адреса {addr}')
+        player_id = self.allocate_player_id()
+        log.info("Подключился игрок %s с адреса %s", player_id, addr)
+        outbound = SocketConnection(conn, f"player-{player_id}", **self.connection_options)
+        reader = FrameReader(conn)
         
         try:
-            # Отправляем ID и карту в одном сообщении
-            initial_data = {
-                'id': player_id,
-                'map': self.map_data
-            }
-            self.send_data(conn, initial_data)
+            # Игрок добавляется до начальных данных, чтобы в них попал его UDP token
+            self.add_player(player_id, outbound)
+            self.send_data(outbound, self.get_initial_data(player_id))
             
-            # Создаем игрока
-            with self.players_lock:
-                self.players[player_id] = Player(*SPAWN_POSITION)
-                self.players[player_id].conn = conn  # Добавляем связь с соединением
-            
-            while True:
+            # Очередь закрывается и при отключении медленного клиента
+            while not outbound.closed:
                 try:
-                    player_data = self.receive_data(conn)
+                    player_data = self.receive_data(reader)
                     if not player_data:
                         break
-                    
-                    if 'type' in player_data:
-                        if player_data['type'] == 'hit':
-                            zombie_id = int(player_data['target_id'])
-                            damage = player_data['damage']
-                            with self.zombies_lock:
-                                zombie = self.zombie_manager.get_zombie(zombie_id)
-                                if zombie:
-                                    was_alive = zombie.is_alive
-                                    zombie.take_damage(damage)
-                                    if was_alive and not zombie.is_alive:
-                                        with self.players_lock:
-                                            self.players[player_id].add_kill()
-                                    print(f"Зомби {zombie_id} получил {damage} урона. HP: {zombie.health}")
-                                    self.send_data(conn, {
-                                        "hit_confirmed": True,
-                                        "zombie_id": zombie_id,
-                                        "health": zombie.health
-                                    })
-                        elif player_data['type'] == 'place_plank':
-                            with self.players_lock:
-                                if self.plank_manager.place_plank(
-                                    player_data['x'],
-                                    player_data['y'],
-                                    player_data['z'],
-                                    player_data['rotation'],
-                                    player_data['is_wall'],
-                                    self.players[player_id]
-                                ):
-                                    response = {"plank_placed": True}
-                                else:
-                                    response = {"plank_placed": False}
-                                self.send_data(conn, response)
-                        elif player_data['type'] == 'remove_plank':
-                            try:
-                                plank_id = str(player_data['plank_id'])  # Убедимся, что ID в строковом формате
-                                with self.players_lock:
-                                    if plank_id in self.plank_manager.placed_planks:
-                                        # Возвращаем доску игроку
-                                        self.players[player_id].planks_count += 1
-                                        # Удаляем доску
-                                        del self.plank_manager.placed_planks[plank_id]
-                                        self.send_data(conn, {"plank_removed": True})
-                                    else:
-                                        self.send_data(conn, {"plank_removed": False})
-                            except Exception as e:
-                                print(f"Ошибка при удалении доски: {e}")
-                                self.send_data(conn, {"plank_removed": False, "error": str(e)})
-                    else:
-                        # Обновляем позицию игрока
-                        with self.players_lock:
-                            if self.players[player_id].is_alive:
-                                self.players[player_id].set_position(
-                                    player_data['x'],
-                                    player_data['y'],
-                                    player_data['z']
-                                )
-                            
-                            # Отправляем только необходимые данные
-                            game_state = {
-                                'players': {
-                                    str(pid): {
-                                        'x': p.x,
-                                        'y': p.y,
-                                        'z': p.z,
-                                        'health': p.health,
-                                        'is_alive': p.is_alive,
-                                        'shoot_cooldown': p.shoot_cooldown,
-                                        'planks_count': p.planks_count
-                                    } for pid, p in self.players.items()
-                                },
-                                'zombies': {
-                                    str(zid): {
-                                        'x': z.x,
-                                        'y': z.y,
-                                        'z': z.z,
-                                        'is_alive': z.is_alive,
-                                        'scale': z.scale
-                                    } for zid, z in self.zombie_manager.zombies.items()
-                                },
-                                'medkits': self.medkit_manager.to_dict(),
-                                'speed_boosts': self.speed_boost_manager.to_dict(),
-                                'planks': self.plank_manager.to_dict()
-                            }
-                            
-                            self.send_data(conn, game_state)
+
+                    response = self.handle_message(player_id, player_data)
+                    if response is not None:
+                        self.send_data(outbound, response, self.get_protocol(player_id))
         
                 except Exception as e:
-                    print(f"Ошибка обработки клиента: {e}")
+                    log.warning("Ошибка обработки клиента %s: %s", player_id, e)
                     break
         
         finally:
-            with self.players_lock:
-                if player_id in self.players:
-                    del self.players[player_id]
+            self.remove_player(player_id)
+            outbound.close()
             conn.close()
-            print(f'Игрок {player_id} отключился')
+            log.info("Игрок %s отключился", player_id)
 
-    def update_medkits(self):
-        while True:
-            try:
-                if self.check_active_players():
-                    with self.players_lock:
-                        self.medkit_manager.spawn_medkit()
-                        self.medkit_manager.check_pickups(self.players)
-                time.sleep(1)  # Проверяем каждую секунду
-            except Exception as e:
-                print(f"Ошибка при обновлении аптечек: {e}")
+    def start_simulation(self):
+        # Вся симуляция идет в одном потоке с фиксированной частотой тиков
+        self.tick_loop = TickLoop(self.tick_rate, self.tick, name="simulation",
+                                  observer=self.metrics.tick_duration.observe)
+        self.tick_loop.start()
 
-    def update_speed_boosts(self):
-        while True:
-            try:
-                if self.check_active_players():
-                    with self.players_lock:
-                        self.speed_boost_manager.spawn_boost()
-                        self.speed_boost_manager.check_pickups(self.players)
-                time.sleep(1)
-            except Exception as e:
-                print(f"Ошибка при обновлении бонусов скорострельности: {e}")
+    def start_udp(self):
+        if self.udp_channel:
+            self.udp_channel.start()
+            log.info("UDP-канал для позиций и снимков на порту %s", self.udp_channel.port, extra=UNLIMITED)
 
-    def update_planks(self):
-        while True:
-            try:
-                if self.check_active_players():
-                    with self.players_lock:
-                        self.plank_manager.spawn_plank()
-                        self.plank_manager.check_pickups(self.players)
-                        self.plank_manager.update_placed_planks(self.zombie_manager.zombies)
-                time.sleep(1)
-            except Exception as e:
-                print(f"Ошибка при обновлении досок: {e}")
+    def start_metrics(self):
+        if self.metrics_port is not None:
+            port = self.metrics.serve(self.metrics_port)
+            log.info("Метрики Prometheus: http://127.0.0.1:%s/metrics", port, extra=UNLIMITED)
 
     def run(self):
-        # Запускаем потоки для зомби
-        zombie_spawn_thread = threading.Thread(target=self.spawn_zombies)
-        zombie_spawn_thread.daemon = True
-        zombie_spawn_thread.start()
-
-        zombie_update_thread = threading.Thread(target=self.update_zombies)
-        zombie_update_thread.daemon = True
-        zombie_update_thread.start()
-
-        # Добавить потоки для аптечек, бонусов и досок
-        medkit_thread = threading.Thread(target=self.update_medkits)
-        medkit_thread.daemon = True
-        medkit_thread.start()
-
-        speed_boost_thread = threading.Thread(target=self.update_speed_boosts)
-        speed_boost_thread.daemon = True
-        speed_boost_thread.start()
+        self.start_simulation()
+        self.start_udp()
+        self.start_metrics()
+        self.mark_ready()
 
-        plank_thread = threading.Thread(target=self.update_planks)
-        plank_thread.daemon = True
-        plank_thread.start()
-
-        print("Сервер запущен и ожидает подключений...")
-        
         while True:
             try:
                 conn, addr = self.server_socket.accept()
@@ -390,9 +699,60 @@ class GameServer:
                 client_thread.daemon = True
                 client_thread.start()
             except Exception as e:
-                print(f"Ошибка при подключении клиента: {e}")
+                log.error("Ошибка при подключении клиента: %s", e)
+
+def add_server_arguments(parser):
+    """Параметры мира и соединений: общие для сервера и комнат лобби."""
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE,
+                        help="Частота тиков симуляции, например 20, 30 или 60")
+    parser.add_argument('--interest-radius', type=float, default=INTEREST_RADIUS,
+                        help="Радиус видимости сущностей для игрока, 0 - отправлять весь мир")
+    parser.add_argument('--interest-hysteresis', type=float, default=INTEREST_HYSTERESIS,
+                        help="Насколько игрок может выйти из своей ячейки видимости, прежде чем сменить ее")
+    parser.add_argument('--udp', action='store_true',
+                        help="Позиции и снимки по UDP, подключение и события по TCP")
+    parser.add_argument('--outbound-queue', type=int, default=OUTBOUND_QUEUE_SIZE,
+                        help="Максимум кадров в очереди на отправку одному клиенту")
+    parser.add_argument('--slow-client-policy', choices=SLOW_CLIENT_POLICIES, default=POLICY_DROP,
+                        help="drop - выбрасывать старые снимки, disconnect - еще и отключать после порога")
+    parser.add_argument('--disconnect-after', type=int, default=DISCONNECT_AFTER,
+                        help="Переполнений очереди подряд до отключения (для disconnect)")
+    parser.add_argument('--map-seed', type=int, default=None,
+                        help="Seed генератора карты, чтобы воспроизвести карту (по умолчанию случайный)")
+    parser.add_argument('--single-writer', action='store_true',
+                        help="Мир меняет только поток симуляции, сетевые потоки передают ему команды")
+    parser.add_argument('--zombie-backend', choices=ZOMBIE_BACKENDS, default='objects',
+                        help="numpy - зомби в массивах NumPy с векторным тиком (нужен установленный numpy)")
+
+def server_options(args):
+    """Аргументы GameServer из параметров add_server_arguments."""
+    return dict(tick_rate=args.tick_rate, interest_radius=args.interest_radius,
+                interest_hysteresis=args.interest_hysteresis, udp=args.udp,
+                outbound_queue=args.outbound_queue, slow_client_policy=args.slow_client_policy,
+                disconnect_after=args.disconnect_after, map_seed=args.map_seed,
+                single_writer=args.single_writer, zombie_backend=args.zombie_backend)
 
 if __name__ == "__main__":
-    server = GameServer(port=21491)  # Используем порт 21491
-    server.run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Сервер 3DShooterOnline")
+    parser.add_argument('--port', type=int, default=21491)  # Используем порт 21491
+    parser.add_argument('--mode', choices=['threaded', 'asyncio'], default='threaded',
+                        help="threaded - поток на клиента, asyncio - все клиенты в одном event loop")
+    add_server_arguments(parser)
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Порт HTTP-эндпоинта /metrics в формате Prometheus (только localhost)")
+    parser.add_argument('--no-external-ip', action='store_true',
+                        help="Не запрашивать внешний IP (для хостов без выхода в интернет)")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    setup_logging(args.log_level, args.trace)
 
+    options = dict(server_options(args), port=args.port, metrics_port=args.metrics_port,
+                   external_ip=not args.no_external_ip)
+    if args.mode == 'asyncio':
+        from async_server import AsyncGameServer
+        server = AsyncGameServer(**options)
+    else:
+        server = GameServer(**options)
+    server.run()
@@ -0,0 +1,163 @@
+import threading
+from collections import deque
+from protocol import SECTIONS, EncodedMessage, get_section, set_section
+
+SNAPSHOT_HISTORY = 64  # Сколько последних тиков хранится как возможные базовые снимки
+
+def make_delta(seq, baseline_seq, base, current):
+    """Разница между снимками: новые и измененные записи плюс списки удаленных ID."""
+    delta = {'seq': seq, 'baseline': baseline_seq}
+    removed = {}
+    for path in SECTIONS:
+        old = get_section(base, path)
+        new = get_section(current, path)
+        set_section(delta, path, {eid: record for eid, record in new.items() if old.get(eid) != record})
+        set_section(removed, path, [eid for eid in old if eid not in new])
+    delta['removed'] = removed
+    return delta
+
+def full_snapshot(seq, state):
+    snapshot = {'seq': seq, 'baseline': None}
+    removed = {}
+    for path in SECTIONS:
+        set_section(snapshot, path, get_section(state, path))
+        set_section(removed, path, [])
+    snapshot['removed'] = removed
+    return snapshot
+
+def apply_delta(state, delta):
+    """Применяет дельту к состоянию клиента и возвращает новое состояние.
+
+    Исходный словарь не меняется, поэтому его можно читать из другого потока.
+    Полный снимок (baseline = None) просто заменяет состояние. Дельта от
+    другого базового снимка не применяется - клиент продолжит подтверждать
+    свой номер, и сервер пришлет разницу уже от него.
+    """
+    if delta.get('baseline') is None:
+        state = {}
+    elif state is None or state.get('seq') != delta['baseline']:
+        return state
+    result = {'seq': delta['seq']}
+    for path in SECTIONS:
+        try:
+            section = dict(get_section(state, path))
+        except KeyError:
+            section = {}
+        section.update(get_section(delta, path))
+        for eid in get_section(delta['removed'], path):
+            section.pop(eid, None)
+        set_section(result, path, section)
+    return result
+
+class ReceivedSnapshots:
+    """Снимки, собранные клиентом, по номерам.
+
+    Пока подтверждение идет до сервера, тот присылает несколько дельт от
+    одного и того же базового снимка, поэтому каждая дельта применяется
+    к своему базовому снимку, а не к последнему состоянию.
+    """
+
+    def __init__(self, size=SNAPSHOT_HISTORY):
+        self.states = {}
+        self.order = deque()
+        self.size = size
+        self.latest = None
+
+    def apply(self, delta):
+        """Возвращает самое свежее состояние после применения дельты."""
+        if self.latest is not None and delta['seq'] <= self.latest['seq']:
+            return self.latest  # Опоздавший снимок
+        if delta.get('baseline') is None:
+            base = None
+        else:
+            base = self.states.get(delta['baseline'])
+            if base is None:
+                return self.latest  # Базовый снимок уже забыт - ждем дельту от подтвержденного
+        state = apply_delta(base, delta)
+        self.states[state['seq']] = state
+        self.order.append(state['seq'])
+        while len(self.order) > self.size:
+            del self.states[self.order.popleft()]
+        self.latest = state
+        return state
+
+class SnapshotHistory:
+    """Кольцо последних снимков мира с порядковыми номерами.
+
+    Клиент подтверждает номер последнего примененного снимка, и ему
+    отправляется только разница с ним. Если подтвержденный снимок уже
+    вытеснен из кольца (или клиент ничего не подтверждал), уходит полный снимок.
+    """
+
+    def __init__(self, size=SNAPSHOT_HISTORY):
+        self.snapshots = deque(maxlen=size)  # (seq, state)
+        self.next_seq = 0
+        self.lock = threading.Lock()
+
+        # Закодированные кадры последнего снимка: (baseline, protocol) -> EncodedMessage
+        self.encode_lock = threading.Lock()
+        self.encoded = {}
+        self.encoded_seq = None
+        self.frames_encoded = 0
+        self.frames_shared = 0
+
+    def record(self, state):
+        # state после записи не изменяется
+        with self.lock:
+            self.snapshots.append((self.next_seq, state))
+            self.next_seq += 1
+
+    def latest(self):
+        with self.lock:
+            if not self.snapshots:
+                return None, None
+            return self.snapshots[-1]
+
+    def get(self, seq):
+        # Вызывается под self.lock
+        if seq is None or not self.snapshots:
+            return None
+        index = seq - self.snapshots[0][0]
+        if 0 <= index < len(self.snapshots):
+            return self.snapshots[index][1]
+        return None
+
+    def delta_since(self, baseline_seq):
+        with self.lock:
+            if not self.snapshots:
+                return None
+            seq, state = self.snapshots[-1]
+            base = self.get(baseline_seq)
+        if base is None:
+            return full_snapshot(seq, state)
+        return make_delta(seq, baseline_seq, base, state)
+
+    def encoded_since(self, baseline_seq, protocol):
+        """То же, что delta_since, но уже закодированное и общее для всех клиентов.
+
+        Кадр для пары (базовый снимок, формат) кодируется один раз за тик;
+        клиенты с тем же подтвержденным снимком получают тот же объект.
+        """
+        with self.encode_lock:
+            with self.lock:
+                if not self.snapshots:
+                    return None
+                seq, state = self.snapshots[-1]
+                base = self.get(baseline_seq)
+            if seq != self.encoded_seq:
+                self.encoded = {}
+                self.encoded_seq = seq
+
+            key = (baseline_seq if base is not None else None, protocol)
+            message = self.encoded.get(key)
+            if message is not None:
+                self.frames_shared += 1
+                return message
+
+            if base is None:
+                message = EncodedMessage(full_snapshot(seq, state), protocol)
+            else:
+                message = EncodedMessage(make_delta(seq, baseline_seq, base, state), protocol)
+            self.encoded[key] = message
+            self.frames_encoded += 1
+            return message
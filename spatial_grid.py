@@ -0,0 +1,201 @@
+import math
+
+CELL_SIZE = 8  # Сторона ячейки; больше радиусов подбора (5), слияния (3) и урона по доскам (2)
+# Соседние ячейки, с которыми ячейка сравнивается при поиске пар: каждая пара соседей встречается один раз
+HALF_NEIGHBOURS = ((1, -1), (1, 0), (1, 1), (0, 1))
+
+class SpatialGrid:
+    """Равномерная сетка на плоскости XZ для поиска соседей без полного перебора.
+
+    Хранит объекты с атрибутами x и z по ключу (id сущности). Владелец сетки
+    обновляет ее сам при вставке, перемещении и удалении; move() почти ничего
+    не стоит, если объект остался в своей ячейке. Запросы проверяют точное
+    расстояние по текущим координатам объектов.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cz) -> {ключ: объект}
+        self.keys = {}  # ключ -> ячейка, в которой он сейчас лежит
+
+    @classmethod
+    def of(cls, items, cell_size=CELL_SIZE):
+        """Сетка по словарю ключ -> объект, для вызовов без поддерживаемой сетки."""
+        grid = cls(cell_size)
+        for key, obj in items.items():
+            grid.insert(key, obj)
+        return grid
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def cell_of(self, x, z):
+        return (math.floor(x / self.cell_size), math.floor(z / self.cell_size))
+
+    def insert(self, key, obj):
+        if key in self.keys:
+            self.remove(key)
+        cell = self.cell_of(obj.x, obj.z)
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = {}
+        bucket[key] = obj
+        self.keys[key] = cell
+
+    def move(self, key, obj):
+        """Переносит объект в ячейку по его новым координатам."""
+        old_cell = self.keys.get(key)
+        cell = self.cell_of(obj.x, obj.z)
+        if cell == old_cell:
+            return
+        if old_cell is not None:
+            self._discard(old_cell, key)
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = {}
+        bucket[key] = obj
+        self.keys[key] = cell
+
+    def remove(self, key):
+        cell = self.keys.pop(key, None)
+        if cell is not None:
+            self._discard(cell, key)
+
+    def clear(self):
+        self.cells.clear()
+        self.keys.clear()
+
+    def _discard(self, cell, key):
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def query(self, x, z, radius):
+        """Пары (ключ, объект) не дальше radius от точки, в порядке ячеек.
+
+        Порядок ячеек - не порядок id: менеджеры, у которых важно, кто первым
+        подберет предмет или ударит доску, сортируют результат по ключу, как
+        при прежнем переборе словаря.
+        """
+        cell_size = self.cell_size
+        min_cx = math.floor((x - radius) / cell_size)
+        max_cx = math.floor((x + radius) / cell_size)
+        min_cz = math.floor((z - radius) / cell_size)
+        max_cz = math.floor((z + radius) / cell_size)
+        radius_sq = radius * radius
+        cells = self.cells
+        found = []
+        for cx in range(min_cx, max_cx + 1):
+            for cz in range(min_cz, max_cz + 1):
+                bucket = cells.get((cx, cz))
+                if bucket is None:
+                    continue
+                for key, obj in bucket.items():
+                    dx = obj.x - x
+                    dz = obj.z - z
+                    if dx * dx + dz * dz <= radius_sq:
+                        found.append((key, obj))
+        return found
+
+    def pairs(self, radius):
+        """Все пары (ключ, объект, ключ, объект) ближе radius друг к другу, каждая по одному разу.
+
+        radius не больше стороны ячейки, поэтому объекту хватает своей ячейки
+        и половины соседних (HALF_NEIGHBOURS): вторая половина пар найдется
+        из соседних ячеек. Один обход сетки вместо запроса на каждый объект.
+        """
+        if radius > self.cell_size:
+            raise ValueError(f"Радиус {radius} больше ячейки сетки ({self.cell_size})")
+        radius_sq = radius * radius
+        cells = self.cells
+        found = []
+        for (cx, cz), bucket in cells.items():
+            items = list(bucket.items())
+            for index, (key1, obj1) in enumerate(items):
+                for key2, obj2 in items[index + 1:]:
+                    dx = obj1.x - obj2.x
+                    dz = obj1.z - obj2.z
+                    if dx * dx + dz * dz < radius_sq:
+                        found.append((key1, obj1, key2, obj2))
+            for ox, oz in HALF_NEIGHBOURS:
+                other = cells.get((cx + ox, cz + oz))
+                if other is None:
+                    continue
+                for key1, obj1 in items:
+                    for key2, obj2 in other.items():
+                        dx = obj1.x - obj2.x
+                        dz = obj1.z - obj2.z
+                        if dx * dx + dz * dz < radius_sq:
+                            found.append((key1, obj1, key2, obj2))
+        return found
+
+    def nearest(self, x, z, predicate=None):
+        """Ближайший объект (ключ, объект, расстояние), подходящий под predicate, или None.
+
+        Обходит кольца ячеек вокруг точки, пока следующее кольцо не может быть
+        ближе найденного. Если объектов меньше, чем уже осмотрено ячеек (сетка
+        разреженная), дешевле перебрать их все.
+        """
+        if not self.keys:
+            return None
+        cell_size = self.cell_size
+        cx, cz = self.cell_of(x, z)
+        # От точки до границы ее ячейки: кольцо ring + 1 не ближе ring * cell_size + edge
+        fx = x - cx * cell_size
+        fz = z - cz * cell_size
+        edge = min(fx, cell_size - fx, fz, cell_size - fz)
+        cells = self.cells
+        best = None
+        best_sq = float('inf')
+        scanned = 0
+        ring = 0
+        while True:
+            for ox, oz in _ring_offsets(ring):
+                bucket = cells.get((cx + ox, cz + oz))
+                if bucket is None:
+                    continue
+                for key, obj in bucket.items():
+                    dx = obj.x - x
+                    dz = obj.z - z
+                    distance_sq = dx * dx + dz * dz
+                    if distance_sq < best_sq and (predicate is None or predicate(obj)):
+                        best_sq = distance_sq
+                        best = (key, obj)
+            limit = ring * cell_size + edge
+            if best is not None and best_sq <= limit * limit:
+                break
+            scanned += 8 * ring if ring else 1
+            if scanned >= len(self.keys):
+                return self._nearest_scan(x, z, predicate)
+            ring += 1
+        return best[0], best[1], math.sqrt(best_sq)
+
+    def _nearest_scan(self, x, z, predicate):
+        best = None
+        best_sq = float('inf')
+        for bucket in self.cells.values():
+            for key, obj in bucket.items():
+                dx = obj.x - x
+                dz = obj.z - z
+                distance_sq = dx * dx + dz * dz
+                if distance_sq < best_sq and (predicate is None or predicate(obj)):
+                    best_sq = distance_sq
+                    best = (key, obj)
+        if best is None:
+            return None
+        return best[0], best[1], math.sqrt(best_sq)
+
+_rings = [((0, 0),)]  # Смещения ячеек колец, считаются один раз
+
+def _ring_offsets(ring):
+    """Смещения ячеек на чебышевском расстоянии ring от центральной."""
+    while len(_rings) <= ring:
+        r = len(_rings)
+        offsets = [(dx, dz) for dx in range(-r, r + 1) for dz in (-r, r)]
+        offsets += [(dx, dz) for dz in range(-r + 1, r) for dx in (-r, r)]
+        _rings.append(tuple(offsets))
+    return _rings[ring]
@@ -0,0 +1,56 @@
+import socket
+import threading
+import time
+import pytest
+from framing import FrameReader
+from protocol import encode_message
+
+pytestmark = pytest.mark.parametrize('server', [{'mode': 'asyncio'}], ids=['asyncio'], indirect=True,
+                                     scope='module')
+
+def connect(port):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    reader = FrameReader(sock)
+    assert 'id' in reader.receive_message()
+    return sock, reader
+
+def test_world_lock_does_not_block_event_loop(server):
+    first, _ = connect(server.port)
+    second, second_reader = connect(server.port)
+    try:
+        # Тик (здесь - тест) держит блокировку мира, а первый клиент шлет событие, которому она нужна
+        with server.zombies_lock:
+            first.sendall(encode_message({'type': 'hit', 'target_id': 0, 'damage': 1}))
+            time.sleep(0.2)
+            # Второй клиент в это время обслуживается тем же event loop
+            started = time.perf_counter()
+            second.sendall(encode_message({'type': 'hello', 'stream': False}))
+            reply = second_reader.receive_message()
+            waited = time.perf_counter() - started
+        assert reply['type'] == 'hello'
+        assert waited < 0.5
+    finally:
+        first.close()
+        second.close()
+
+def test_only_world_messages_leave_the_event_loop(server, monkeypatch):
+    threads = {}
+    handle_message = server.handle_message
+    def recording(player_id, player_data):
+        threads[player_data.get('type', 'position')] = threading.current_thread().name
+        return handle_message(player_id, player_data)
+    monkeypatch.setattr(server, 'handle_message', recording)
+
+    sock, reader = connect(server.port)
+    try:
+        sock.sendall(encode_message({'type': 'hello', 'stream': False}))
+        assert reader.receive_message()['type'] == 'hello'
+        sock.sendall(encode_message({'x': 1.0, 'y': 0.0, 'z': 1.0}))
+        assert 'seq' in reader.receive_message()
+        sock.sendall(encode_message({'type': 'hit', 'target_id': 0, 'damage': 1}))
+        time.sleep(0.2)
+    finally:
+        sock.close()
+    assert threads['hit'].startswith('world')
+    assert not threads['hello'].startswith('world')
+    assert threads['position'] == threads['hello']
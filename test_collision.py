@@ -0,0 +1,39 @@
+import math
+import random
+from collision import CollisionWorld, MAX_MARGIN, WALL_TEXTURES
+from map_generator import generate_map
+
+def brute_point_blocked(walls, x, z, margin):
+    # Прямая проверка всех стен без широкой фазы
+    for wall in walls:
+        angle = math.radians(wall['rotation_y'])
+        cos, sin = math.cos(angle), math.sin(angle)
+        dx, dz = x - wall['x'], z - wall['z']
+        if (abs(dx * cos + dz * sin) < wall['scale_x'] / 2 + margin and
+                abs(dz * cos - dx * sin) < wall['scale_z'] / 2 + margin):
+            return True
+    return False
+
+def test_point_blocked_matches_brute_force_up_to_max_margin():
+    rng = random.Random(1)
+    for seed in range(5):
+        map_data = generate_map(40, seed)
+        walls = [obj for obj in map_data if obj.get('texture') in WALL_TEXTURES]
+        world = CollisionWorld(map_data)
+        # Точки у самих стен, где и расходилась широкая фаза с повернутыми стенами
+        for _ in range(4000):
+            wall = rng.choice(walls)
+            x = wall['x'] + rng.uniform(-wall['scale_x'], wall['scale_x'])
+            z = wall['z'] + rng.uniform(-wall['scale_x'], wall['scale_x'])
+            for margin in (0.0, 1.0, MAX_MARGIN):
+                assert world.point_blocked(x, z, margin) == brute_point_blocked(walls, x, z, margin), \
+                    (seed, x, z, margin)
+
+def test_rotated_wall_corner_at_max_margin():
+    # Стена под 45 градусов: угол расширенного прямоугольника дальше рамки без учета поворота
+    wall = {'x': 4.0, 'y': 0, 'z': 4.0, 'scale_x': 2.0, 'scale_y': 4, 'scale_z': 2.0,
+            'rotation_y': 45, 'texture': 'brick'}
+    world = CollisionWorld([wall])
+    reach = math.sqrt(2) * (1.0 + MAX_MARGIN) - 0.01
+    assert world.point_blocked(4.0 + reach, 4.0, MAX_MARGIN)
+    assert not world.point_blocked(4.0 + reach + 0.02, 4.0, MAX_MARGIN)
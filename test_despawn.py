@@ -0,0 +1,38 @@
+import socket
+import time
+from framing import FrameReader
+from protocol import encode_message
+from snapshot import ReceivedSnapshots
+from zombie import Zombie
+
+def test_merged_zombies_are_sent_as_despawn_events(server):
+    sock = socket.create_connection(('127.0.0.1', server.port), timeout=5)
+    reader = FrameReader(sock)
+    try:
+        player_id = reader.receive_message()['id']
+        sock.sendall(encode_message({'type': 'hello', 'stream': True}))
+        assert reader.receive_message()['type'] == 'hello'
+        server.players[player_id].health = 10 ** 9  # Без живого игрока тик не симулирует мир
+        with server.zombies_lock:
+            # Два зомби вплотную сливаются в ближайшем тике (spawn_zombie не ставит их друг на друга)
+            manager = server.zombie_manager
+            absorber, absorbed = manager.next_zombie_id, manager.next_zombie_id + 1
+            manager.insert_zombie(absorber, Zombie(40.0, 0, 40.0))
+            manager.insert_zombie(absorbed, Zombie(41.0, 0, 40.0))
+            manager.next_zombie_id += 2
+        despawn = None
+        state = ReceivedSnapshots()
+        deadline = time.monotonic() + 3
+        while time.monotonic() < deadline:
+            message = reader.receive_message()
+            if message.get('type') == 'despawn':
+                despawn = message
+            elif 'seq' in message:
+                snapshot = state.apply(message)
+                if despawn is not None and snapshot['seq'] >= despawn['snapshot']:
+                    break
+        assert [str(absorbed), str(absorber)] in despawn['merged']
+        assert str(absorbed) not in snapshot['zombies']
+        assert str(absorber) in snapshot['zombies']
+    finally:
+        sock.close()
@@ -0,0 +1,60 @@
+import random
+from interest import InterestGrid, InterestView
+from protocol import SECTIONS, PROTOCOL_BINARY, PROTOCOL_JSON, decode_payload, get_section
+from sample_states import moving_states
+from snapshot import ReceivedSnapshots
+
+RADIUS = 30
+
+def test_client_state_follows_its_view_and_keeps_everything_in_radius():
+    grid = InterestGrid(RADIUS)
+    rng = random.Random(1)
+    clients = [{'view': InterestView(grid), 'received': ReceivedSnapshots(), 'ack': None,
+                'x': rng.uniform(-40, 40), 'z': rng.uniform(-40, 40)} for _ in range(6)]
+    for seq, state in moving_states(60):
+        for client in clients:
+            client['x'] += rng.uniform(-3, 3)
+            client['z'] += rng.uniform(-3, 3)
+            message = client['view'].delta_since(client['ack'], seq, state, client['x'], client['z'],
+                                                 PROTOCOL_JSON)
+            if rng.random() < 0.2:
+                continue  # Потерянный снимок: клиент продолжает подтверждать старый
+            received = client['received'].apply(decode_payload(message.payload))
+            client['ack'] = received['seq']
+            assert received['seq'] == seq
+            for path in SECTIONS:
+                section = get_section(received, path)
+                for eid, record in get_section(state, path).items():
+                    dx, dz = record['x'] - client['x'], record['z'] - client['z']
+                    if dx * dx + dz * dz <= RADIUS * RADIUS:
+                        assert section.get(eid) == record, (path, eid)
+                expected = get_section(grid.views[seq][client['view'].cell][0], path)
+                assert section == expected
+
+def test_clients_in_one_cell_share_frames():
+    grid = InterestGrid(RADIUS)
+    views = [InterestView(grid) for _ in range(4)]
+    for seq, state in moving_states(3):
+        messages = {id(view.delta_since(seq - 1 if seq else None, seq, state, 1.0 + i, 2.0,
+                                        PROTOCOL_BINARY))
+                    for i, view in enumerate(views)}
+        assert len(messages) == 1
+    assert grid.stats()['frames_encoded'] == 3
+    assert grid.stats()['frames_shared'] == 9
+
+def test_cell_changes_only_past_hysteresis():
+    grid = InterestGrid(RADIUS, hysteresis=2, cell_size=8)
+    view = InterestView(grid)
+    assert view.cell_for(7.5, 4.0) == (0, 0)
+    assert view.cell_for(9.5, 4.0) == (0, 0)  # На краю соседней ячейки остаемся в своей
+    assert view.cell_for(10.5, 4.0) == (1, 0)
+    assert view.cell_for(6.5, 4.0) == (1, 0)
+
+def test_non_finite_position_gets_a_view():
+    grid = InterestGrid(RADIUS)
+    view = InterestView(grid)
+    for seq, state in moving_states(3, zombies=20):
+        x = (float('inf'), float('nan'), float('-inf'))[seq]
+        message = view.delta_since(seq - 1 if seq else None, seq, state, x, 0.0, PROTOCOL_JSON)
+        assert decode_payload(message.payload)['seq'] == seq
+    assert view.cell == (0, 0)
@@ -0,0 +1,47 @@
+import socket
+import time
+import pytest
+from framing import FrameReader
+from map_payload import MapCache, local_map, download_map
+from protocol import encode_message, PROTOCOL_BINARY, BINARY_VERSION
+
+pytestmark = pytest.mark.parametrize('server', [{'mode': 'threaded'}, {'mode': 'asyncio'}],
+                                     ids=['threaded', 'asyncio'], indirect=True, scope='module')
+
+def join(server, cache, stream=True):
+    """Вход как у bot.py: hello с подпиской, карта по хэшу. Возвращает (карту, читатель, сокет)."""
+    sock = socket.create_connection(('127.0.0.1', server.server_socket.getsockname()[1]), timeout=10)
+    reader = FrameReader(sock)
+    initial = reader.receive_message()
+    # Клиент с другой версией генератора не построит карту по seed и должен ее загрузить
+    del initial['map_info']['generator']
+    map_data = local_map(initial, cache)
+    sock.sendall(encode_message({'type': 'hello', 'stream': stream, 'get_map': map_data is None,
+                                 'protocol': PROTOCOL_BINARY, 'version': BINARY_VERSION}))
+    reply = reader.receive_message()
+    assert reply['type'] == 'hello'
+    # За это время тик успевает разослать снимки: карта все равно должна прийти раньше них
+    time.sleep(0.2)
+    if map_data is None:
+        map_data = download_map(initial['map_info'], lambda data: sock.sendall(encode_message(data)),
+                                reader.receive_message, cache, requested=reply['map'])
+    return map_data, reader, sock
+
+def test_streaming_client_with_empty_cache_gets_map_before_snapshots(server, tmp_path):
+    for attempt in range(5):
+        cache = MapCache(str(tmp_path / str(attempt)))
+        map_data, reader, sock = join(server, cache)
+        try:
+            assert map_data == server.map_data
+            assert 'seq' in reader.receive_message()  # Дальше идут снимки
+        finally:
+            sock.close()
+
+def test_cached_map_is_not_downloaded_again(server, tmp_path):
+    cache = MapCache(str(tmp_path))
+    join(server, cache)[2].close()
+    downloads = server.map_payload.downloads
+    map_data, _, sock = join(server, cache)
+    sock.close()
+    assert map_data == server.map_data
+    assert server.map_payload.downloads == downloads
@@ -0,0 +1,64 @@
+from collision import CollisionWorld, MAX_MARGIN, WALL_TEXTURES
+from map_generator import generate_map
+from navigation import NavigationGrid, FlowField, NAV_CELL
+from test_collision import brute_point_blocked
+from zombie import Zombie
+
+MAP_SIZE = 40
+
+def make_grid(seed):
+    map_data = generate_map(MAP_SIZE, seed)
+    walls = [obj for obj in map_data if obj.get('texture') in WALL_TEXTURES]
+    return NavigationGrid(CollisionWorld(map_data), MAP_SIZE * 2, Zombie.WALL_MARGIN), walls
+
+def test_raster_matches_brute_force():
+    # Растеризация с наибольшим запасом не пропускает углы повернутых стен
+    for seed in range(5):
+        grid, walls = make_grid(seed)
+        margin = min(grid.margin + NAV_CELL / 2, MAX_MARGIN)
+        for row in range(grid.columns):
+            for column in range(grid.columns):
+                cell = (row + 1) * grid.width + column + 1
+                x, z = grid.center(cell)
+                assert bool(grid.blocked[cell]) == brute_point_blocked(walls, x, z, margin), (seed, x, z)
+
+def test_step_by_step_build_matches_full_rebuild():
+    grid, _ = make_grid(1)
+    points = [(-20.0, -20.0), (25.0, 10.0)]
+    boxes = [(0.0, 0.0, 1.0, 0.0, 3.0, 1.0)]
+    full = FlowField(grid)
+    full.update(points, boxes)
+    full.rebuild()
+
+    stepped = FlowField(grid, build_step=50)
+    steps = 1
+    while not stepped.update(points, boxes):
+        assert stepped.distance is None  # До конца первого построения поля нет
+        steps += 1
+    assert steps > 10
+    assert stepped.distance == full.distance
+    assert stepped.direction == full.direction
+
+def test_old_field_is_kept_until_new_one_is_built():
+    grid, _ = make_grid(1)
+    flow = FlowField(grid, rebuild_interval=0.0, build_step=100)
+    while not flow.update([(-20.0, -20.0)]):
+        pass
+    version, distance = flow.version, flow.distance
+    assert not flow.update([(25.0, 10.0)], dt=0.1)
+    assert (flow.version, flow.distance) == (version, distance)
+    while not flow.update([(25.0, 10.0)], dt=0.1):
+        pass
+    assert flow.version == version + 1
+    assert flow.distance[grid.index(25.0, 10.0)] == 0
+
+def test_sources_outside_map_or_not_finite_are_skipped():
+    grid, _ = make_grid(1)
+    flow = FlowField(grid)
+    points = [(float('inf'), 0.0), (float('nan'), 0.0), (0.0, float('-inf')), (1e9, 0.0), (-20.0, -20.0)]
+    assert flow.source_cells(points) == [grid.index(-20.0, -20.0)]
+    while not flow.update(points):
+        pass
+    assert flow.distance[grid.index(-20.0, -20.0)] == 0
+    assert flow.direction_at(float('nan'), 0.0) is None
+    assert grid.cells_in_box(float('inf'), 0.0, 1.0, 0.0, 3.0, 1.0) == []
@@ -0,0 +1,82 @@
+import socket
+import time
+from framing import FrameReader
+from protocol import encode_message
+from server import MAP_HALF, TICK_RATE
+from snapshot import ReceivedSnapshots
+
+def join(server):
+    """Игрок с подпиской на снимки в формате JSON."""
+    sock = socket.create_connection(('127.0.0.1', server.port), timeout=5)
+    reader = FrameReader(sock)
+    player_id = reader.receive_message()['id']
+    sock.sendall(encode_message({'type': 'hello', 'stream': True}))
+    assert reader.receive_message()['type'] == 'hello'
+    return player_id, sock, reader
+
+def snapshots_during(reader, seconds):
+    count = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        assert 'seq' in reader.receive_message()
+        count += 1
+    return count
+
+def test_non_finite_position_does_not_stop_snapshots(server):
+    _, bad, _ = join(server)
+    _, good, good_reader = join(server)
+    try:
+        for value in (float('inf'), float('-inf'), float('nan')):
+            # По сообщению на тик: иначе следующий ввод перезапишет предыдущий до тика
+            for message in ({'x': value, 'y': 0, 'z': 0},
+                            {'type': 'player_state', 'position': {'x': value, 'y': 0, 'z': value}}):
+                bad.sendall(encode_message(message))
+                time.sleep(3 / TICK_RATE)
+        # Тик продолжается: второй клиент получает снимки с прежней частотой
+        assert snapshots_during(good_reader, 1.0) >= TICK_RATE // 2
+    finally:
+        bad.close()
+        good.close()
+
+def test_position_is_clamped_to_map(server):
+    player_id, sock, reader = join(server)
+    try:
+        server.players[player_id].health = 10 ** 9  # Позиции мертвого игрока не применяются
+        sock.sendall(encode_message({'x': 1e9, 'y': 0, 'z': -1e9}))
+        deadline = time.monotonic() + 2
+        while server.players[player_id].x != MAP_HALF and time.monotonic() < deadline:
+            reader.receive_message()
+        assert (server.players[player_id].x, server.players[player_id].z) == (MAP_HALF, -MAP_HALF)
+    finally:
+        sock.close()
+
+def test_plank_with_non_finite_position_is_refused(server):
+    player_id, sock, reader = join(server)
+    try:
+        server.players[player_id].planks_count = 1
+        sock.sendall(encode_message({'type': 'place_plank', 'x': float('inf'), 'y': 0, 'z': 0,
+                                     'rotation': 0, 'is_wall': True}))
+        reply = reader.receive_message()
+        while 'plank_placed' not in reply:
+            reply = reader.receive_message()
+        assert reply['plank_placed'] is False
+        assert server.players[player_id].planks_count == 1
+        assert snapshots_during(reader, 0.5) >= TICK_RATE // 4
+    finally:
+        sock.close()
+
+def test_rotation_and_animation_reach_other_players(server):
+    player_id, sock, _ = join(server)
+    _, other, other_reader = join(server)
+    try:
+        sock.sendall(encode_message({'type': 'player_state', 'position': {'x': 3.0, 'y': 0.0, 'z': 4.0},
+                                     'rotation': 90.0, 'animation': 'run'}))
+        state = ReceivedSnapshots()
+        deadline = time.monotonic() + 2
+        record = {}
+        while record.get('animation') != 'run' and time.monotonic() < deadline:
+            record = state.apply(other_reader.receive_message())['players'].get(str(player_id), {})
+        assert (record['rotation'], record['animation']) == (90.0, 'run')
+    finally:
+        sock.close()
+        other.close()
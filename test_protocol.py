@@ -0,0 +1,21 @@
+import math
+import random
+from protocol import PROTOCOL_BINARY, PROTOCOL_JSON, SECTIONS, decode_payload, encode_payload, get_section
+from sample_states import make_state
+
+def test_state_round_trip_keeps_player_rotation_and_animation():
+    random.seed(3)
+    state = make_state(20, players=8)
+    for protocol in (PROTOCOL_JSON, PROTOCOL_BINARY):
+        decoded = decode_payload(encode_payload(state, protocol))
+        for path in SECTIONS:
+            expected = get_section(state, path)
+            section = get_section(decoded, path)
+            assert section.keys() == expected.keys()
+            for eid, record in expected.items():
+                for field, value in record.items():
+                    if isinstance(value, float):
+                        # В бинарном формате числа - float32
+                        assert math.isclose(section[eid][field], value, rel_tol=1e-6), (protocol, path, field)
+                    else:
+                        assert section[eid][field] == value, (protocol, path, field)
@@ -0,0 +1,131 @@
+import socket
+import time
+import pytest
+from bench_transport import UdpRelay
+from framing import FrameReader
+from protocol import encode_message, PROTOCOL_BINARY, BINARY_VERSION
+from snapshot import ReceivedSnapshots
+from udp_channel import pack_datagram, unpack_datagram
+
+pytestmark = pytest.mark.parametrize('server', [{'udp': True}], ids=['udp'], indirect=True,
+                                     scope='module')
+
+class Client:
+    """Игрок по TCP (подключение, hello с подпиской) с позициями и снимками по UDP."""
+
+    def __init__(self, server, udp_port=None):
+        self.sock = socket.create_connection(('127.0.0.1', server.server_socket.getsockname()[1]),
+                                             timeout=10)
+        self.reader = FrameReader(self.sock)
+        initial = self.reader.receive_message()
+        self.player_id = initial['id']
+        self.token = initial['udp']['token']
+        # Карта клиенту в тесте не нужна: get_map в hello не заказывается
+        self.sock.sendall(encode_message({'type': 'hello', 'stream': True,
+                                          'protocol': PROTOCOL_BINARY, 'version': BINARY_VERSION}))
+        self.protocol = self.reader.receive_message()['protocol']
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.connect(('127.0.0.1', udp_port or initial['udp']['port']))
+        self.udp.settimeout(0.05)
+        self.out_seq = 0
+
+    def send(self, data, seq=None):
+        if seq is None:
+            seq, self.out_seq = self.out_seq, self.out_seq + 1
+        self.udp.send(pack_datagram(self.token, seq, data, self.protocol))
+
+    def close(self):
+        self.sock.close()
+        self.udp.close()
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def session_of(server, client):
+    return server.udp_channel.sessions[client.token]
+
+def test_only_positions_are_accepted_over_udp(server):
+    client = Client(server)
+    try:
+        rejected = server.udp_channel.rejected
+        planks = len(server.plank_manager.placed_planks)
+        for message in ({'type': 'hit', 'target_id': 0, 'damage': 1000},
+                        {'type': 'place_plank', 'x': 0, 'y': 0, 'z': 0, 'rotation': 0, 'is_wall': True},
+                        {'type': 'remove_plank', 'plank_id': 0},
+                        {'type': 'get_map'}):
+            client.send(message)
+        assert wait_for(lambda: server.udp_channel.rejected == rejected + 4)
+        assert session_of(server, client).addr is None  # Адрес не запомнен
+        assert session_of(server, client).last_in_seq == -1
+        assert len(server.plank_manager.placed_planks) == planks
+
+        client.send({'x': 1.0, 'y': 0.0, 'z': 2.0, 'ack': None})
+        assert wait_for(lambda: session_of(server, client).addr is not None)
+        addr = session_of(server, client).addr
+
+        # Чужой сокет с тем же token, но не позицией, адрес не переносит
+        other = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        other.sendto(pack_datagram(client.token, 100, {'type': 'hit', 'target_id': 0, 'damage': 1}),
+                     ('127.0.0.1', server.udp_channel.port))
+        assert wait_for(lambda: server.udp_channel.rejected == rejected + 5)
+        assert session_of(server, client).addr == addr
+        other.close()
+    finally:
+        client.close()
+
+def test_positions_and_snapshots_survive_packet_loss(server):
+    # 30% потерь в обе стороны через прокси: новейшая позиция все равно доходит,
+    # а снимки применяются по порядку, пропуская потерянные
+    relay = UdpRelay(('127.0.0.1', server.udp_channel.port), latency=0.005, loss=0.3)
+    client = Client(server, relay.port)
+    try:
+        # Позиции мертвого игрока не применяются, а зомби за эти секунды могут успеть
+        assert wait_for(lambda: client.player_id in server.players)
+        server.players[client.player_id].health = 10 ** 9
+        received = ReceivedSnapshots()
+        state = None
+        applied = []
+        x = 0.0
+        deadline = time.monotonic() + 1.5
+        while time.monotonic() < deadline:
+            x += 0.01
+            client.send({'x': x, 'y': 0.0, 'z': 0.0, 'ack': state['seq'] if state else None})
+            try:
+                token, _, data = unpack_datagram(client.udp.recv(65535))
+            except socket.timeout:
+                continue
+            assert token == client.token
+            new_state = received.apply(data)
+            if new_state is not None and (state is None or new_state['seq'] > state['seq']):
+                state = new_state
+                applied.append(state['seq'])
+        sent = client.out_seq
+        assert len(applied) > 10
+        assert applied == sorted(set(applied))
+        # Потери видны: сервер принял заметно меньше пакетов, чем отправлено
+        assert session_of(server, client).last_in_seq < sent - 1 or server.udp_channel.received < sent
+
+        # Новейший побеждает: повторяем последнюю позицию, пока она не дойдет
+        # (число точно представимо во float32 бинарного формата)
+        final_x = 64.5
+        def applied_final():
+            client.send({'x': final_x, 'y': 0.0, 'z': 0.0, 'ack': None})
+            return server.players[client.player_id].x == final_x
+        assert wait_for(applied_final)
+
+        # Запоздавший старый пакет позицию не откатывает (шлется мимо прокси, чтобы не потерялся)
+        stale = server.udp_channel.stale_dropped
+        direct = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        direct.sendto(pack_datagram(client.token, 0, {'x': 0.0, 'y': 0.0, 'z': 0.0, 'ack': None}),
+                      ('127.0.0.1', server.udp_channel.port))
+        direct.close()
+        assert wait_for(lambda: server.udp_channel.stale_dropped > stale)
+        time.sleep(0.1)
+        assert server.players[client.player_id].x == final_x
+    finally:
+        client.close()
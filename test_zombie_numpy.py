@@ -0,0 +1,33 @@
+import random
+import pytest
+from zombie import Zombie, create_zombie_manager
+
+pytest.importorskip('numpy')
+
+def crowd(backend, count, seed):
+    # Плотная толпа: большая часть зомби сливается, часть - цепочками через сдвинутого поглотителя
+    manager = create_zombie_manager(40, backend)
+    rng = random.Random(seed)
+    for zombie_id in range(count):
+        zombie = Zombie(rng.uniform(-15, 15), 0, rng.uniform(-15, 15))
+        if zombie_id % 7 == 0:
+            zombie.is_alive = False  # Мертвые не сливаются
+        manager.insert_zombie(zombie_id, zombie)
+    manager.next_zombie_id = count
+    return manager
+
+def test_merges_match_objects_backend():
+    objects, arrays = crowd('objects', 400, 3), crowd('numpy', 400, 3)
+    merged = objects.check_merge_zombies()
+    assert len(merged) > 100
+    assert [(int(a), int(b)) for a, b in arrays.check_merge_zombies()] == merged
+
+    expected, actual = objects.to_dict(), arrays.to_dict()
+    assert sorted(actual) == sorted(expected)
+    for zombie_id, state in expected.items():
+        for field, value in state.items():
+            assert actual[zombie_id][field] == pytest.approx(value, abs=1e-9), (zombie_id, field)
+    # После удаления поглощенных слоты по-прежнему указывают на своих зомби
+    for zombie_id in arrays.zombies:
+        assert arrays.get_zombie(zombie_id).to_dict() == actual[str(zombie_id)]
+    assert arrays.count == len(objects.zombies)
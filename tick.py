@@ -0,0 +1,94 @@
+import threading
+import time
+from game_log import get_logger
+
+log = get_logger('tick')
+
+class TickLoop:
+    """Вызывает callback(dt) с фиксированной частотой и считает статистику тиков.
+
+    Если тик не укладывается в бюджет (1 / rate секунд), это считается
+    перерасходом; отставание больше одного тика не догоняется, чтобы сервер
+    не уходил в спираль из тиков без пауз.
+    """
+    REPORT_INTERVAL = 1.0  # Не чаще одного сообщения о перерасходе в секунду
+
+    def __init__(self, rate, callback, name="tick", observer=None):
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self.callback = callback
+        self.observer = observer  # Получает длительность каждого тика (для метрик)
+        self.name = name
+        self.running = False
+        self.thread = None
+
+        self.tick_count = 0
+        self.overruns = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_report_time = 0
+        self.unreported_overruns = 0
+
+    def average_duration(self):
+        if self.tick_count == 0:
+            return 0.0
+        return self.total_duration / self.tick_count
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'ticks': self.tick_count,
+            'overruns': self.overruns,
+            'last_ms': self.last_duration * 1000,
+            'avg_ms': self.average_duration() * 1000,
+            'max_ms': self.max_duration * 1000
+        }
+
+    def record(self, duration):
+        self.tick_count += 1
+        self.last_duration = duration
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        if self.observer:
+            self.observer(duration)
+
+        if duration > self.interval:
+            self.overruns += 1
+            self.unreported_overruns += 1
+            now = time.time()
+            if now - self.last_report_time >= self.REPORT_INTERVAL:
+                log.warning("[%s] Тик %d занял %.1f мс при бюджете %.1f мс "
+                            "(перерасходов с прошлого отчета: %d)", self.name, self.tick_count,
+                            duration * 1000, self.interval * 1000, self.unreported_overruns)
+                self.last_report_time = now
+                self.unreported_overruns = 0
+
+    def run(self):
+        self.running = True
+        next_tick = time.perf_counter()
+        while self.running:
+            started = time.perf_counter()
+            try:
+                self.callback(self.interval)
+            except Exception as e:
+                log.exception("[%s] Ошибка в тике: %s", self.name, e)
+            self.record(time.perf_counter() - started)
+
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -self.interval:
+                # Сильно отстали - начинаем расписание заново
+                next_tick = time.perf_counter()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
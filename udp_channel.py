@@ -0,0 +1,140 @@
+import secrets
+import socket
+import struct
+import threading
+from protocol import encode_payload, decode_payload, PROTOCOL_JSON
+from metrics import message_type
+from game_log import get_logger
+
+UDP_HEADER = struct.Struct('<II')  # token сессии, порядковый номер пакета
+MAX_DATAGRAM = 60000  # Снимки крупнее не помещаются в одну датаграмму
+POSITION_FIELDS = ('x', 'y', 'z')
+
+log = get_logger('udp')
+
+def pack_datagram(token, seq, data, protocol=PROTOCOL_JSON):
+    return UDP_HEADER.pack(token, seq) + encode_payload(data, protocol)
+
+def unpack_datagram(packet):
+    token, seq = UDP_HEADER.unpack_from(packet, 0)
+    return token, seq, decode_payload(packet[UDP_HEADER.size:])
+
+def is_position(data):
+    """По UDP принимается только позиция: события и остальные запросы идут по надежному TCP."""
+    return (isinstance(data, dict) and 'type' not in data and 'seq' not in data and
+            all(field in data for field in POSITION_FIELDS))
+
+class UdpSession:
+    def __init__(self, player_id, token):
+        self.player_id = player_id
+        self.token = token
+        self.addr = None  # Узнаем из первого пакета клиента
+        self.last_in_seq = -1
+        self.out_seq = 0
+
+class UdpChannel:
+    """Ненадежный канал для позиций игроков и снимков мира.
+
+    Клиент получает token при подключении по TCP и шлет позиции датаграммами.
+    Действует правило "новейший побеждает": пакет с номером не больше уже
+    принятого отбрасывается, а на каждую свежую позицию сервер отвечает
+    снимком тоже по UDP. Подключение, карта и игровые события остаются на TCP:
+    пакет с чем-либо, кроме позиции, отбрасывается, даже с верным token, и
+    адрес сессии переносится только пакетом с позицией.
+    """
+
+    def __init__(self, server, port):
+        self.server = server
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('0.0.0.0', port))
+        self.port = self.sock.getsockname()[1]
+        self.sessions = {}  # token -> UdpSession
+        self.lock = threading.Lock()
+        self.thread = None
+
+        self.received = 0
+        self.stale_dropped = 0
+        self.unknown_dropped = 0
+        self.oversize_dropped = 0
+        self.rejected = 0
+
+    def register(self, player_id):
+        with self.lock:
+            token = secrets.randbits(32)
+            while token in self.sessions:
+                token = secrets.randbits(32)
+            self.sessions[token] = UdpSession(player_id, token)
+        return token
+
+    def unregister(self, token):
+        with self.lock:
+            self.sessions.pop(token, None)
+
+    def send(self, session, data, protocol):
+        with self.lock:
+            seq = session.out_seq
+            session.out_seq += 1
+        packet = pack_datagram(session.token, seq, data, protocol)
+        if len(packet) > MAX_DATAGRAM:
+            self.oversize_dropped += 1
+            return False
+        try:
+            self.sock.sendto(packet, session.addr)
+        except OSError as e:
+            log.warning("Ошибка UDP при отправке: %s", e)
+            return False
+        self.server.metrics.record_out(message_type(data), len(packet))
+        return True
+
+    def push(self, token, data, protocol):
+        """Отправляет снимок по UDP, если клиент уже сообщил свой адрес."""
+        with self.lock:
+            session = self.sessions.get(token)
+        if session is None or session.addr is None:
+            return False
+        return self.send(session, data, protocol)
+
+    def handle_packet(self, packet, addr):
+        token, seq, data = unpack_datagram(packet)
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                self.unknown_dropped += 1
+                return
+            if not is_position(data):
+                self.rejected += 1
+                return
+            if seq <= session.last_in_seq:
+                self.stale_dropped += 1
+                return
+            session.last_in_seq = seq
+            session.addr = addr
+
+        self.received += 1
+        self.server.metrics.record_in(data, len(packet))
+        response = self.server.handle_message(session.player_id, data)
+        if response is not None:
+            self.send(session, response, self.server.get_protocol(session.player_id))
+
+    def run(self):
+        while True:
+            try:
+                packet, addr = self.sock.recvfrom(65535)
+                self.handle_packet(packet, addr)
+            except Exception as e:
+                log.warning("Ошибка UDP: %s", e)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="udp")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stats(self):
+        return {
+            'sessions': len(self.sessions),
+            'received': self.received,
+            'stale_dropped': self.stale_dropped,
+            'unknown_dropped': self.unknown_dropped,
+            'oversize_dropped': self.oversize_dropped,
+            'rejected': self.rejected
+        }
@@ -1,4 +1,7 @@
 import math
+from game_log import trace, traced
+from spatial_grid import SpatialGrid
+from navigation import FlowField
 
 class Zombie:
     HEALTH = 60
@@ -9,6 +12,7 @@ class Zombie:
     BASE_SCALE = 2
     WALL_DETECTION_MARGIN = 1.0  # Уменьшаем отступ
     COLLISION_RADIUS = 0.5  # Базовый радиус коллизии зомби
+    WALL_MARGIN = WALL_DETECTION_MARGIN / 2 + COLLISION_RADIUS  # Запас от стен для центра зомби
 
     def __init__(self, x, y, z):
         self.x = x
@@ -20,6 +24,7 @@ class Zombie:
         self.scale = self.BASE_SCALE
         self.damage_multiplier = 1
         self.speed_bonus = 0
+        self.target_id = None  # id игрока, к которому идет зомби
 
     def take_damage(self, damage):
         self.health -= damage
@@ -47,32 +52,13 @@ class Zombie:
         
         return True
 
-    def check_collision(self, new_x, new_z, walls):
+    def check_collision(self, new_x, new_z, collision):
         # Используем фиксированный радиус коллизии
         zombie_radius = self.COLLISION_RADIUS
         
-        # Проверка коллизий со стенами
-        for wall in walls:
-            wall_x = wall['x']
-            wall_z = wall['z']
-            wall_scale_x = wall['scale_x'] + self.WALL_DETECTION_MARGIN
-            wall_scale_z = wall['scale_z'] + self.WALL_DETECTION_MARGIN
-            wall_rotation = wall['rotation_y']
-            
-            if wall_rotation != 0:
-                dx = new_x - wall_x
-                dz = new_z - wall_z
-                angle = math.radians(wall_rotation)
-                rotated_x = dx * math.cos(angle) + dz * math.sin(angle)
-                rotated_z = -dx * math.sin(angle) + dz * math.cos(angle)
-                
-                if abs(rotated_x) < (wall_scale_x/2 + zombie_radius) and \
-                   abs(rotated_z) < (wall_scale_z/2 + zombie_radius):
-                    return True
-            else:
-                if abs(new_x - wall_x) < (wall_scale_x/2 + zombie_radius) and \
-                   abs(new_z - wall_z) < (wall_scale_z/2 + zombie_radius):
-                    return True
+        # Проверка коллизий со стенами: collision - общий CollisionWorld карты
+        if collision.point_blocked(new_x, new_z, self.WALL_MARGIN):
+            return True
 
         # Проверка коллизий с размещенными досками
         if hasattr(self, 'manager') and self.manager.plank_manager:
@@ -81,9 +67,8 @@ class Zombie:
                     # Для вертикальных досок
                     dx = new_x - plank.x
                     dz = new_z - plank.z
-                    angle = math.radians(plank.rotation)
-                    rotated_x = dx * math.cos(angle) + dz * math.sin(angle)
-                    rotated_z = -dx * math.sin(angle) + dz * math.cos(angle)
+                    rotated_x = dx * plank.cos + dz * plank.sin
+                    rotated_z = -dx * plank.sin + dz * plank.cos
                     
                     if abs(rotated_x) < (2/2 + zombie_radius) and \
                        abs(rotated_z) < (0.5/2 + zombie_radius):
@@ -96,18 +81,15 @@ class Zombie:
         
         return False
 
-    def move_towards_nearest_player(self, players, walls):
+    def move_towards_nearest_player(self, players, collision, dt=0.016, player_grid=None, flow=None):
+        # Ближайший живой игрок ищется по сетке игроков, а не перебором
+        if player_grid is None:
+            player_grid = SpatialGrid.of(players)
+        nearest = player_grid.nearest(self.x, self.z, is_target)
         nearest_player = None
-        min_distance = float('inf')
-        
-        for player in players.values():
-            if player.is_alive and not player.is_ghost:
-                dx = self.x - player.x
-                dz = self.z - player.z
-                distance = (dx * dx + dz * dz) ** 0.5
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_player = player
+        self.target_id = None
+        if nearest is not None:
+            self.target_id, nearest_player, _ = nearest
 
         if nearest_player:
             dx = nearest_player.x - self.x
@@ -115,16 +97,22 @@ class Zombie:
             distance = (dx * dx + dz * dz) ** 0.5
             
             if distance > 0:
-                current_speed = (self.SPEED + self.speed_bonus) * 0.016
-                move_x = (dx / distance) * current_speed
-                move_z = (dz / distance) * current_speed
+                current_speed = (self.SPEED + self.speed_bonus) * dt
+                # Вдали от игрока - по полю направлений в обход стен, рядом - прямо на него
+                direction = flow.direction_at(self.x, self.z) if flow is not None else None
+                if direction is None:
+                    move_x = (dx / distance) * current_speed
+                    move_z = (dz / distance) * current_speed
+                else:
+                    move_x = direction[0] * current_speed
+                    move_z = direction[1] * current_speed
                 
                 # Пробуем сначала диагональное движение
                 new_x = self.x + move_x
                 new_z = self.z + move_z
                 
                 # Проверяем коллизии со стенами и досками
-                if not self.check_collision(new_x, new_z, walls):
+                if not self.check_collision(new_x, new_z, collision):
                     self.x = new_x
                     self.z = new_z
                     self.last_position = (new_x, new_z)
@@ -138,15 +126,15 @@ class Zombie:
                             
                             if distance_to_plank < self.DAMAGE_DISTANCE:
                                 # Атакуем стену
-                                if plank.take_damage(self.DAMAGE * self.damage_multiplier * 0.016):
+                                if plank.take_damage(self.DAMAGE * self.damage_multiplier * dt):
                                     # Если стена разрушена, добавляем её ID для удаления
                                     self.manager.plank_manager.planks_to_remove.add(plank_id)
                                 return True
 
                     # Если не получилось пройти и нет стен для атаки, пробуем двигаться по одной оси
-                    if not self.check_collision(new_x, self.z, walls):
+                    if not self.check_collision(new_x, self.z, collision):
                         self.x = new_x
-                    elif not self.check_collision(self.x, new_z, walls):
+                    elif not self.check_collision(self.x, new_z, collision):
                         self.z = new_z
 
                 # Проверяем расстояние для урона по игроку
@@ -154,7 +142,7 @@ class Zombie:
                 horizontal_distance = math.sqrt((self.x - nearest_player.x)**2 + (self.z - nearest_player.z)**2)
                 
                 if horizontal_distance < self.DAMAGE_DISTANCE * (self.scale / self.BASE_SCALE) and dy < 3:
-                    nearest_player.take_damage(self.DAMAGE * self.damage_multiplier * 0.016)
+                    nearest_player.take_damage(self.DAMAGE * self.damage_multiplier * dt)
                     return True
         return False
 
@@ -169,70 +157,160 @@ class Zombie:
             'speed': self.SPEED + self.speed_bonus
         }
 
+ZOMBIE_BACKENDS = ('objects', 'numpy')
+
+def create_zombie_manager(map_size, backend='objects'):
+    """objects - зомби как объекты Python, numpy - массивы и векторные операции (нужен NumPy)."""
+    if backend == 'numpy':
+        from zombie_numpy import NumpyZombieManager  # NumPy нужен только этому движку
+        return NumpyZombieManager(map_size)
+    if backend != 'objects':
+        raise ValueError(f"Неизвестный движок зомби: {backend}")
+    return ZombieManager(map_size)
+
+def is_target(player):
+    return player.is_alive and not player.is_ghost
+
+def plank_box(plank):
+    """Установленная доска как препятствие для центра зомби: (x, z, cos, sin, half_x, half_z)."""
+    radius = Zombie.COLLISION_RADIUS
+    if plank.is_wall:
+        return (plank.x, plank.z, plank.cos, plank.sin, 2 / 2 + radius, 0.5 / 2 + radius)
+    return (plank.x, plank.z, 1.0, 0.0, 4 / 2 + radius, 2 / 2 + radius)
+
 class ZombieManager:
     def __init__(self, map_size):
         self.zombies = {}
+        self.grid = SpatialGrid()  # Живые и мертвые зомби по ячейкам, обновляется при каждом движении
         self.map_size = map_size
         self.next_zombie_id = 0
-        self.walls = []
+        self.collision = None  # Стены карты (CollisionWorld), общие для всех менеджеров
         self.plank_manager = None
+        self.flow = None  # Поле направлений к игрокам (FlowField), если задана навигация
 
     def set_plank_manager(self, plank_manager):
         self.plank_manager = plank_manager
 
-    def set_walls(self, map_data):
-        self.walls = [obj for obj in map_data if obj.get('texture') in ['brick', 'cobblestone']]
+    def set_collision(self, collision):
+        self.collision = collision
+
+    def set_navigation(self, navigation):
+        """navigation - общая NavigationGrid карты; поле направлений у каждого менеджера свое."""
+        self.flow = FlowField(navigation) if navigation is not None else None
+
+    def update_flow(self, players, dt):
+        # Перестраивается только при смене клеток игроков или досок, не чаще REBUILD_INTERVAL
+        if self.flow is None:
+            return
+        placed = self.plank_manager.placed_planks.values() if self.plank_manager else ()
+        self.flow.update([(player.x, player.z) for player in players.values() if is_target(player)],
+                         [plank_box(plank) for plank in placed], dt)
 
     def check_merge_zombies(self):
-        merged_zombies = set()
-        for id1, zombie1 in self.zombies.items():
-            if id1 in merged_zombies:
+        """Сливает близких живых зомби и возвращает пары (поглощенный, поглотивший) в порядке слияний.
+
+        Кандидаты находятся одним обходом сетки по позициям на начало
+        проверки, расстояния сравниваются в квадрате. Затем поглощающие
+        обходятся по возрастанию id, и каждый проверяет своих кандидатов тоже
+        по возрастанию id от своей позиции после предыдущих слияний, поэтому
+        при скоплении нескольких зомби результат не зависит от порядка
+        словаря. Мертвые зомби не сливаются. Поглощенные удаляются одной
+        пачкой в конце; список пригоден для событий исчезновения.
+        """
+        neighbours = {}
+        for id1, zombie1, id2, zombie2 in self.grid.pairs(Zombie.MERGE_DISTANCE):
+            if zombie1.is_alive and zombie2.is_alive:
+                neighbours.setdefault(id1, []).append(id2)
+                neighbours.setdefault(id2, []).append(id1)
+
+        merged = []
+        absorbed = set()
+        zombies = self.zombies
+        limit_sq = Zombie.MERGE_DISTANCE * Zombie.MERGE_DISTANCE
+        for id1 in sorted(neighbours):
+            if id1 in absorbed:
                 continue
-            for id2, zombie2 in self.zombies.items():
-                if id2 in merged_zombies or id1 == id2:
+            zombie1 = zombies[id1]
+            for id2 in sorted(neighbours[id1]):
+                if id2 in absorbed:
                     continue
+                zombie2 = zombies[id2]
                 dx = zombie1.x - zombie2.x
                 dz = zombie1.z - zombie2.z
-                distance = (dx * dx + dz * dz) ** 0.5
-                if distance < Zombie.MERGE_DISTANCE:
+                if dx * dx + dz * dz < limit_sq:
                     zombie1.merge_with(zombie2)
-                    merged_zombies.add(id2)
-        
+                    self.grid.move(id1, zombie1)
+                    absorbed.add(id2)
+                    merged.append((id2, id1))
+                    trace('zombie', id1, "поглотил зомби %s, HP: %s", id2, zombie1.health)
+                    trace('zombie', id2, "поглощен зомби %s", id1)
+
         # Удаляем поглощенных зомби
-        for zombie_id in merged_zombies:
+        for zombie_id, _ in merged:
             self.remove_zombie(zombie_id)
+        return merged
 
     def spawn_zombie(self, x, y, z):
-        if not any(zombie.check_collision(x, z, self.walls) for zombie in self.zombies.values()):
+        if not any(zombie.check_collision(x, z, self.collision) for zombie in self.zombies.values()):
             zombie_id = self.next_zombie_id
-            zombie = Zombie(x, y, z)
-            zombie.manager = self
-            self.zombies[zombie_id] = zombie
+            self.insert_zombie(zombie_id, Zombie(x, y, z))
             self.next_zombie_id += 1
             return zombie_id
         return None
 
-    def update_zombies(self, players):
-        # Сначала проверяем слияния
-        self.check_merge_zombies()
+    def insert_zombie(self, zombie_id, zombie):
+        zombie.manager = self
+        self.zombies[zombie_id] = zombie
+        self.grid.insert(zombie_id, zombie)
+
+    def update_zombies(self, players, dt=0.016, player_grid=None):
+        """Тик зомби: слияния, движение живых и удаление мертвых. Возвращает слияния тика."""
+        merged = self.check_merge_zombies()
         
         # Затем обновляем оставшихся зомби
         zombies_to_remove = []
+        if player_grid is None:
+            player_grid = SpatialGrid.of(players)
+        self.update_flow(players, dt)
         for zombie_id, zombie in self.zombies.items():
             if zombie.is_alive:
-                zombie.move_towards_nearest_player(players, self.walls)
+                target_id = zombie.target_id
+                zombie.move_towards_nearest_player(players, self.collision, dt, player_grid, self.flow)
+                self.grid.move(zombie_id, zombie)
+                if traced('zombie', zombie_id):
+                    if zombie.target_id != target_id:
+                        trace('zombie', zombie_id, "выбрал цель игрока %s", zombie.target_id)
+                    trace('zombie', zombie_id, "перемещается к цели %s, позиция (%.1f, %.1f)",
+                          zombie.target_id, zombie.x, zombie.z)
             else:
                 zombies_to_remove.append(zombie_id)
         
         for zombie_id in zombies_to_remove:
             self.remove_zombie(zombie_id)
+        return merged
 
     def remove_zombie(self, zombie_id):
         if zombie_id in self.zombies:
             del self.zombies[zombie_id]
+            self.grid.remove(zombie_id)
 
     def get_zombie(self, zombie_id):
         return self.zombies.get(zombie_id)
 
+    def count_alive(self):
+        return sum(1 for zombie in self.zombies.values() if zombie.is_alive)
+
+    def snapshot(self):
+        # Поля зомби, которые попадают в снимок мира
+        return {
+            str(zid): {
+                'x': z.x,
+                'y': z.y,
+                'z': z.z,
+                'is_alive': z.is_alive,
+                'scale': z.scale
+            } for zid, z in self.zombies.items()
+        }
+
     def to_dict(self):
         return {str(zid): z.to_dict() for zid, z in self.zombies.items()}
@@ -0,0 +1,489 @@
+import numpy as np
+from zombie import Zombie, is_target, plank_box
+from game_log import trace, traced_ids
+from spatial_grid import HALF_NEIGHBOURS
+from navigation import FlowField, OFFSETS, DIRECTIONS, DIRECT_COST, UNREACHABLE
+
+INITIAL_CAPACITY = 256
+FLOW_OFFSETS = np.array(OFFSETS)
+FLOW_VECTORS = np.array(DIRECTIONS)
+# Соседние ячейки для поиска пар на слияние: своя и половина соседей, чтобы пара не встречалась дважды
+MERGE_NEIGHBOURS = ((0, 0),) + HALF_NEIGHBOURS
+
+class ZombieView(Zombie):
+    """Зомби из массивов NumpyZombieManager с интерфейсом обычного Zombie.
+
+    Поля читаются и пишутся прямо в массивы менеджера, поэтому take_damage,
+    to_dict и код, который работает с зомби по одному (попадания, урон по
+    доскам), ведут себя так же, как с объектным движком.
+    """
+    __slots__ = ('manager', 'zombie_id')
+
+    def __init__(self, manager, zombie_id):
+        self.manager = manager
+        self.zombie_id = zombie_id
+
+    def _slot(self):
+        return self.manager.slots[self.zombie_id]
+
+    def _field(name, cast):
+        def get(self):
+            return cast(getattr(self.manager, name)[self._slot()])
+
+        def set(self, value):
+            getattr(self.manager, name)[self._slot()] = value
+        return property(get, set)
+
+    x = _field('x', float)
+    z = _field('z', float)
+    health = _field('health', float)
+    is_alive = _field('alive', bool)
+    scale = _field('scale', float)
+    damage_multiplier = _field('damage_multiplier', float)
+    speed_bonus = _field('speed_bonus', float)
+    del _field
+
+    @property
+    def y(self):
+        return 0
+
+    @property
+    def target_id(self):
+        target = int(self.manager.target[self._slot()])
+        return None if target < 0 else target
+
+class ArrayQuery:
+    """Поиск зомби в радиусе одной векторной операцией (вместо SpatialGrid объектного движка)."""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def query(self, x, z, radius):
+        manager = self.manager
+        n = manager.count
+        dx = manager.x[:n] - x
+        dz = manager.z[:n] - z
+        slots = np.flatnonzero(dx * dx + dz * dz <= radius * radius)
+        return [(int(manager.ids[slot]), manager.zombies[int(manager.ids[slot])]) for slot in slots]
+
+class NumpyZombieManager:
+    """Движок зомби на NumPy: структура массивов вместо объекта на каждого зомби.
+
+    Позиции, здоровье, размер, множитель урона и бонус скорости лежат в
+    массивах, а выбор цели, движение со столкновениями и урон по игрокам
+    считаются за тик векторными операциями сразу для всех зомби. Интерфейс
+    тот же, что у ZombieManager: zombies, get_zombie, spawn_zombie,
+    update_zombies, to_dict.
+
+    Отличие от объектного движка: цели выбираются по состоянию игроков на
+    начало тика, а не после урона от предыдущих зомби в том же тике.
+    """
+
+    def __init__(self, map_size):
+        self.zombies = {}  # id -> ZombieView
+        self.slots = {}  # id -> индекс в массивах
+        self.map_size = map_size
+        self.next_zombie_id = 0
+        self.collision = None
+        self.plank_manager = None
+        self.flow = None
+        self.flow_version = None
+        self.grid = ArrayQuery(self)
+        self.count = 0
+        self._allocate(INITIAL_CAPACITY)
+
+    def _allocate(self, capacity):
+        old_count = self.count
+        fields = {
+            'ids': np.int64, 'x': np.float64, 'z': np.float64, 'health': np.float64,
+            'alive': np.bool_, 'scale': np.float64, 'damage_multiplier': np.float64,
+            'speed_bonus': np.float64, 'target': np.int64
+        }
+        for name, dtype in fields.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if old_count:
+                array[:old_count] = getattr(self, name)[:old_count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def set_plank_manager(self, plank_manager):
+        self.plank_manager = plank_manager
+
+    def set_collision(self, collision):
+        self.collision = collision
+        # Стены с запасом зомби; массивы CollisionWorld читаются без копирования
+        self.walls = (np.frombuffer(collision.x), np.frombuffer(collision.z),
+                      np.frombuffer(collision.cos), np.frombuffer(collision.sin),
+                      np.frombuffer(collision.half_x) + Zombie.WALL_MARGIN,
+                      np.frombuffer(collision.half_z) + Zombie.WALL_MARGIN)
+
+    def set_navigation(self, navigation):
+        self.flow = FlowField(navigation) if navigation is not None else None
+        self.flow_version = None
+
+    def update_flow(self, players, dt):
+        if self.flow is None:
+            return
+        placed = self.plank_manager.placed_planks.values() if self.plank_manager else ()
+        self.flow.update([(player.x, player.z) for player in players.values() if is_target(player)],
+                         [plank_box(plank) for plank in placed], dt)
+
+    def insert_zombie(self, zombie_id, zombie):
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        slot = self.count
+        self.count += 1
+        self.ids[slot] = zombie_id
+        self.x[slot] = zombie.x
+        self.z[slot] = zombie.z
+        self.health[slot] = zombie.health
+        self.alive[slot] = zombie.is_alive
+        self.scale[slot] = zombie.scale
+        self.damage_multiplier[slot] = zombie.damage_multiplier
+        self.speed_bonus[slot] = zombie.speed_bonus
+        self.target[slot] = -1
+        self.slots[zombie_id] = slot
+        self.zombies[zombie_id] = ZombieView(self, zombie_id)
+
+    def spawn_zombie(self, x, y, z):
+        # Как у ZombieManager: место проверяется, только если на карте уже есть зомби
+        if self.count and self.blocked(np.array([x]), np.array([z]))[0]:
+            return None
+        zombie_id = self.next_zombie_id
+        self.insert_zombie(zombie_id, Zombie(x, y, z))
+        self.next_zombie_id += 1
+        return zombie_id
+
+    def remove_zombie(self, zombie_id):
+        slot = self.slots.pop(zombie_id, None)
+        if slot is None:
+            return
+        del self.zombies[zombie_id]
+        # Последний зомби переезжает на место удаленного, массивы остаются плотными
+        last = self.count - 1
+        if slot != last:
+            for array in (self.ids, self.x, self.z, self.health, self.alive, self.scale,
+                          self.damage_multiplier, self.speed_bonus, self.target):
+                array[slot] = array[last]
+            self.slots[int(self.ids[slot])] = slot
+        self.count = last
+
+    def remove_slots(self, slots):
+        """Удаляет зомби из слотов slots разом: как remove_zombie, дыры занимают зомби с конца."""
+        n = self.count
+        removed = np.zeros(n, dtype=bool)
+        removed[slots] = True
+        count = n - int(np.count_nonzero(removed))
+        for zombie_id in self.ids[:n][removed].tolist():
+            del self.slots[zombie_id]
+            del self.zombies[zombie_id]
+        # Дыры ниже новой границы и уцелевшие за ней: их поровну
+        holes = np.flatnonzero(removed[:count])
+        movers = count + np.flatnonzero(~removed[count:])
+        for array in (self.ids, self.x, self.z, self.health, self.alive, self.scale,
+                      self.damage_multiplier, self.speed_bonus, self.target):
+            array[holes] = array[movers]
+        self.slots.update(zip(self.ids[holes].tolist(), holes.tolist()))
+        self.count = count
+
+    def get_zombie(self, zombie_id):
+        return self.zombies.get(zombie_id)
+
+    def count_alive(self):
+        return int(np.count_nonzero(self.alive[:self.count]))
+
+    def obstacles(self):
+        """Стены карты и установленные доски как повернутые прямоугольники с запасом зомби."""
+        placed = self.plank_manager.placed_planks.values() if self.plank_manager else ()
+        if not placed:
+            return self.walls
+        columns = np.array([plank_box(plank) for plank in placed]).T
+        return tuple(np.concatenate((wall_column, plank_column))
+                     for wall_column, plank_column in zip(self.walls, columns))
+
+    def blocked(self, x, z, obstacles=None):
+        """Для каждой точки: внутри ли она какого-либо препятствия (как Zombie.check_collision).
+
+        Точки сортируются по x, и каждое препятствие проверяет только точки в
+        полосе своей ограничивающей рамки, а не все N x W пар.
+        """
+        wall_x, wall_z, cos, sin, half_x, half_z = obstacles or self.obstacles()
+        result = np.zeros(len(x), dtype=bool)
+        if not len(x):
+            return result
+        order = np.argsort(x)
+        sorted_x = x[order]
+        extent_x = np.abs(cos) * half_x + np.abs(sin) * half_z
+        lo = np.searchsorted(sorted_x, wall_x - extent_x, 'left')
+        hi = np.searchsorted(sorted_x, wall_x + extent_x, 'right')
+        for i in np.flatnonzero(hi > lo).tolist():
+            candidates = order[lo[i]:hi[i]]
+            dx = x[candidates] - wall_x[i]
+            dz = z[candidates] - wall_z[i]
+            inside = np.abs(dx * cos[i] + dz * sin[i]) < half_x[i]
+            inside &= np.abs(dz * cos[i] - dx * sin[i]) < half_z[i]
+            result[candidates[inside]] = True
+        return result
+
+    def check_merge_zombies(self):
+        """Слияния как у ZombieManager; возвращает пары (поглощенный, поглотивший).
+
+        Близкие пары живых зомби по позициям на начало проверки находятся
+        векторно и сортируются по id так же, как их обходит объектный движок,
+        поэтому и результат слияний совпадает. Последовательная часть (жадный
+        проход, где поглотивший сдвигается после каждого слияния) идет по
+        спискам Python, а не по элементам массивов; размер, урон и бонус
+        скорости пересчитываются из итогового здоровья одной операцией, а
+        поглощенные удаляются одним сжатием массивов.
+        """
+        n = self.count
+        if n < 2:
+            return []
+        first, second = self._close_pairs(n)
+        if not len(first):
+            return []
+        # Жадный проход идет только по зомби из пар, пронумерованным подряд
+        slots, local = np.unique(np.concatenate((first, second)), return_inverse=True)
+        ids = self.ids[slots]
+        # Каждая пара в обе стороны: поглощающий по возрастанию id, его кандидаты тоже
+        absorber_slots = local
+        candidate_slots = np.concatenate((local[len(first):], local[:len(first)]))
+        order = np.lexsort((ids[candidate_slots], ids[absorber_slots]))
+
+        x = self.x[slots].tolist()
+        z = self.z[slots].tolist()
+        health = self.health[slots].tolist()
+        zombie_ids = ids.tolist()
+        absorbed = [False] * len(slots)
+        merged_slots = []
+        merged = []
+        limit_sq = Zombie.MERGE_DISTANCE ** 2
+        for s1, s2 in zip(absorber_slots[order].tolist(), candidate_slots[order].tolist()):
+            if absorbed[s1] or absorbed[s2]:
+                continue
+            dx = x[s1] - x[s2]
+            dz = z[s1] - z[s2]
+            if dx * dx + dz * dz < limit_sq:
+                # То же, что Zombie.merge_with, кроме полей, которые зависят только от здоровья
+                health[s1] = health[s1] + health[s2]
+                x[s1] = (x[s1] + x[s2]) / 2
+                z[s1] = (z[s1] + z[s2]) / 2
+                absorbed[s2] = True
+                merged_slots.append((s2, s1))
+                id1, id2 = zombie_ids[s1], zombie_ids[s2]
+                merged.append((id2, id1))
+                trace('zombie', id1, "поглотил зомби %s, HP: %s", id2, health[s1])
+                trace('zombie', id2, "поглощен зомби %s", id1)
+        if not merged_slots:
+            return []
+
+        self.x[slots] = x
+        self.z[slots] = z
+        self.health[slots] = health
+        gone, absorbers = slots[np.array(merged_slots).T]
+        total_health = self.health[absorbers]
+        self.scale[absorbers] = Zombie.BASE_SCALE * (1 + (total_health / Zombie.HEALTH - 1) * 0.5)
+        self.damage_multiplier[absorbers] = total_health / Zombie.HEALTH
+        # add.at прибавляет по одному разу на слияние, как speed_bonus += 0.1 в merge_with
+        np.add.at(self.speed_bonus, absorbers, 0.1)
+
+        self.remove_slots(gone)
+        return merged
+
+    def _close_pairs(self, n):
+        """Слоты (first, second) всех близких пар живых зомби, каждая пара по одному разу."""
+        cell = Zombie.MERGE_DISTANCE
+        x, z, alive = self.x[:n], self.z[:n], self.alive[:n]
+        cx = np.floor(x / cell).astype(np.int64)
+        cz = np.floor(z / cell).astype(np.int64)
+        # Плотная сетка по рамке зомби с пустой ячейкой по краям, чтобы соседи не выходили за нее
+        cx -= cx.min() - 1
+        cz -= cz.min() - 1
+        width = int(cz.max()) + 2
+        keys = cx * width + cz
+        sizes = np.bincount(keys, minlength=(int(cx.max()) + 2) * width)
+        starts = np.cumsum(sizes) - sizes
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        found_first = []
+        found_second = []
+        for ox, oz in MERGE_NEIGHBOURS:
+            neighbour = sorted_keys + (ox * width + oz)
+            counts = sizes[neighbour]
+            total = int(counts.sum())
+            if not total:
+                continue
+            # Все пары (зомби, зомби из соседней ячейки) без цикла на Python
+            first = np.repeat(order, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = order[np.repeat(starts[neighbour], counts) + offsets]
+            if (ox, oz) == (0, 0):
+                keep = first < second
+                first, second = first[keep], second[keep]
+            dx = x[first] - x[second]
+            dz = z[first] - z[second]
+            close = dx * dx + dz * dz < cell * cell
+            close &= alive[first] & alive[second]  # Мертвые не сливаются
+            found_first.append(first[close])
+            found_second.append(second[close])
+        if not found_first:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        return np.concatenate(found_first), np.concatenate(found_second)
+
+    def update_zombies(self, players, dt=0.016, player_grid=None):
+        # Сначала проверяем слияния, затем убираем мертвых и двигаем остальных
+        merged = self.check_merge_zombies()
+        dead = np.flatnonzero(~self.alive[:self.count])
+        if len(dead):
+            self.remove_slots(dead)
+
+        n = self.count
+        self.target[:n] = -1
+        targets = [(player_id, player) for player_id, player in players.items()
+                   if is_target(player)]
+        self.update_flow(players, dt)
+        if n and targets:
+            self.move(targets, n, dt)
+        for zombie_id in traced_ids('zombie'):
+            slot = self.slots.get(zombie_id)
+            if slot is not None:
+                trace('zombie', zombie_id, "перемещается к цели %s, позиция (%.1f, %.1f)",
+                      int(self.target[slot]), self.x[slot], self.z[slot])
+        return merged
+
+    def move(self, targets, n, dt):
+        """Выбор ближайшего игрока, шаг к нему со столкновениями и урон - для всех зомби разом."""
+        player_ids = np.array([player_id for player_id, _ in targets])
+        player_x = np.array([player.x for _, player in targets])
+        player_y = np.array([player.y for _, player in targets])
+        player_z = np.array([player.z for _, player in targets])
+
+        x, z = self.x[:n], self.z[:n]
+        # |p - q|^2 = |q|^2 - 2 q.p + |p|^2 (q - зомби, p - игрок), а |q|^2 для выбора
+        # игрока не нужен: сравниваемые величины N x P дает одно матричное умножение
+        points = np.empty((n, 3))
+        points[:, 0] = x
+        points[:, 1] = z
+        points[:, 2] = 1.0
+        weights = np.stack((-2 * player_x, -2 * player_z, player_x * player_x + player_z * player_z))
+        nearest = (points @ weights).argmin(axis=1)
+        self.target[:n] = player_ids[nearest]
+        dx = player_x[nearest] - x
+        dz = player_z[nearest] - z
+        distance = np.sqrt(dx * dx + dz * dz)
+
+        movers = distance > 0
+        step = (Zombie.SPEED + self.speed_bonus[:n]) * dt
+        safe = np.where(movers, distance, 1.0)
+        unit_x = dx / safe
+        unit_z = dz / safe
+        flow = self.flow_directions(x, z)
+        if flow is not None:
+            # Вдали от игрока - по полю направлений в обход стен, рядом - прямо на него
+            follow, flow_x, flow_z = flow
+            unit_x = np.where(follow, flow_x, unit_x)
+            unit_z = np.where(follow, flow_z, unit_z)
+        new_x = x + np.where(movers, unit_x * step, 0.0)
+        new_z = z + np.where(movers, unit_z * step, 0.0)
+
+        obstacles = self.obstacles()
+        blocked = movers & self.blocked(new_x, new_z, obstacles)
+        free = movers & ~blocked
+        x[free] = new_x[free]
+        z[free] = new_z[free]
+
+        attacking = np.zeros(n, dtype=bool)
+        if blocked.any():
+            stuck = np.flatnonzero(blocked)
+            attacking[stuck] = self.attack_planks(stuck, dt)
+            # Не прошли по диагонали и не бьют доску - пробуем по одной оси
+            stuck = stuck[~attacking[stuck]]
+            along_x = ~self.blocked(new_x[stuck], z[stuck], obstacles)
+            x[stuck[along_x]] = new_x[stuck[along_x]]
+            rest = stuck[~along_x]
+            along_z = ~self.blocked(x[rest], new_z[rest], obstacles)
+            z[rest[along_z]] = new_z[rest[along_z]]
+
+        # Урон по цели после шага: расстояние растет с размером зомби
+        hx = x - player_x[nearest]
+        hz = z - player_z[nearest]
+        reach = Zombie.DAMAGE_DISTANCE * (self.scale[:n] / Zombie.BASE_SCALE)
+        hits = (movers & ~attacking & (np.sqrt(hx * hx + hz * hz) < reach) &
+                (np.abs(player_y[nearest]) < 3))
+        if hits.any():
+            damage = np.bincount(nearest[hits], Zombie.DAMAGE * self.damage_multiplier[:n][hits] * dt,
+                                 minlength=len(targets))
+            for index in np.flatnonzero(damage):
+                targets[index][1].take_damage(float(damage[index]))
+
+    def flow_directions(self, x, z):
+        """То же, что FlowField.direction_at, для всех точек: (маска идущих по полю, x, z) или None."""
+        flow = self.flow
+        if flow is None or flow.distance is None:
+            return None
+        if flow.version != self.flow_version:
+            # Списки поля копируются в массивы один раз после каждого перестроения
+            self.flow_version = flow.version
+            self.flow_cost = np.array(flow.distance)
+            self.flow_direction = np.array(flow.direction)
+        grid = flow.grid
+        column = np.floor((x - grid.origin) / grid.cell_size).astype(np.int64)
+        row = np.floor((z - grid.origin) / grid.cell_size).astype(np.int64)
+        inside = (column >= 0) & (column < grid.columns) & (row >= 0) & (row < grid.columns)
+        # Вне карты берется клетка 0 - угол рамки, до которого не дойти
+        cell = np.where(inside, (row + 1) * grid.width + column + 1, 0)
+        cost = self.flow_cost[cell]
+        follow = inside & (cost > DIRECT_COST) & (cost < UNREACHABLE)
+        # Без направления (-1) берется последнее смещение, но результат нужен только там, где follow
+        direction = self.flow_direction[cell]
+        offsets = FLOW_OFFSETS[direction]
+        next_row, next_column = np.divmod(cell + offsets[:, 1] * grid.width + offsets[:, 0], grid.width)
+        to_x = grid.origin + (next_column - 0.5) * grid.cell_size - x
+        to_z = grid.origin + (next_row - 0.5) * grid.cell_size - z
+        length = np.hypot(to_x, to_z)
+        at_center = length == 0
+        length[at_center] = 1.0
+        vectors = FLOW_VECTORS[direction]
+        return (follow, np.where(at_center, vectors[:, 0], to_x / length),
+                np.where(at_center, vectors[:, 1], to_z / length))
+
+    def attack_planks(self, stuck, dt):
+        """Зомби, уткнувшиеся в препятствие, бьют ближайшую по порядку доску рядом. Возвращает маску."""
+        attacking = np.zeros(len(stuck), dtype=bool)
+        if not self.plank_manager or not self.plank_manager.placed_planks:
+            return attacking
+        placed = list(self.plank_manager.placed_planks.items())
+        plank_x = np.array([plank.x for _, plank in placed])
+        plank_z = np.array([plank.z for _, plank in placed])
+        dx = self.x[stuck][:, None] - plank_x
+        dz = self.z[stuck][:, None] - plank_z
+        near = dx * dx + dz * dz < Zombie.DAMAGE_DISTANCE ** 2
+        attacking = near.any(axis=1)
+        # Доски получают урон по очереди зомби в порядке id, как в объектном движке
+        order = sorted(np.flatnonzero(attacking).tolist(), key=lambda i: self.ids[stuck[i]])
+        for i in order:
+            plank_id, plank = placed[int(near[i].argmax())]
+            slot = stuck[i]
+            if plank.take_damage(Zombie.DAMAGE * self.damage_multiplier[slot] * dt):
+                self.plank_manager.planks_to_remove.add(plank_id)
+        return attacking
+
+    def snapshot(self):
+        n = self.count
+        return {
+            str(zombie_id): {'x': x, 'y': 0, 'z': z, 'is_alive': alive, 'scale': scale}
+            for zombie_id, x, z, alive, scale in zip(
+                self.ids[:n].tolist(), self.x[:n].tolist(), self.z[:n].tolist(),
+                self.alive[:n].tolist(), self.scale[:n].tolist())
+        }
+
+    def to_dict(self):
+        n = self.count
+        return {
+            str(zombie_id): {'x': x, 'y': 0, 'z': z, 'health': health, 'is_alive': alive,
+                             'scale': scale, 'speed': Zombie.SPEED + speed_bonus}
+            for zombie_id, x, z, health, alive, scale, speed_bonus in zip(
+                self.ids[:n].tolist(), self.x[:n].tolist(), self.z[:n].tolist(),
+                self.health[:n].tolist(), self.alive[:n].tolist(), self.scale[:n].tolist(),
+                self.speed_bonus[:n].tolist())
+        }